@@ -1,70 +1,327 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, g, render_template, request, jsonify, stream_template
+import itertools
 import os
+import time
+from pathlib import Path
+from jinja2 import FileSystemBytecodeCache
 
 # 导入数据源
 from datasources.local_file import LocalFileDataSource
 from datasources.ddtkorea import DDTKoreaDataSource
+from datasources.async_base import SyncDataSourceAdapter
+from datasources.cached import CachedDataSource
+from datasources.compression import ChapterStore
+from datasources.federated import FederatedDataSource
+from datasources.metrics import REGISTRY, REQUEST_SECONDS
+from datasources.packed import PackedFileDataSource
+from datasources.search_index import SearchIndex
+from datasources.snapshot import SnapshotFile
+from datasources.sqlite_db import SQLiteDataSource
+from datasources.watcher import BOOK_ADDED, BOOK_REMOVED, LibraryWatcher
+from http_cache import PageCache, conditional, directory_version
 
 app = Flask(__name__)
 
 # 配置数据源
 DATASOURCE_TYPE = os.environ.get('DATASOURCE_TYPE', 'local')  # 默认使用本地文件数据源
 
+# 章节正文是否压缩存储（本地书库由 python -m datasources.compression 压缩），读取时总会自动解压
+CHAPTER_STORE = ChapterStore(compress=os.environ.get('COMPRESS_CHAPTERS', '0') == '1')
+
+# 全文搜索索引文件，设置为空字符串时不使用索引
+SEARCH_INDEX = os.environ.get('SEARCH_INDEX', 'data/index/search.db')
+# 书库快照（由 python -m datasources.snapshot 生成），与books.json、chapters.json一致时代替解析JSON；
+# 设置为空字符串时不使用
+SNAPSHOT_FILE = os.environ.get('SNAPSHOT_FILE', 'data/snapshot.bin')
+
+# 本地书库数据源，也是联合数据源的第一级
+def local_data_source():
+    return LocalFileDataSource(
+        search_index=SearchIndex(SEARCH_INDEX, chapter_store=CHAPTER_STORE) if SEARCH_INDEX else None,
+        chapter_store=CHAPTER_STORE, snapshot=SnapshotFile(SNAPSHOT_FILE) if SNAPSHOT_FILE else None)
+
 # 根据配置初始化数据源
 if DATASOURCE_TYPE == 'ddtkorea':
-    data_source = DDTKoreaDataSource()
+    data_source = DDTKoreaDataSource(chapter_store=CHAPTER_STORE)
+elif DATASOURCE_TYPE == 'ddtkorea-async':
+    # 所有上游请求在一个事件循环中进行，并发抓取数由连接池上限控制
+    from datasources.ddtkorea_async import AsyncDDTKoreaDataSource
+    data_source = SyncDataSourceAdapter(AsyncDDTKoreaDataSource(chapter_store=CHAPTER_STORE))
+elif DATASOURCE_TYPE == 'packed':
+    # 每本书一个打包文件，由 python -m datasources.packed 从本地书库转换
+    data_source = PackedFileDataSource(os.environ.get('PACKED_DIR', 'data/packed'))
+elif DATASOURCE_TYPE == 'sqlite':
+    # 书籍、目录和正文都在一个数据库中，由 python -m datasources.sqlite_db 从本地书库导入
+    data_source = SQLiteDataSource(os.environ.get('SQLITE_DB', 'data/library.db'))
+elif DATASOURCE_TYPE == 'federated':
+    # 本地镜像（由 python -m datasources.crawler 生成）优先，没有的书籍和章节从DDTKorea获取；
+    # 首页和搜索同时查询两者，DDTKorea超过FEDERATED_DEADLINE秒未返回时只显示本地结果
+    data_source = FederatedDataSource(
+        [('local', local_data_source()), ('ddtkorea', DDTKoreaDataSource(chapter_store=CHAPTER_STORE))],
+        deadline=float(os.environ.get('FEDERATED_DEADLINE', '1.5')), deadlines={'local': None})
 else:  # 默认使用本地文件数据源
-    data_source = LocalFileDataSource()
+    data_source = local_data_source()
+
+# 热门章节内容缓存在内存中，按字节数限制每个进程的占用
+CONTENT_CACHE_MB = int(os.environ.get('CONTENT_CACHE_MB', '64'))
+if CONTENT_CACHE_MB > 0:
+    data_source = CachedDataSource(data_source, max_bytes=CONTENT_CACHE_MB * 1024 * 1024)
+
+# 页面同时取决于数据和模板，模板更新后所有ETag随之变化
+TEMPLATES_VERSION = directory_version(Path(app.root_path) / app.template_folder)
+
+# 模板编译结果的缓存目录，多个工作进程共用，后启动的进程直接加载编译好的字节码；设置为空字符串时不使用
+TEMPLATE_CACHE_DIR = os.environ.get('TEMPLATE_CACHE_DIR', '')
+if TEMPLATE_CACHE_DIR:
+    Path(TEMPLATE_CACHE_DIR).mkdir(parents=True, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(TEMPLATE_CACHE_DIR)
+
+# 书籍详情页和章节页的渲染结果缓存，带gzip/brotli预压缩版本；PAGE_CACHE_DIR为空字符串时只使用内存
+PAGE_CACHE_MB = int(os.environ.get('PAGE_CACHE_MB', '32'))
+# 磁盘上页面缓存的总大小上限，超出时删除最久未访问的页面，0表示不限制
+PAGE_CACHE_DISK_MB = int(os.environ.get('PAGE_CACHE_DISK_MB', '256'))
+PAGE_CACHE = PageCache(os.environ.get('PAGE_CACHE_DIR', 'data/cache/pages'), max_bytes=PAGE_CACHE_MB * 1024 * 1024,
+                       max_disk_bytes=PAGE_CACHE_DISK_MB * 1024 * 1024) if PAGE_CACHE_MB > 0 else None
+
+# 各路由的缓存策略：浏览器和CDN过期后带着ETag重新验证，数据未变化时只返回304
+CACHE_INDEX = 'public, max-age=60'
+CACHE_BOOK = 'public, max-age=60'
+CACHE_CHAPTER = 'public, max-age=600'
+CACHE_SEARCH = 'public, max-age=60'
+CACHE_RECENT_READS = 'public, max-age=300'
+
+# 内存缓存的统计，导出时读取
+def _memory_cache_stats():
+    caches = {'pages': PAGE_CACHE.memory if PAGE_CACHE is not None else None,
+              'content': data_source.content_cache if isinstance(data_source, CachedDataSource) else None}
+    return {(name, stat): value for name, cache in caches.items() if cache is not None
+            for stat, value in cache.stats().items()}
+
+REGISTRY.gauge('booksite_memory_cache', '内存缓存（pages为页面缓存，content为章节内容缓存）的统计',
+               ('cache', 'stat'), _memory_cache_stats)
+
+# 记录每个请求生成响应的耗时
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_latency(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        REQUEST_SECONDS.observe(time.perf_counter() - start, request.endpoint or 'unmatched', request.method,
+                                str(response.status_code))
+    return response
+
+# 指标接口，Prometheus文本格式
+@app.route('/metrics')
+def metrics():
+    return Response(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8',
+                    headers={'Cache-Control': 'no-store'})
 
 # 首页路由
 @app.route('/')
+@conditional(CACHE_INDEX, lambda: data_source.get_version(), TEMPLATES_VERSION)
 def index():
     books = data_source.get_books()
     return render_template('index.html', books=books)
 
+# 书籍详情页首屏渲染的章节数，其余章节由页面按需请求
+CHAPTER_PAGE_SIZE = 200
+# 章节列表接口每次最多返回的章节数
+CHAPTER_API_MAX = 1000
+
 # 书籍详情页路由
 @app.route('/book/<book_id>')
+@conditional(CACHE_BOOK, lambda book_id: data_source.get_version(int(book_id)), TEMPLATES_VERSION, PAGE_CACHE)
 def book_detail(book_id):
     book = data_source.get_book_by_id(int(book_id))
     if book:
-        chapters = data_source.get_chapters(int(book_id))
-        return render_template('book.html', book=book, chapters=chapters)
+        total, chapters = data_source.get_chapters_page(int(book_id), 0, CHAPTER_PAGE_SIZE)
+        return render_template('book.html', book=book, chapters=chapters, total=total,
+                               page_size=CHAPTER_PAGE_SIZE)
     return '书籍不存在', 404
 
+# 章节列表接口，按范围返回章节
+@app.route('/api/book/<book_id>/chapters')
+@conditional(CACHE_BOOK, lambda book_id: data_source.get_version(int(book_id)), query_args=('offset', 'limit'))
+def chapter_list(book_id):
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', CHAPTER_PAGE_SIZE, type=int), 1), CHAPTER_API_MAX)
+    total, chapters = data_source.get_chapters_page(int(book_id), offset, limit)
+    return jsonify({'total': total, 'offset': offset, 'chapters': chapters})
+
+# 章节内容按块读取，超过一块的章节边读边渲染；模板输出凑够STREAM_FLUSH_SIZE个字符再发送
+STREAM_CHUNK_SIZE = 64 * 1024
+STREAM_FLUSH_SIZE = 16 * 1024
+
+def _paragraphs(chunks):
+    """把章节内容的文本块按行切分为段落，跨块的段落拼接完整后再输出"""
+    rest = ''
+    for chunk in chunks:
+        lines = (rest + chunk).split('\n')
+        rest = lines.pop()
+        yield from lines
+    yield rest
+
+def _buffered(fragments, size):
+    """合并模板输出的小片段，减少写入次数"""
+    buffer, length = [], 0
+    for fragment in fragments:
+        buffer.append(fragment)
+        length += len(fragment)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
 # 章节阅读页路由
 @app.route('/book/<book_id>/chapter/<chapter_id>')
+@conditional(CACHE_CHAPTER, lambda book_id, chapter_id: data_source.get_version(int(book_id), int(chapter_id)),
+             TEMPLATES_VERSION, PAGE_CACHE)
 def read_chapter(book_id, chapter_id):
     book = data_source.get_book_by_id(int(book_id))
     if book:
-        chapters = data_source.get_chapters(int(book_id))
-        chapter = next((c for c in chapters if c['id'] == int(chapter_id)), None)
+        # 一次查出当前章和上一章、下一章
+        navigation = data_source.get_chapter_navigation(int(book_id), int(chapter_id))
         
-        if chapter:
-            # 获取上一章和下一章的信息
-            current_index = next(i for i, c in enumerate(chapters) if c['id'] == int(chapter_id))
-            prev_chapter = chapters[current_index - 1] if current_index > 0 else None
-            next_chapter = chapters[current_index + 1] if current_index < len(chapters) - 1 else None
+        if navigation:
+            prev_chapter, chapter, next_chapter = navigation
             
-            # 读取章节内容
-            content = data_source.get_chapter_content(int(book_id), int(chapter_id))
-            if content:
-                return render_template('chapter.html', book=book, chapter=chapter, content=content,
+            # 按块读取章节内容，只有一块的章节整页渲染（可以进入页面缓存）
+            chunks = data_source.iter_chapter_content(int(book_id), int(chapter_id), STREAM_CHUNK_SIZE)
+            first = next(chunks, '') if chunks is not None else ''
+            second = next(chunks, None) if first else None
+            if second is not None:
+                # 大章节流式输出，浏览器收到开头就开始显示，每个请求只占用几块的内存
+                paragraphs = _paragraphs(itertools.chain((first, second), chunks))
+                stream = stream_template('chapter.html', book=book, chapter=chapter, paragraphs=paragraphs,
+                                         prev_chapter=prev_chapter, next_chapter=next_chapter)
+                return Response(_buffered(stream, STREAM_FLUSH_SIZE))
+            if first:
+                return render_template('chapter.html', book=book, chapter=chapter, paragraphs=first.split('\n'),
                                      prev_chapter=prev_chapter, next_chapter=next_chapter)
     return '章节不存在', 404
 
+# 搜索结果每页数量
+SEARCH_PAGE_SIZE = 20
+
 # 搜索路由
 @app.route('/search')
+@conditional(CACHE_SEARCH, lambda: data_source.get_version(), TEMPLATES_VERSION, query_args=('q', 'page'))
 def search():
     query = request.args.get('q', '')
-    results = data_source.search_books(query)
-    return render_template('search.html', books=results, query=query)
+    page = max(request.args.get('page', 1, type=int), 1)
+    total, results = data_source.search_books_page(query, (page - 1) * SEARCH_PAGE_SIZE, SEARCH_PAGE_SIZE)
+    pages = (total + SEARCH_PAGE_SIZE - 1) // SEARCH_PAGE_SIZE
+    return render_template('search.html', books=results, query=query, page=page, pages=pages, total=total)
+
+# 书籍信息接口每次最多查询的书籍数
+BOOKS_API_MAX = 100
 
-# 最近阅读路由
+# 书籍信息接口，按ID批量查询，供最近阅读等页面使用
+@app.route('/api/books')
+@conditional(CACHE_INDEX, lambda: data_source.get_version(), query_args=('ids',))
+def books_by_ids():
+    book_ids = []
+    for value in request.args.get('ids', '').split(','):
+        if value.strip().isdigit() and int(value) not in book_ids:
+            book_ids.append(int(value))
+    books = data_source.get_books_by_ids(book_ids[:BOOKS_API_MAX])
+    return jsonify({'books': books})
+
+# 最近阅读路由，阅读记录保存在浏览器中，书籍信息由页面通过/api/books按需查询
 @app.route('/recent-reads')
+@conditional(CACHE_RECENT_READS, lambda: TEMPLATES_VERSION)
 def recent_reads():
-    books = data_source.get_books()
-    all_books = {str(b['id']): b for b in books}
-    return render_template('recent_reads.html', all_books=all_books)
+    return render_template('recent_reads.html')
+
+# 书库监视：本地书库变化时只更新涉及的书籍和章节的目录、搜索索引和缓存，发布新章节的代价与变化成正比；
+# Linux上使用inotify，不可用时每WATCH_INTERVAL秒扫描一次书库
+WATCH_LIBRARY = os.environ.get('WATCH_LIBRARY', '0') == '1'
+WATCH_INTERVAL = float(os.environ.get('WATCH_INTERVAL', '5'))
+
+def _local_source(source):
+    """找出（可能被缓存或联合数据源包装的）本地书库数据源"""
+    if isinstance(source, CachedDataSource):
+        return _local_source(source.source)
+    if isinstance(source, FederatedDataSource):
+        return next(filter(None, (_local_source(member.source) for member in source.members)), None)
+    return source if type(source) is LocalFileDataSource else None
+
+def _page_prefixes(event):
+    """受变化影响的页面缓存键前缀，书籍目录变化影响所有页面时返回None"""
+    if event.book_id is None:
+        return None
+    if event.chapter_id is None:
+        return (f'/book/{event.book_id}?', f'/book/{event.book_id}/')
+    return (f'/book/{event.book_id}/chapter/{event.chapter_id}?',)
+
+def invalidate_changed(events):
+    """删除变化涉及的章节内容缓存和页面缓存，并让联合数据源重新查找新增和删除的书籍"""
+    prefixes = ()
+    for event in events:
+        if isinstance(data_source, CachedDataSource) and (event.chapter_id is not None or event.kind == BOOK_REMOVED):
+            data_source.invalidate(event.book_id, event.chapter_id)
+        if prefixes is not None:
+            event_prefixes = _page_prefixes(event)
+            prefixes = None if event_prefixes is None else prefixes + event_prefixes
+        if event.kind in (BOOK_ADDED, BOOK_REMOVED):
+            inner = data_source.source if isinstance(data_source, CachedDataSource) else data_source
+            if isinstance(inner, FederatedDataSource):
+                inner.reset_owners(event.book_id)
+    # 一批事件只扫描一次磁盘上的页面缓存
+    if PAGE_CACHE is not None and prefixes != ():
+        PAGE_CACHE.invalidate(None if prefixes is None else lambda key: key.startswith(prefixes))
+
+library_watcher = None
+if WATCH_LIBRARY:
+    local_source = _local_source(data_source)
+    if local_source is None:
+        print(f"数据源{DATASOURCE_TYPE}不包含本地书库，不启动书库监视")
+    else:
+        library_watcher = LibraryWatcher(local_source.books_dir, local_source.books_info_file,
+                                         interval=WATCH_INTERVAL)
+        local_source.watch(library_watcher)
+        library_watcher.subscribe(invalidate_changed)
+        library_watcher.start()
+
+# 启动预热：编译全部模板，加载书籍目录和热门书籍的详情、目录，使新启动的工作进程从第一个请求起就是热的
+WARMUP = os.environ.get('WARMUP', '0') == '1'
+# 预热的书籍ID（逗号分隔），默认为书籍列表中的前WARMUP_TOP本
+WARMUP_BOOKS = os.environ.get('WARMUP_BOOKS', '')
+WARMUP_TOP = int(os.environ.get('WARMUP_TOP', '20'))
+
+def warmup(book_ids=None, top=WARMUP_TOP):
+    """预热模板和热门书籍，返回各部分的数量和耗时（秒）"""
+    start = time.perf_counter()
+    templates = app.jinja_env.list_templates()
+    for name in templates:
+        app.jinja_env.get_template(name)
+    compiled = time.perf_counter()
+
+    # 在后台同步搜索索引，首次搜索时不必再等待
+    local_source = _local_source(data_source)
+    if local_source is not None and local_source.search_index is not None:
+        local_source.sync_search_index()
+
+    if book_ids is None:
+        book_ids = [book['id'] for book in data_source.get_books()[:top]]
+    books = 0
+    for book_id in book_ids:
+        try:
+            # 与书籍详情页相同的查询，同时加载目录
+            if data_source.get_book_by_id(int(book_id)):
+                data_source.get_chapters_page(int(book_id), 0, CHAPTER_PAGE_SIZE)
+                books += 1
+        except Exception as e:
+            print(f"预热书籍失败: {book_id}, 错误: {e}")
+    return {'templates': len(templates), 'templates_seconds': compiled - start,
+            'books': books, 'books_seconds': time.perf_counter() - compiled}
+
+if WARMUP:
+    warmup([int(value) for value in WARMUP_BOOKS.split(',') if value.strip().isdigit()] if WARMUP_BOOKS else None)
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,139 @@
+"""生成基准测试用的合成书库，目录结构与data/books.json、data/books/<书籍ID>/相同"""
+import json
+import random
+import shutil
+from pathlib import Path
+from typing import Any, Dict, List
+
+# 书名、作者和正文的词汇，中韩文混合，使搜索索引的二元切分和韩文分词都有代表性的负载
+TITLE_WORDS = ['剑', '道', '仙', '魔', '帝', '龙', '天', '神', '尊', '王', '凡人', '修仙', '传', '记', '录',
+               '검', '노래', '귀환', '전설', '마법사', '황제', '용', '하늘', '무림', '기사']
+SURNAMES = ['李', '王', '张', '刘', '陈', '杨', '김', '이', '박', '최', '정']
+PHRASES = ['韩立心中一动，', '只见那名修士冷哼一声，', '筑基期的修为', '祭出一件法宝，', '神识一扫，',
+           '南宫婉微微一笑。', '数十块灵石', '顿时化作一道青光', '向远处飞去。', '산을 내려온 지 십 년.',
+           '검을 뽑아 들었다. ', '바람이 불어왔다. ', '그는 천천히 고개를 들었다. ']
+
+# 生成参数写入书库目录下的manifest.json，参数相同时直接复用已生成的书库
+MANIFEST = 'manifest.json'
+
+# 第n本书的章节ID为n*CHAPTER_ID_BASE+1起，与真实站点一样全局唯一
+CHAPTER_ID_BASE = 100000
+
+
+def make_text(rng: random.Random, size: int) -> str:
+    """生成大约size个字符的章节正文，每段由若干短句组成"""
+    paragraphs = []
+    length = 0
+    while length < size:
+        paragraph = ''.join(rng.choice(PHRASES) for _ in range(rng.randint(3, 8)))
+        paragraphs.append(paragraph)
+        length += len(paragraph) + 1
+    return '\n'.join(paragraphs)
+
+
+def make_books(rng: random.Random, count: int) -> List[Dict[str, Any]]:
+    """生成书籍信息列表，书籍ID从1开始"""
+    books = []
+    for book_id in range(1, count + 1):
+        title = ''.join(rng.sample(TITLE_WORDS, rng.randint(2, 4)))
+        books.append({
+            'id': book_id,
+            'title': f'{title}{book_id}',
+            'author': rng.choice(SURNAMES) + rng.choice(TITLE_WORDS),
+            'cover': f'/static/covers/{book_id}.jpg',
+            'description': ''.join(rng.choice(PHRASES) for _ in range(4)),
+        })
+    return books
+
+
+def write_book(book_dir: Path, rng: random.Random, chapters: int, chapter_size: int,
+               first_chapter_id: int = 1) -> None:
+    """写入一本书的chapters.json和章节文件"""
+    book_dir.mkdir(parents=True, exist_ok=True)
+    chapter_ids = range(first_chapter_id, first_chapter_id + chapters)
+    with open(book_dir / 'chapters.json', 'w', encoding='utf-8') as f:
+        json.dump([{'id': chapter_id, 'title': f'第{index}章'} for index, chapter_id in enumerate(chapter_ids, 1)],
+                  f, ensure_ascii=False)
+    for chapter_id in chapter_ids:
+        with open(book_dir / f'{chapter_id}.txt', 'w', encoding='utf-8') as f:
+            f.write(make_text(rng, chapter_size))
+
+
+def generate_corpus(data_dir: Path, books: int = 100000, books_with_chapters: int = 200, chapters: int = 50,
+                    big_book_chapters: int = 10000, chapter_size: int = 4000, huge_chapter_size: int = 2_000_000,
+                    seed: int = 42) -> Dict[str, Any]:
+    """生成合成书库，相同参数已生成过时直接返回
+
+    书籍目录中有books条记录，其中前books_with_chapters本有章节；第1本书是有big_book_chapters章的大书，
+    第2本书的第一章约有huge_chapter_size个字符，用于测试流式输出。
+
+    Args:
+        data_dir (Path): 书库目录，生成books.json和books/
+        books (int): 书籍数量
+        books_with_chapters (int): 有章节的书籍数量
+        chapters (int): 普通书籍的章节数
+        big_book_chapters (int): 大书的章节数
+        chapter_size (int): 每章大约的字符数
+        huge_chapter_size (int): 超大章节的字符数，0表示不生成
+        seed (int): 随机数种子，相同参数和种子生成的书库完全相同
+
+    Returns:
+        Dict[str, Any]: 书库信息，包括生成参数和用于构造请求的书籍、章节ID
+    """
+    data_dir = Path(data_dir)
+    params = {'books': books, 'books_with_chapters': books_with_chapters, 'chapters': chapters,
+              'big_book_chapters': big_book_chapters, 'chapter_size': chapter_size,
+              'huge_chapter_size': huge_chapter_size, 'seed': seed}
+    manifest_file = data_dir / MANIFEST
+    try:
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest['params'] == params:
+            return manifest
+    except FileNotFoundError:
+        # 不是生成的书库，避免覆盖真实数据
+        if (data_dir / 'books.json').exists():
+            raise ValueError(f"{data_dir}中已有books.json但不是生成的书库，请换一个目录")
+    except (ValueError, KeyError):
+        pass
+
+    # 参数变化后重新生成，删除旧书库
+    manifest_file.unlink(missing_ok=True)
+    if (data_dir / 'books').exists():
+        shutil.rmtree(data_dir / 'books')
+    for derived in ('packed', 'index', 'library.db', 'library.db-wal', 'library.db-shm'):
+        path = data_dir / derived
+        if path.is_dir():
+            shutil.rmtree(path)
+        elif path.exists():
+            path.unlink()
+
+    rng = random.Random(seed)
+    catalog = make_books(rng, books)
+    books_dir = data_dir / 'books'
+    data_dir.mkdir(parents=True, exist_ok=True)
+    with open(data_dir / 'books.json', 'w', encoding='utf-8') as f:
+        json.dump({'books': catalog}, f, ensure_ascii=False)
+
+    detailed = list(range(1, min(books_with_chapters, books) + 1))
+    for book_id in detailed:
+        count = big_book_chapters if book_id == 1 else chapters
+        write_book(books_dir / str(book_id), rng, count, chapter_size, first_chapter_id=book_id * CHAPTER_ID_BASE + 1)
+    huge_chapter = None
+    if huge_chapter_size and len(detailed) > 1:
+        huge_chapter = [2, 2 * CHAPTER_ID_BASE + 1]
+        with open(books_dir / '2' / f'{huge_chapter[1]}.txt', 'w', encoding='utf-8') as f:
+            f.write(make_text(rng, huge_chapter_size))
+
+    manifest = {
+        'params': params,
+        'big_book': 1,
+        'detailed_books': len(detailed),
+        'chapter_id_base': CHAPTER_ID_BASE,
+        'huge_chapter': huge_chapter,
+        # 搜索关键词，最后一个没有结果
+        'queries': [catalog[0]['title'][:2], catalog[-1]['author'], TITLE_WORDS[0], '없는검색어'],
+    }
+    with open(manifest_file, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
@@ -0,0 +1,145 @@
+"""计时、统计和结果比较"""
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """最近秩法计算百分位数
+
+    Args:
+        sorted_values (List[float]): 升序排列的数值
+        q (float): 百分位（0-100）
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(int(len(sorted_values) * q / 100 + 0.5) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(latencies: List[float], elapsed: float, errors: int = 0) -> Dict[str, Any]:
+    """汇总一组耗时（秒）
+
+    Returns:
+        Dict[str, Any]: 次数、错误数、吞吐量（次/秒）和毫秒为单位的平均值、p50、p90、p99、最大值
+    """
+    values = sorted(latencies)
+
+    def ms(seconds: float) -> float:
+        return round(seconds * 1000, 4)
+
+    return {
+        'count': len(values),
+        'errors': errors,
+        'throughput': round(len(values) / elapsed, 2) if elapsed > 0 else 0.0,
+        'mean_ms': ms(sum(values) / len(values)) if values else 0.0,
+        'p50_ms': ms(percentile(values, 50)),
+        'p90_ms': ms(percentile(values, 90)),
+        'p99_ms': ms(percentile(values, 99)),
+        'max_ms': ms(values[-1]) if values else 0.0,
+    }
+
+
+def _timed_call(fn: Callable[[int], Any], i: int) -> Optional[float]:
+    """调用一次，返回耗时；抛出异常或返回False视为失败，返回None"""
+    start = time.perf_counter()
+    try:
+        ok = fn(i)
+    except Exception as e:
+        # 结果JSON可能输出到标准输出，日志写到标准错误
+        print(f"基准测试调用失败: {e}", file=sys.stderr)
+        return None
+    elapsed = time.perf_counter() - start
+    return None if ok is False else elapsed
+
+
+def measure(fn: Callable[[int], Any], count: int, concurrency: int = 1, warmup: int = 1) -> Dict[str, Any]:
+    """测量fn的耗时分布和吞吐量
+
+    先以单线程调用warmup次（第一次的耗时单独记录为first_ms，反映冷启动），再用concurrency个线程
+    共调用count次。fn以调用序号为参数，多线程时每个线程调用的序号不同。
+
+    Args:
+        fn (Callable[[int], Any]): 被测函数
+        count (int): 计时的调用次数
+        concurrency (int): 并发线程数
+        warmup (int): 预热次数，不计入统计
+
+    Returns:
+        Dict[str, Any]: summarize的结果，另加first_ms和concurrency
+    """
+    first = None
+    for i in range(warmup):
+        elapsed = _timed_call(fn, -1 - i)
+        if first is None:
+            first = elapsed
+
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    counter = iter(range(count))
+
+    def worker() -> None:
+        nonlocal errors
+        local = []
+        failed = 0
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                break
+            elapsed = _timed_call(fn, i)
+            if elapsed is None:
+                failed += 1
+            else:
+                local.append(elapsed)
+        with lock:
+            latencies.extend(local)
+            errors += failed
+
+    start = time.perf_counter()
+    if concurrency <= 1:
+        worker()
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for future in [executor.submit(worker) for _ in range(concurrency)]:
+                future.result()
+    result = summarize(latencies, time.perf_counter() - start, errors)
+    result['first_ms'] = round(first * 1000, 4) if first is not None else None
+    result['concurrency'] = concurrency
+    return result
+
+
+def result_key(result: Dict[str, Any]) -> tuple:
+    """用于在两次运行之间匹配结果的键"""
+    return result['group'], result['name'], result.get('source'), result.get('concurrency', 1)
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = 0.25) -> List[str]:
+    """比较两次运行的结果，找出p50或p99变慢、吞吐量下降超过threshold的项
+
+    Args:
+        baseline (Dict[str, Any]): 基准结果（run.py输出的JSON）
+        current (Dict[str, Any]): 本次结果
+        threshold (float): 允许的相对变化
+
+    Returns:
+        List[str]: 退化项的说明，没有退化时为空
+    """
+    previous = {result_key(result): result for result in baseline.get('results', [])}
+    regressions = []
+    for result in current.get('results', []):
+        old = previous.get(result_key(result))
+        if old is None:
+            continue
+        name = '/'.join(str(part) for part in result_key(result) if part is not None)
+        for field in ('p50_ms', 'p99_ms'):
+            if old[field] > 0 and result[field] > old[field] * (1 + threshold):
+                regressions.append(f"{name}: {field} {old[field]} -> {result[field]}")
+        if old['throughput'] > 0 and result['throughput'] < old['throughput'] * (1 - threshold):
+            regressions.append(f"{name}: throughput {old['throughput']} -> {result['throughput']}")
+        if result['errors'] > old['errors']:
+            regressions.append(f"{name}: errors {old['errors']} -> {result['errors']}")
+    return regressions
@@ -0,0 +1,398 @@
+"""基准测试入口
+
+在合成书库上测量各路由（通过Flask测试客户端，单线程和并发）、各数据源的常用操作，
+以及DDTKorea数据源的页面解析和缓存路径，结果输出为JSON，可与之前的结果比较找出性能退化：
+
+    python -m benchmarks.run --scale small --output bench.json
+    python -m benchmarks.run --scale small --compare bench.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from .corpus import generate_corpus
+from .harness import compare, measure
+
+ROOT = Path(__file__).resolve().parent.parent
+FIXTURES = ROOT / 'tests' / 'fixtures'
+
+# 书库规模预设：small几秒内生成，用于日常比较；large接近线上规模
+SCALES = {
+    'small': {'books': 5000, 'books_with_chapters': 50, 'chapters': 20, 'big_book_chapters': 2000,
+              'chapter_size': 4000, 'huge_chapter_size': 500_000},
+    'large': {'books': 100000, 'books_with_chapters': 200, 'chapters': 50, 'big_book_chapters': 10000,
+              'chapter_size': 4000, 'huge_chapter_size': 2_000_000},
+}
+
+
+def log(message: str) -> None:
+    # 结果JSON可能输出到标准输出，进度写到标准错误
+    print(message, file=sys.stderr)
+
+
+def make_sources(names: List[str], data_dir: Path, content_cache_mb: int) -> Dict[str, Any]:
+    """按名称创建数据源，打包文件和SQLite数据库不存在时先从书库转换
+
+    Returns:
+        Dict[str, Any]: 数据源名称到数据源的映射
+    """
+    from datasources.cached import CachedDataSource
+    from datasources.local_file import LocalFileDataSource
+    from datasources.packed import PackedFileDataSource, convert_library
+    from datasources.search_index import SearchIndex
+    from datasources.sqlite_db import SQLiteDataSource
+
+    books_dir = data_dir / 'books'
+    books_file = data_dir / 'books.json'
+    sources = {}
+    for name in names:
+        start = time.perf_counter()
+        if name == 'local':
+            source = LocalFileDataSource(str(books_dir), str(books_file),
+                                         search_index=SearchIndex(str(data_dir / 'index' / 'search.db')))
+            # 索引在后台构建，计时前等待完成
+            source.sync_search_index(wait=True)
+        elif name == 'packed':
+            convert_library(books_dir, data_dir / 'packed')
+            source = PackedFileDataSource(str(data_dir / 'packed'), str(books_file))
+        elif name == 'sqlite':
+            db_file = data_dir / 'library.db'
+            exists = db_file.exists()
+            source = SQLiteDataSource(str(db_file))
+            if not exists:
+                with open(books_file, 'r', encoding='utf-8') as f:
+                    source.import_books(json.load(f)['books'], books_dir)
+        else:
+            raise ValueError(f"未知的数据源: {name}")
+        log(f"数据源 {name} 就绪，耗时 {time.perf_counter() - start:.1f}秒")
+        sources[name] = CachedDataSource(source, max_bytes=content_cache_mb * 1024 * 1024) \
+            if content_cache_mb > 0 else source
+    return sources
+
+
+def load_app(work_dir: Path) -> Any:
+    """导入app.py
+
+    app.py在导入时按环境变量创建默认数据源，这里让它使用工作目录下的空书库、不建搜索索引、
+    页面缓存只用内存；之后由基准测试替换app.data_source。
+    """
+    os.environ['DATASOURCE_TYPE'] = 'local'
+    os.environ['SEARCH_INDEX'] = ''
+    os.environ['PAGE_CACHE_DIR'] = ''
+    work_dir.mkdir(parents=True, exist_ok=True)
+    os.chdir(work_dir)
+    if str(ROOT) not in sys.path:
+        sys.path.insert(0, str(ROOT))
+    import app
+    return app
+
+
+def route_cases(manifest: Dict[str, Any], seed: int) -> List[tuple]:
+    """各路由的请求
+
+    Returns:
+        List[tuple]: (名称, 请求次数倍率, 以调用序号生成(路径, 请求头)的函数)
+    """
+    base = manifest['chapter_id_base']
+    detailed = manifest['detailed_books']
+    chapters = manifest['params']['chapters']
+    big_chapters = manifest['params']['big_book_chapters']
+    books = manifest['params']['books']
+    queries = manifest['queries']
+
+    def rng(name: str, i: int) -> random.Random:
+        # 每个路由、每个序号的请求固定，两次运行可以比较
+        return random.Random(f'{seed}:{name}:{i}')
+
+    def book(i):
+        return f'/book/{rng("book", i).randint(2, max(detailed, 2))}', {}
+
+    def chapter(i):
+        r = rng('chapter', i)
+        book_id = r.randint(2, max(detailed, 2))
+        return f'/book/{book_id}/chapter/{book_id * base + r.randint(1, chapters)}', {}
+
+    def big_book_chapter(i):
+        return f'/book/1/chapter/{base + rng("big", i).randint(1, big_chapters)}', {}
+
+    def chapters_api(i):
+        return f'/api/book/1/chapters?offset={rng("api", i).randint(0, big_chapters)}&limit=200', {}
+
+    def books_api(i):
+        r = rng('books_api', i)
+        return '/api/books?ids=' + ','.join(str(r.randint(1, books)) for _ in range(20)), {}
+
+    def search(i):
+        return f'/search?q={queries[i % len(queries)]}', {}
+
+    cases = [
+        ('index', 0.05, lambda i: ('/', {})),
+        ('book', 1, book),
+        ('book_big', 0.25, lambda i: ('/book/1', {})),
+        ('chapters_api', 1, chapters_api),
+        ('chapter', 1, chapter),
+        ('chapter_big_book', 1, big_book_chapter),
+        ('search', 0.25, search),
+        ('books_api', 1, books_api),
+        ('recent_reads', 1, lambda i: ('/recent-reads', {})),
+        ('metrics', 0.25, lambda i: ('/metrics', {})),
+    ]
+    if manifest['huge_chapter']:
+        book_id, chapter_id = manifest['huge_chapter']
+        cases.append(('chapter_huge_streamed', 0.1, lambda i: (f'/book/{book_id}/chapter/{chapter_id}', {})))
+    return cases
+
+
+def bench_routes(app_module: Any, sources: Dict[str, Any], manifest: Dict[str, Any], requests: int,
+                 concurrency_levels: List[int], seed: int) -> List[Dict[str, Any]]:
+    """通过Flask测试客户端测量各路由，另测带If-None-Match的重新验证（304）"""
+    results = []
+    flask_app = app_module.app
+    for source_name, source in sources.items():
+        app_module.data_source = source
+        if app_module.PAGE_CACHE is not None:
+            app_module.PAGE_CACHE.invalidate()
+        for name, scale, make_request in route_cases(manifest, seed):
+            for concurrency in concurrency_levels:
+                clients = {}
+
+                def call(i: int, make_request=make_request) -> bool:
+                    # 测试客户端不是线程安全的，每个线程一个
+                    client = clients.get(threading.get_ident())
+                    if client is None:
+                        client = clients[threading.get_ident()] = flask_app.test_client()
+                    path, headers = make_request(i)
+                    response = client.get(path, headers=headers)
+                    response.get_data()
+                    response.close()
+                    return response.status_code in (200, 304)
+
+                count = max(int(requests * scale), concurrency, 1)
+                result = measure(call, count, concurrency)
+                results.append({'group': 'routes', 'name': name, 'source': source_name, **result})
+                log(f"routes {source_name} {name} c={concurrency}: "
+                    f"{result['throughput']}次/秒 p50={result['p50_ms']}ms p99={result['p99_ms']}ms")
+
+        # 数据未变化时的重新验证，只比较ETag，不读取内容
+        client = flask_app.test_client()
+        # 第2本书的第一章是超大章节，用第2章
+        path = f"/book/2/chapter/{2 * manifest['chapter_id_base'] + 2}"
+        etag = client.get(path).headers.get('ETag')
+        result = measure(lambda i: client.get(path, headers={'If-None-Match': etag}).status_code == 304,
+                         requests)
+        results.append({'group': 'routes', 'name': 'chapter_revalidate', 'source': source_name, **result})
+    return results
+
+
+def bench_datasources(sources: Dict[str, Any], manifest: Dict[str, Any], requests: int,
+                      seed: int) -> List[Dict[str, Any]]:
+    """直接调用各数据源的常用操作"""
+    base = manifest['chapter_id_base']
+    detailed = max(manifest['detailed_books'], 2)
+    chapters = manifest['params']['chapters']
+    big_chapters = manifest['params']['big_book_chapters']
+    books = manifest['params']['books']
+    queries = manifest['queries']
+
+    def rng(name: str, i: int) -> random.Random:
+        return random.Random(f'{seed}:{name}:{i}')
+
+    results = []
+    for source_name, source in sources.items():
+        def random_chapter(i: int, name: str) -> tuple:
+            r = rng(name, i)
+            book_id = r.randint(2, detailed)
+            return book_id, book_id * base + r.randint(1, chapters)
+
+        def drain(chunks) -> bool:
+            return chunks is not None and sum(len(chunk) for chunk in chunks) > 0
+
+        cases = [
+            ('get_book_by_id', lambda i: source.get_book_by_id(rng('book', i).randint(1, books)) is not None),
+            ('get_books_by_ids', lambda i: len(source.get_books_by_ids(
+                [rng('books', i).randint(1, books) for _ in range(20)])) == 20),
+            ('get_chapters_page', lambda i: len(source.get_chapters_page(
+                1, rng('page', i).randint(0, max(big_chapters - 200, 0)), 200)[1]) > 0),
+            ('get_chapter_navigation', lambda i: source.get_chapter_navigation(
+                1, base + rng('nav', i).randint(1, big_chapters)) is not None),
+            ('get_chapter_content', lambda i: source.get_chapter_content(*random_chapter(i, 'content')) is not None),
+            ('iter_chapter_content', lambda i: drain(source.iter_chapter_content(*random_chapter(i, 'iter')))),
+            ('get_version', lambda i: source.get_version(*random_chapter(i, 'version')) is not None),
+            ('search_books_page', lambda i: source.search_books_page(queries[i % len(queries)], 0, 20) is not None),
+        ]
+        if manifest['huge_chapter']:
+            huge = manifest['huge_chapter']
+            cases.append(('iter_chapter_content_huge', lambda i: drain(source.iter_chapter_content(*huge))))
+        for name, fn in cases:
+            result = measure(fn, requests)
+            results.append({'group': 'datasources', 'name': name, 'source': source_name, **result})
+            log(f"datasources {source_name} {name}: p50={result['p50_ms']}ms p99={result['p99_ms']}ms")
+    return results
+
+
+def bench_ddtkorea(requests: int, work_dir: Path) -> List[Dict[str, Any]]:
+    """DDTKorea数据源：各解析后端解析tests/fixtures中的页面，以及缓存命中、过期和未命中的路径"""
+    from datasources.ddtkorea import DDTKoreaDataSource
+    from datasources.http_client import HttpClient
+    from datasources.parsers import DDTKoreaParser, get_backend
+
+    # 模拟站点放在tests目录下，与爬虫测试共用
+    sys.path.insert(0, str(ROOT / 'tests'))
+    from fake_ddtkorea import FakeDDTKorea
+
+    def fixture(name: str) -> str:
+        with open(FIXTURES / name, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    pages = {
+        'books': (fixture('ddtkorea_books.html'), lambda p, html: p.parse_book_list(html, '.novel-list .novel-item')),
+        'book': (fixture('ddtkorea_book.html'),
+                 lambda p, html: p.parse_book(html, 101, 'https://www.ddtkorea.com/novel/101')),
+        'chapters': (fixture('ddtkorea_chapters.html'), lambda p, html: p.parse_chapters(html)),
+        'chapter': (fixture('ddtkorea_chapter.html'), lambda p, html: p.parse_chapter_content(html)),
+        'search': (fixture('ddtkorea_search.html'),
+                   lambda p, html: p.parse_book_list(html, '.search-results .novel-item')),
+    }
+    results = []
+    for backend in ('html.parser', 'lxml'):
+        try:
+            get_backend(backend)
+        except ImportError:
+            log(f"跳过解析后端 {backend}：没有安装")
+            continue
+        parser = DDTKoreaParser('https://www.ddtkorea.com', backend)
+        for kind, (html, parse) in pages.items():
+            result = measure(lambda i, parse=parse, html=html: bool(parse(parser, html)), requests)
+            results.append({'group': 'ddtkorea_parse', 'name': kind, 'source': backend, **result})
+            log(f"ddtkorea_parse {backend} {kind}: p50={result['p50_ms']}ms")
+
+    chapters = requests + 1
+    with FakeDDTKorea(books=1, chapters=chapters) as base_url, \
+            tempfile.TemporaryDirectory(dir=work_dir) as cache_dir:
+        source = DDTKoreaDataSource(base_url, cache_dir=cache_dir, http_client=HttpClient(max_retries=0),
+                                    prefetch_workers=0, refresh_workers=1, refresh_interval=3600)
+
+        def chapter_id(i: int) -> int:
+            # 预热调用的序号为负数
+            return 101000 + i % chapters + 1
+
+        # 未命中：从模拟站点抓取、解析并写入缓存
+        results.append({'group': 'ddtkorea_cache', 'name': 'miss', 'source': 'ddtkorea',
+                        **measure(lambda i: source.get_chapter_content(101, chapter_id(i)) is not None, requests)})
+        # 命中：读取未过期的缓存文件
+        results.append({'group': 'ddtkorea_cache', 'name': 'hit', 'source': 'ddtkorea',
+                        **measure(lambda i: source.get_chapter_content(101, chapter_id(i)) is not None, requests)})
+        # 过期：先返回旧数据，在后台刷新
+        old = time.time() - 2 * 86400
+        for i in range(-1, requests):
+            os.utime(source._cache_file('chapter', 101, chapter_id(i)), (old, old))
+        results.append({'group': 'ddtkorea_cache', 'name': 'stale', 'source': 'ddtkorea',
+                        **measure(lambda i: source.get_chapter_content(101, chapter_id(i)) is not None, requests)})
+        source.refresher.join()
+        # 章节目录：抓取后按缓存文件签名缓存
+        results.append({'group': 'ddtkorea_cache', 'name': 'chapter_toc', 'source': 'ddtkorea',
+                        **measure(lambda i: len(source.get_chapter_toc(101)) == chapters, requests)})
+        for result in results[-4:]:
+            log(f"ddtkorea_cache {result['name']}: p50={result['p50_ms']}ms p99={result['p99_ms']}ms")
+    return results
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """命令行：生成书库并运行基准测试"""
+    parser = argparse.ArgumentParser(description='运行基准测试，结果以JSON输出')
+    parser.add_argument('--data-dir', default='data/bench', help='合成书库目录，参数不变时复用')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small', help='书库规模')
+    parser.add_argument('--books', type=int, help='书籍数量，覆盖规模预设')
+    parser.add_argument('--big-book-chapters', type=int, help='大书的章节数，覆盖规模预设')
+    parser.add_argument('--seed', type=int, default=42, help='随机数种子')
+    parser.add_argument('--groups', default='routes,datasources,ddtkorea', help='要运行的测试组，用逗号分隔')
+    parser.add_argument('--sources', default='local,packed,sqlite', help='要测试的数据源，用逗号分隔')
+    parser.add_argument('--requests', type=int, default=200, help='每项测试的调用次数')
+    parser.add_argument('--concurrency', default='1,8', help='路由测试的并发线程数，用逗号分隔')
+    parser.add_argument('--content-cache-mb', type=int, default=64, help='章节内容缓存大小，0表示不使用')
+    parser.add_argument('--output', help='结果JSON文件，默认输出到标准输出')
+    parser.add_argument('--compare', help='与之前的结果JSON比较，有退化时以状态码1退出')
+    parser.add_argument('--threshold', type=float, default=0.25, help='比较时允许的相对变化')
+    args = parser.parse_args(argv)
+
+    data_dir = Path(args.data_dir).resolve()
+    output = Path(args.output).resolve() if args.output else None
+    baseline_file = Path(args.compare).resolve() if args.compare else None
+    groups = [group for group in args.groups.split(',') if group]
+    params = dict(SCALES[args.scale])
+    if args.books is not None:
+        params['books'] = args.books
+    if args.big_book_chapters is not None:
+        params['big_book_chapters'] = args.big_book_chapters
+
+    # 数据源和解析器用print输出错误，运行期间转到标准错误，标准输出只留给结果JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        start = time.perf_counter()
+        manifest = generate_corpus(data_dir, seed=args.seed, **params)
+        log(f"书库就绪: {data_dir}，耗时 {time.perf_counter() - start:.1f}秒")
+
+        # app.py和数据源都从仓库根目录导入，工作目录换到书库下，避免在当前目录创建data/
+        app_module = load_app(data_dir / 'app')
+        results = []
+        sources = {}
+        if 'routes' in groups or 'datasources' in groups:
+            sources = make_sources([name for name in args.sources.split(',') if name], data_dir,
+                                   args.content_cache_mb)
+        if 'routes' in groups:
+            levels = [int(level) for level in args.concurrency.split(',') if level]
+            results.extend(bench_routes(app_module, sources, manifest, args.requests, levels, args.seed))
+        if 'datasources' in groups:
+            results.extend(bench_datasources(sources, manifest, args.requests, args.seed))
+        if 'ddtkorea' in groups:
+            results.extend(bench_ddtkorea(args.requests, data_dir))
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'corpus': manifest['params'],
+            'requests': args.requests,
+            'content_cache_mb': args.content_cache_mb,
+        },
+        'results': results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if output is not None:
+        output.write_text(text + '\n', encoding='utf-8')
+        log(f"结果已写入 {output}")
+    else:
+        print(text)
+
+    if baseline_file is not None:
+        with open(baseline_file, 'r', encoding='utf-8') as f:
+            regressions = compare(json.load(f), report, args.threshold)
+        for regression in regressions:
+            log(f"性能退化: {regression}")
+        if regressions:
+            sys.exit(1)
+        log('没有发现性能退化')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+import asyncio
+import concurrent.futures
+import threading
+from abc import ABC, abstractmethod
+from typing import List, Dict, Optional, Any, Tuple, Awaitable
+
+from .base import DataSource
+from .catalog import Version
+from .toc import ChapterTOC, Navigation
+
+class AsyncDataSource(ABC):
+    """异步数据源基类，接口与DataSource相同，所有方法都是协程"""
+
+    @abstractmethod
+    async def get_books(self) -> List[Dict[str, Any]]:
+        """获取所有书籍列表"""
+        pass
+
+    @abstractmethod
+    async def get_book_by_id(self, book_id: int) -> Optional[Dict[str, Any]]:
+        """根据ID获取书籍详情，不存在返回None"""
+        pass
+
+    async def get_books_by_ids(self, book_ids: List[int]) -> List[Dict[str, Any]]:
+        """批量获取书籍详情，默认实现同时获取每一本"""
+        books = await asyncio.gather(*(self.get_book_by_id(book_id) for book_id in book_ids))
+        return [book for book in books if book]
+
+    @abstractmethod
+    async def get_chapters(self, book_id: int) -> List[Dict[str, Any]]:
+        """获取指定书籍的所有章节"""
+        pass
+
+    async def get_chapter_toc(self, book_id: int) -> ChapterTOC:
+        """获取指定书籍的目录，默认实现每次根据get_chapters构建"""
+        return ChapterTOC(await self.get_chapters(book_id))
+
+    async def get_chapter_navigation(self, book_id: int, chapter_id: int) -> Optional[Navigation]:
+        """获取章节及其上一章、下一章，章节不存在返回None"""
+        return (await self.get_chapter_toc(book_id)).neighbors(chapter_id)
+
+    async def get_chapters_page(self, book_id: int, offset: int = 0,
+                                limit: int = 100) -> Tuple[int, List[Dict[str, Any]]]:
+        """获取指定书籍的一段章节，默认实现对目录切片"""
+        toc = await self.get_chapter_toc(book_id)
+        return len(toc), toc.chapters[offset:offset + limit]
+
+    @abstractmethod
+    async def get_chapter_content(self, book_id: int, chapter_id: int) -> Optional[str]:
+        """获取指定章节的内容，不存在返回None"""
+        pass
+
+    async def get_version(self, book_id: Optional[int] = None, chapter_id: Optional[int] = None) -> Optional[Version]:
+        """获取数据版本，用于生成HTTP缓存验证器，默认返回None"""
+        return None
+
+    @abstractmethod
+    async def search_books(self, query: str) -> List[Dict[str, Any]]:
+        """搜索书籍"""
+        pass
+
+    async def search_books_page(self, query: str, offset: int = 0, limit: int = 20) -> Tuple[int, List[Dict[str, Any]]]:
+        """分页搜索书籍，默认实现对search_books的结果切片"""
+        results = await self.search_books(query)
+        return len(results), results[offset:offset + limit]
+
+    async def close(self) -> None:
+        """释放连接等资源"""
+        pass
+
+
+class SyncDataSourceAdapter(DataSource):
+    """把异步数据源包装成同步的DataSource，供Flask路由等同步代码调用
+
+    异步数据源运行在一个后台线程的事件循环中，所有调用线程共享这个循环，
+    因此对上游的并发请求数不再受调用线程数限制。
+    """
+
+    def __init__(self, source: AsyncDataSource, timeout: Optional[float] = 60):
+        """初始化适配器
+
+        Args:
+            source (AsyncDataSource): 被包装的异步数据源
+            timeout (Optional[float]): 每次调用的等待上限（秒），None表示一直等待
+        """
+        self.source = source
+        self.timeout = timeout
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name='async-datasource', daemon=True)
+        self._thread.start()
+
+    def _call(self, coro: Awaitable[Any]) -> Any:
+        """在后台事件循环中执行协程并等待结果"""
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return future.result(self.timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    def get_books(self) -> List[Dict[str, Any]]:
+        """获取所有书籍列表"""
+        return self._call(self.source.get_books())
+
+    def get_book_by_id(self, book_id: int) -> Optional[Dict[str, Any]]:
+        """根据ID获取书籍详情"""
+        return self._call(self.source.get_book_by_id(book_id))
+
+    def get_books_by_ids(self, book_ids: List[int]) -> List[Dict[str, Any]]:
+        """批量获取书籍详情"""
+        return self._call(self.source.get_books_by_ids(book_ids))
+
+    def get_chapters(self, book_id: int) -> List[Dict[str, Any]]:
+        """获取指定书籍的所有章节"""
+        return self._call(self.source.get_chapters(book_id))
+
+    def get_chapter_toc(self, book_id: int) -> ChapterTOC:
+        """获取指定书籍的目录"""
+        return self._call(self.source.get_chapter_toc(book_id))
+
+    def get_chapter_navigation(self, book_id: int, chapter_id: int) -> Optional[Navigation]:
+        """获取章节及其上一章、下一章"""
+        return self._call(self.source.get_chapter_navigation(book_id, chapter_id))
+
+    def get_chapters_page(self, book_id: int, offset: int = 0, limit: int = 100) -> Tuple[int, List[Dict[str, Any]]]:
+        """获取指定书籍的一段章节"""
+        return self._call(self.source.get_chapters_page(book_id, offset, limit))
+
+    def get_chapter_content(self, book_id: int, chapter_id: int) -> Optional[str]:
+        """获取指定章节的内容"""
+        return self._call(self.source.get_chapter_content(book_id, chapter_id))
+
+    def get_version(self, book_id: Optional[int] = None, chapter_id: Optional[int] = None) -> Optional[Version]:
+        """获取数据版本"""
+        return self._call(self.source.get_version(book_id, chapter_id))
+
+    def search_books(self, query: str) -> List[Dict[str, Any]]:
+        """搜索书籍"""
+        return self._call(self.source.search_books(query))
+
+    def search_books_page(self, query: str, offset: int = 0, limit: int = 20) -> Tuple[int, List[Dict[str, Any]]]:
+        """分页搜索书籍"""
+        return self._call(self.source.search_books_page(query, offset, limit))
+
+    def close(self) -> None:
+        """关闭异步数据源并停止事件循环"""
+        if not self.loop.is_running():
+            return
+        self._call(self.source.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
@@ -1,5 +1,8 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Iterator, Tuple
+
+from .catalog import Version
+from .toc import ChapterTOC, Navigation
 
 class DataSource(ABC):
     """数据源基类，定义所有数据源必须实现的接口"""
@@ -25,6 +28,19 @@ class DataSource(ABC):
         """
         pass
     
+    def get_books_by_ids(self, book_ids: List[int]) -> List[Dict[str, Any]]:
+        """批量获取书籍详情
+        
+        默认实现逐本调用get_book_by_id，能批量查询的数据源可以覆盖此方法
+        
+        Args:
+            book_ids (List[int]): 书籍ID列表
+            
+        Returns:
+            List[Dict[str, Any]]: 按book_ids顺序排列的书籍详情，不存在的书籍跳过
+        """
+        return [book for book in (self.get_book_by_id(book_id) for book_id in book_ids) if book]
+    
     @abstractmethod
     def get_chapters(self, book_id: int) -> List[Dict[str, Any]]:
         """获取指定书籍的所有章节
@@ -37,6 +53,47 @@ class DataSource(ABC):
         """
         pass
     
+    def get_chapter_toc(self, book_id: int) -> ChapterTOC:
+        """获取指定书籍的目录
+        
+        默认实现每次根据get_chapters构建，数据源可以覆盖此方法缓存目录
+        
+        Args:
+            book_id (int): 书籍ID
+            
+        Returns:
+            ChapterTOC: 书籍目录
+        """
+        return ChapterTOC(self.get_chapters(book_id))
+    
+    def get_chapter_navigation(self, book_id: int, chapter_id: int) -> Optional[Navigation]:
+        """获取章节及其上一章、下一章
+        
+        Args:
+            book_id (int): 书籍ID
+            chapter_id (int): 章节ID
+            
+        Returns:
+            Optional[Navigation]: (上一章, 当前章, 下一章)，章节不存在返回None
+        """
+        return self.get_chapter_toc(book_id).neighbors(chapter_id)
+    
+    def get_chapters_page(self, book_id: int, offset: int = 0, limit: int = 100) -> Tuple[int, List[Dict[str, Any]]]:
+        """获取指定书籍的一段章节
+        
+        默认实现对缓存的目录切片，不复制整个章节列表；能按范围查询的数据源可以覆盖此方法
+        
+        Args:
+            book_id (int): 书籍ID
+            offset (int): 起始位置
+            limit (int): 章节数量
+            
+        Returns:
+            Tuple[int, List[Dict[str, Any]]]: (章节总数, 这一段的章节列表)
+        """
+        toc = self.get_chapter_toc(book_id)
+        return len(toc), toc.chapters[offset:offset + limit]
+    
     @abstractmethod
     def get_chapter_content(self, book_id: int, chapter_id: int) -> Optional[str]:
         """获取指定章节的内容
@@ -50,6 +107,25 @@ class DataSource(ABC):
         """
         pass
     
+    def iter_chapter_content(self, book_id: int, chapter_id: int,
+                             chunk_size: int = 64 * 1024) -> Optional[Iterator[str]]:
+        """逐块获取指定章节的内容，用于流式输出很大的章节
+        
+        默认实现读取整章后切块，能分块读取文件或数据库的数据源可以覆盖此方法，使内存占用与章节大小无关
+        
+        Args:
+            book_id (int): 书籍ID
+            chapter_id (int): 章节ID
+            chunk_size (int): 每块的大致大小（字节或字符）
+            
+        Returns:
+            Optional[Iterator[str]]: 章节内容的文本块，如果不存在返回None
+        """
+        content = self.get_chapter_content(book_id, chapter_id)
+        if content is None:
+            return None
+        return (content[i:i + chunk_size] for i in range(0, len(content), chunk_size))
+    
     @abstractmethod
     def search_books(self, query: str) -> List[Dict[str, Any]]:
         """搜索书籍
@@ -60,4 +136,34 @@ class DataSource(ABC):
         Returns:
             List[Dict[str, Any]]: 符合条件的书籍列表
         """
-        pass
\ No newline at end of file
+        pass
+    
+    def get_version(self, book_id: Optional[int] = None, chapter_id: Optional[int] = None) -> Optional[Version]:
+        """获取数据版本，用于生成ETag和Last-Modified，数据变化时版本随之变化
+        
+        应只查看文件签名等元数据，不读取内容。默认实现返回None，表示无法廉价地判断数据是否变化
+        
+        Args:
+            book_id (Optional[int]): 书籍ID，为None时表示书籍目录（书籍列表、搜索结果）
+            chapter_id (Optional[int]): 章节ID，为None时表示书籍详情和章节列表
+            
+        Returns:
+            Optional[Version]: (版本标识, 最后修改时间mtime_ns)，数据不存在或无法判断时返回None
+        """
+        return None
+    
+    def search_books_page(self, query: str, offset: int = 0, limit: int = 20) -> Tuple[int, List[Dict[str, Any]]]:
+        """分页搜索书籍
+        
+        默认实现对search_books的结果切片，有索引的数据源可以覆盖此方法
+        
+        Args:
+            query (str): 搜索关键词
+            offset (int): 结果偏移
+            limit (int): 每页数量
+            
+        Returns:
+            Tuple[int, List[Dict[str, Any]]]: (结果总数, 当前页的书籍列表)
+        """
+        results = self.search_books(query)
+        return len(results), results[offset:offset + limit]
@@ -0,0 +1,225 @@
+import itertools
+import sys
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Optional, Any, Callable, Hashable, Iterator, Tuple
+
+from .base import DataSource
+from .catalog import Version
+from .toc import ChapterTOC, Navigation
+
+
+class LRUCache:
+    """按字节数限制容量的LRU缓存，线程安全"""
+
+    def __init__(self, max_bytes: int, max_item_bytes: Optional[int] = None,
+                 sizeof: Callable[[Any], int] = sys.getsizeof):
+        """初始化缓存
+
+        Args:
+            max_bytes (int): 缓存总字节数上限
+            max_item_bytes (Optional[int]): 单个条目字节数上限，超过的条目不缓存，默认为总上限的1/8
+            sizeof (Callable): 计算条目占用字节数的函数
+        """
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes if max_item_bytes is not None else max_bytes // 8
+        self.sizeof = sizeof
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.current_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, valid: Optional[Callable[[Any], bool]] = None) -> Optional[Any]:
+        """获取缓存条目，不存在返回None
+
+        Args:
+            key (Hashable): 缓存键
+            valid (Optional[Callable]): 检查条目是否仍然有效，无效的条目删除并计为未命中
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and valid is not None and not valid(entry[0]):
+                del self._entries[key]
+                self.current_bytes -= entry[1]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any) -> bool:
+        """写入缓存条目，必要时淘汰最久未用的条目
+
+        Returns:
+            bool: 是否写入成功，条目过大时不写入
+        """
+        size = self.sizeof(value)
+        if size > self.max_item_bytes:
+            return False
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+        return True
+
+    def invalidate(self, predicate: Optional[Callable[[Hashable], bool]] = None) -> int:
+        """删除满足条件的条目，predicate为None时清空
+
+        Returns:
+            int: 删除的条目数
+        """
+        with self._lock:
+            if predicate is None:
+                keys = list(self._entries)
+            else:
+                keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                self.current_bytes -= self._entries.pop(key)[1]
+            return len(keys)
+
+    def stats(self) -> Dict[str, int]:
+        """获取缓存统计信息"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+
+class CachedDataSource(DataSource):
+    """为任意数据源加上章节内容内存缓存，其余接口直接转发给被包装的数据源
+
+    每个条目记录读取时章节的数据版本（get_version），命中时版本不一致即视为未命中，章节文件被修改后
+    不会返回旧内容；无法提供版本的数据源以None作为版本。
+    """
+
+    def __init__(self, source: DataSource, max_bytes: int = 64 * 1024 * 1024,
+                 max_item_bytes: Optional[int] = None):
+        """初始化缓存数据源
+
+        Args:
+            source (DataSource): 被包装的数据源
+            max_bytes (int): 章节内容缓存的字节数上限，默认64MB
+            max_item_bytes (Optional[int]): 单个章节字节数上限，默认为总上限的1/8
+        """
+        self.source = source
+        # 条目为(版本, 内容)，只按内容计算大小
+        self.content_cache = LRUCache(max_bytes, max_item_bytes, sizeof=lambda entry: sys.getsizeof(entry[1]))
+
+    def __getattr__(self, name: str) -> Any:
+        # 数据源特有的属性和方法直接转发
+        if name == 'source':
+            raise AttributeError(name)
+        return getattr(self.source, name)
+
+    def get_books(self) -> List[Dict[str, Any]]:
+        """获取所有书籍列表"""
+        return self.source.get_books()
+
+    def get_book_by_id(self, book_id: int) -> Optional[Dict[str, Any]]:
+        """根据ID获取书籍详情"""
+        return self.source.get_book_by_id(book_id)
+
+    def get_books_by_ids(self, book_ids: List[int]) -> List[Dict[str, Any]]:
+        """批量获取书籍详情"""
+        return self.source.get_books_by_ids(book_ids)
+
+    def get_chapters(self, book_id: int) -> List[Dict[str, Any]]:
+        """获取指定书籍的所有章节"""
+        return self.source.get_chapters(book_id)
+
+    def get_chapter_toc(self, book_id: int) -> ChapterTOC:
+        """获取指定书籍的目录"""
+        return self.source.get_chapter_toc(book_id)
+
+    def get_chapter_navigation(self, book_id: int, chapter_id: int) -> Optional[Navigation]:
+        """获取章节及其上一章、下一章"""
+        return self.source.get_chapter_navigation(book_id, chapter_id)
+
+    def get_chapters_page(self, book_id: int, offset: int = 0, limit: int = 100) -> Tuple[int, List[Dict[str, Any]]]:
+        """获取指定书籍的一段章节"""
+        return self.source.get_chapters_page(book_id, offset, limit)
+
+    def get_chapter_content(self, book_id: int, chapter_id: int) -> Optional[str]:
+        """获取指定章节的内容，优先从内存缓存读取"""
+        key = (int(book_id), int(chapter_id))
+        version = self.source.get_version(book_id, chapter_id)
+        content = self._cached(key, version)
+        if content is None:
+            content = self.source.get_chapter_content(book_id, chapter_id)
+            if content:
+                self.content_cache.put(key, (version, content))
+        return content
+
+    def _cached(self, key: Tuple[int, int], version: Optional[Version]) -> Optional[str]:
+        """获取缓存的章节内容，版本与当前版本不一致时返回None"""
+        entry = self.content_cache.get(key, lambda entry: entry[0] == version)
+        return entry[1] if entry is not None else None
+
+    def iter_chapter_content(self, book_id: int, chapter_id: int,
+                             chunk_size: int = 64 * 1024) -> Optional[Iterator[str]]:
+        """逐块获取指定章节的内容
+
+        缓存命中时对缓存的内容切块；未命中时逐块读取被包装的数据源，只有一块的章节顺便放入缓存，
+        更大的章节不缓存，避免一次读入整章
+        """
+        key = (int(book_id), int(chapter_id))
+        version = self.source.get_version(book_id, chapter_id)
+        content = self._cached(key, version)
+        if content is not None:
+            return (content[i:i + chunk_size] for i in range(0, len(content), chunk_size))
+        chunks = self.source.iter_chapter_content(book_id, chapter_id, chunk_size)
+        if chunks is None:
+            return None
+        first = next(chunks, '')
+        second = next(chunks, None)
+        if second is None:
+            if first:
+                self.content_cache.put(key, (version, first))
+            return iter((first,) if first else ())
+        return itertools.chain((first, second), chunks)
+
+    def get_version(self, book_id: Optional[int] = None, chapter_id: Optional[int] = None) -> Optional[Version]:
+        """获取数据版本"""
+        return self.source.get_version(book_id, chapter_id)
+
+    def search_books(self, query: str) -> List[Dict[str, Any]]:
+        """搜索书籍"""
+        return self.source.search_books(query)
+
+    def search_books_page(self, query: str, offset: int = 0, limit: int = 20) -> Tuple[int, List[Dict[str, Any]]]:
+        """分页搜索书籍"""
+        return self.source.search_books_page(query, offset, limit)
+
+    def invalidate(self, book_id: Optional[int] = None, chapter_id: Optional[int] = None) -> int:
+        """删除缓存的章节内容
+
+        Args:
+            book_id (Optional[int]): 书籍ID，为None时清空全部缓存
+            chapter_id (Optional[int]): 章节ID，为None时删除整本书
+
+        Returns:
+            int: 删除的条目数
+        """
+        if book_id is None:
+            return self.content_cache.invalidate()
+        if chapter_id is None:
+            return self.content_cache.invalidate(lambda key: key[0] == int(book_id))
+        return self.content_cache.invalidate(lambda key: key == (int(book_id), int(chapter_id)))
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import threading
+import time
+from pathlib import Path
+from typing import List, Dict, Optional, Any, Tuple, Iterable, Callable
+
+# 文件签名：(mtime_ns, size)，文件不存在时为None
+Signature = Optional[Tuple[int, int]]
+
+# 数据版本：(版本标识, 最后修改时间mtime_ns)，用于生成HTTP缓存验证器
+Version = Tuple[str, int]
+
+_UNLOADED = object()
+
+
+def file_signature(path: Path) -> Signature:
+    """获取文件签名，用于判断文件是否发生变化
+
+    Args:
+        path (Path): 文件路径
+
+    Returns:
+        Signature: (mtime_ns, size)，文件不存在时返回None
+    """
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def combine_signatures(signatures: Iterable[Signature]) -> Optional[Version]:
+    """把多个文件签名合并成一个数据版本
+
+    Args:
+        signatures (Iterable[Signature]): 文件签名
+
+    Returns:
+        Optional[Version]: 数据版本，任一文件不存在时返回None
+    """
+    signatures = list(signatures)
+    if not signatures or any(signature is None for signature in signatures):
+        return None
+    tag = hashlib.blake2b(repr(signatures).encode('ascii'), digest_size=8).hexdigest()
+    return tag, max(mtime for mtime, _ in signatures)
+
+
+class Catalog:
+    """书籍目录快照，构建完成后不再修改"""
+
+    __slots__ = ('books', 'by_id', 'signature')
+
+    def __init__(self, books: List[Dict[str, Any]], signature: Signature = None):
+        """初始化目录快照
+
+        Args:
+            books (List[Dict[str, Any]]): 书籍列表
+            signature (Signature): 生成该快照的文件签名
+        """
+        self.books = books
+        self.by_id = {int(b['id']): b for b in books}
+        self.signature = signature
+
+    def get(self, book_id: int) -> Optional[Dict[str, Any]]:
+        """按ID查找书籍，O(1)"""
+        return self.by_id.get(int(book_id))
+
+
+class CatalogIndex:
+    """常驻内存的书籍目录索引
+
+    以books.json的mtime/size作为版本，文件变化时整体重建一份新快照，
+    再通过一次引用赋值替换旧快照，正在处理的请求始终看到完整的目录。
+    check_interval秒内不会重复stat文件，热路径上没有磁盘I/O。
+    """
+
+    def __init__(self, books_info_file: Path, check_interval: float = 1.0,
+                 snapshot: Optional[Callable[[Signature], Optional[Any]]] = None):
+        """初始化目录索引
+
+        Args:
+            books_info_file (Path): 书籍信息文件路径
+            check_interval (float): 检查文件变化的最小间隔（秒），0表示每次都检查
+            snapshot (Optional[Callable]): 按books.json的签名从快照取得目录的函数（见snapshot.SnapshotFile），
+                快照与文件不一致时返回None，改为解析books.json
+        """
+        self.books_info_file = Path(books_info_file)
+        self.check_interval = check_interval
+        self.snapshot = snapshot
+        self._catalog = Catalog([])
+        self._signature = _UNLOADED
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> Catalog:
+        """获取当前目录快照，必要时重新加载"""
+        if time.monotonic() >= self._next_check:
+            self.refresh()
+        return self._catalog
+
+    def refresh(self, force: bool = False) -> bool:
+        """检查文件签名，变化时重新加载
+
+        已有快照时，如果其他线程正在重建，直接沿用旧快照而不等待。
+
+        Args:
+            force (bool): 忽略签名强制重新加载
+
+        Returns:
+            bool: 是否替换了快照
+        """
+        blocking = self._signature is _UNLOADED
+        if not self._lock.acquire(blocking=blocking):
+            return False
+        try:
+            signature = file_signature(self.books_info_file)
+            self._next_check = time.monotonic() + self.check_interval
+            if not force and signature == self._signature:
+                return False
+
+            catalog = self.snapshot(signature) if self.snapshot is not None and signature is not None else None
+            if catalog is None:
+                books = self._load_books()
+                if books is None:
+                    # 文件可能正在写入，保留旧快照，下次检查时重试
+                    return False
+                catalog = Catalog(books, signature)
+
+            self._catalog = catalog
+            self._signature = signature
+            return True
+        finally:
+            self._lock.release()
+
+    def _load_books(self) -> Optional[List[Dict[str, Any]]]:
+        """读取books.json，解析失败返回None"""
+        try:
+            with open(self.books_info_file, 'r', encoding='utf-8') as f:
+                return json.load(f)['books']
+        except FileNotFoundError:
+            return []
+        except (ValueError, KeyError) as e:
+            print(f"加载书籍目录失败: {self.books_info_file}, 错误: {e}")
+            return None
@@ -0,0 +1,500 @@
+import argparse
+import codecs
+import heapq
+import json
+import os
+import struct
+import tempfile
+import threading
+import zlib
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import List, Optional, Iterable, Iterator, Tuple
+
+from .catalog import Signature, file_signature
+
+try:
+    import zstandard
+except ImportError:  # zstandard是可选依赖，没有安装时使用zlib
+    zstandard = None
+
+# 压缩算法编号，写入字典文件和压缩章节的文件头
+ZLIB = 1
+ZSTD = 2
+ALGORITHMS = {'zlib': ZLIB, 'zstd': ZSTD}
+
+# 压缩章节文件：<章节ID>.txt.z
+#   文件头  magic(2) 算法(1) 字典ID(4，字典内容的CRC32，0表示未使用字典)
+#   正文    压缩后的UTF-8正文
+COMPRESSED_SUFFIX = '.z'
+FRAME = struct.Struct('<2sBI')
+FRAME_MAGIC = b'BZ'
+
+# 每本书的字典文件：magic(2) 算法(1) 字典内容
+DICT_FILE = 'chapters.dict'
+DICT_HEADER = struct.Struct('<2sB')
+DICT_MAGIC = b'BD'
+
+# zlib只能引用最近32KB的内容，字典再大也没有用
+ZLIB_MAX_DICT = 32 * 1024
+
+
+class CompressionError(ValueError):
+    """压缩章节无法解压（格式错误、缺少字典或缺少压缩库）"""
+
+
+def iter_utf8(blocks: Iterable[bytes]) -> Iterator[str]:
+    """把逐块读取的UTF-8字节解码为文本块，跨块的多字节字符留到下一块
+
+    Args:
+        blocks (Iterable[bytes]): UTF-8字节块
+
+    Returns:
+        Iterator[str]: 非空的文本块
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    for block in blocks:
+        text = decoder.decode(block)
+        if text:
+            yield text
+    text = decoder.decode(b'', final=True)
+    if text:
+        yield text
+
+
+def _cover_dictionary(samples: List[bytes], size: int, k: int = 8, segment: int = 64,
+                      max_sample_bytes: int = 1024 * 1024) -> bytes:
+    """从样本中挑选最常见的片段组成原始内容字典（简化的COVER算法）
+
+    把样本切成固定长度的片段，片段得分为其中在多个样本中出现过的k字节子串的样本数之和。
+    每次选出得分最高的片段后，其中的子串不再计分，避免字典中出现重复内容。
+    得分越高的片段放在字典越靠后的位置，离正文越近，压缩时引用的代价越小。
+
+    Args:
+        samples (List[bytes]): 训练样本
+        size (int): 字典大小上限（字节）
+        k (int): 子串长度
+        segment (int): 片段长度
+        max_sample_bytes (int): 参与训练的样本总字节数上限，超过时均匀抽样
+
+    Returns:
+        bytes: 字典内容
+    """
+    total = sum(len(sample) for sample in samples)
+    if total > max_sample_bytes:
+        step = total / max_sample_bytes
+        samples = [samples[int(i * step)] for i in range(int(len(samples) / step))] or samples[:1]
+
+    # 每个子串出现在多少个样本中
+    frequency = Counter()
+    for sample in samples:
+        frequency.update({sample[i:i + k] for i in range(len(sample) - k + 1)})
+
+    def score(data: bytes) -> int:
+        return sum(frequency[kmer] for kmer in {data[i:i + k] for i in range(len(data) - k + 1)}
+                   if frequency[kmer] > 1)
+
+    heap = []
+    for sample in samples:
+        for start in range(0, len(sample), segment):
+            data = sample[start:start + segment]
+            value = score(data)
+            if value > 0:
+                heap.append((-value, len(heap), data))
+    heapq.heapify(heap)
+
+    chosen = []
+    used = 0
+    while heap and used < size:
+        neg_value, order, data = heapq.heappop(heap)
+        # 之前选中的片段可能已经覆盖了部分子串，重新计分后仍是最高才选用
+        value = score(data)
+        if value <= 0:
+            continue
+        if heap and value < -heap[0][0]:
+            heapq.heappush(heap, (-value, order, data))
+            continue
+        chosen.append(data)
+        used += len(data)
+        for i in range(len(data) - k + 1):
+            frequency[data[i:i + k]] = 0
+
+    return b''.join(reversed(chosen))[-size:]
+
+
+class ChapterStore:
+    """章节正文的读写，支持按书训练字典的压缩格式，线程安全
+
+    读取时自动识别普通文本和压缩文件，因此压缩过和未压缩的书库可以混用。
+    """
+
+    def __init__(self, compress: bool = False, algorithm: str = 'auto', level: Optional[int] = None,
+                 dict_size: int = 64 * 1024, train_after: int = 8, max_dicts: int = 256):
+        """初始化章节存储
+
+        Args:
+            compress (bool): 写入章节时是否压缩，读取时优先查找压缩文件
+            algorithm (str): 压缩算法：zlib、zstd，或auto（安装了zstandard时使用zstd）
+            level (Optional[int]): 压缩级别，默认zlib为9，zstd为19
+            dict_size (int): 字典大小（字节），zlib最多使用32KB
+            train_after (int): 书中已有多少章后训练字典，之前写入的章节不使用字典
+            max_dicts (int): 内存中缓存的字典数量上限
+        """
+        if algorithm == 'auto':
+            algorithm = 'zstd' if zstandard is not None else 'zlib'
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"未知的压缩算法: {algorithm}")
+        if algorithm == 'zstd' and zstandard is None:
+            raise ImportError('zstd压缩需要安装zstandard')
+        self.compress = compress
+        self.algorithm = ALGORITHMS[algorithm]
+        self.level = level if level is not None else (19 if self.algorithm == ZSTD else 9)
+        self.dict_size = dict_size
+        self.train_after = train_after
+        self.max_dicts = max_dicts
+        self._dicts = OrderedDict()
+        self._lock = threading.Lock()
+        self._train_lock = threading.Lock()
+
+    def chapter_path(self, book_dir: Path, chapter_id: int) -> Path:
+        """写入章节时使用的文件路径"""
+        path = Path(book_dir) / f"{chapter_id}.txt"
+        return path.with_name(path.name + COMPRESSED_SUFFIX) if self.compress else path
+
+    def read(self, book_dir: Path, chapter_id: int) -> Optional[str]:
+        """读取章节正文，压缩文件和普通文本都支持
+
+        Returns:
+            Optional[str]: 章节正文，章节不存在或无法解压时返回None
+        """
+        path = Path(book_dir) / f"{chapter_id}.txt"
+        compressed = path.with_name(path.name + COMPRESSED_SUFFIX)
+        for candidate in ((compressed, path) if self.compress else (path, compressed)):
+            try:
+                return self.read_file(candidate)
+            except FileNotFoundError:
+                continue
+            except CompressionError as e:
+                print(f"解压章节失败: {candidate}, 错误: {e}")
+                return None
+        return None
+
+    def iter_read(self, book_dir: Path, chapter_id: int, chunk_size: int = 64 * 1024) -> Optional[Iterator[str]]:
+        """逐块读取章节正文，压缩文件边读边解压，内存占用与章节大小无关
+
+        文件在调用时打开，迭代结束或迭代器被关闭时关闭。
+
+        Args:
+            book_dir (Path): 书籍目录
+            chapter_id (int): 章节ID
+            chunk_size (int): 每次读取的字节数
+
+        Returns:
+            Optional[Iterator[str]]: 章节正文的文本块，章节不存在或无法解压时返回None
+        """
+        path = Path(book_dir) / f"{chapter_id}.txt"
+        compressed = path.with_name(path.name + COMPRESSED_SUFFIX)
+        for candidate in ((compressed, path) if self.compress else (path, compressed)):
+            try:
+                f = open(candidate, 'rb')
+            except FileNotFoundError:
+                continue
+            if candidate.suffix != COMPRESSED_SUFFIX:
+                return self._iter_file(f, iter(lambda: f.read(chunk_size), b''))
+            try:
+                algorithm, dict_data = self._frame(candidate.parent, f.read(FRAME.size))
+            except CompressionError as e:
+                f.close()
+                print(f"解压章节失败: {candidate}, 错误: {e}")
+                return None
+            if algorithm == ZSTD:
+                reader = zstandard.ZstdDecompressor(
+                    dict_data=zstandard.ZstdCompressionDict(dict_data) if dict_data else None).stream_reader(f)
+                blocks = iter(lambda: reader.read(chunk_size), b'')
+            else:
+                blocks = self._iter_inflate(f, dict_data, chunk_size)
+            return self._iter_file(f, blocks)
+        return None
+
+    @staticmethod
+    def _iter_file(f, blocks: Iterator[bytes]) -> Iterator[str]:
+        """解码字节块，结束时关闭文件"""
+        try:
+            yield from iter_utf8(blocks)
+        except (zlib.error, getattr(zstandard, 'ZstdError', zlib.error)) as e:
+            raise CompressionError(str(e)) from e
+        finally:
+            f.close()
+
+    @staticmethod
+    def _iter_inflate(f, dict_data: bytes, chunk_size: int) -> Iterator[bytes]:
+        """逐块解压zlib数据，每次输出不超过chunk_size字节"""
+        decompressor = zlib.decompressobj(-15, zdict=dict_data) if dict_data else zlib.decompressobj(-15)
+        data = f.read(chunk_size)
+        while data:
+            yield decompressor.decompress(data, chunk_size)
+            data = decompressor.unconsumed_tail or f.read(chunk_size)
+        yield decompressor.flush()
+
+    def signature(self, book_dir: Path, chapter_id: int) -> Signature:
+        """章节文件的签名，压缩文件和普通文本都支持，章节不存在时返回None"""
+        path = Path(book_dir) / f"{chapter_id}.txt"
+        compressed = path.with_name(path.name + COMPRESSED_SUFFIX)
+        for candidate in ((compressed, path) if self.compress else (path, compressed)):
+            signature = file_signature(candidate)
+            if signature is not None:
+                return signature
+        return None
+
+    def read_file(self, path: Path) -> str:
+        """读取一个章节文件，按文件名后缀决定是否解压
+
+        Raises:
+            FileNotFoundError: 文件不存在
+            CompressionError: 无法解压
+        """
+        if path.suffix != COMPRESSED_SUFFIX:
+            with open(path, 'r', encoding='utf-8') as f:
+                return f.read()
+        with open(path, 'rb') as f:
+            data = f.read()
+        return self.decode(path.parent, data)
+
+    def encode(self, book_dir: Path, text: str) -> bytes:
+        """用书籍的字典压缩章节正文，还没有字典时不使用字典"""
+        dictionary = self._dictionary(Path(book_dir))
+        algorithm, dict_id, data = dictionary if dictionary is not None else (self.algorithm, 0, b'')
+        raw = text.encode('utf-8')
+        if algorithm == ZSTD:
+            if zstandard is None:
+                raise CompressionError('书籍字典使用zstd压缩，需要安装zstandard')
+            dict_data = zstandard.ZstdCompressionDict(data) if data else None
+            payload = zstandard.ZstdCompressor(level=self.level, dict_data=dict_data).compress(raw)
+        else:
+            compressor = zlib.compressobj(min(self.level, 9), zlib.DEFLATED, -15, zdict=data) if data \
+                else zlib.compressobj(min(self.level, 9), zlib.DEFLATED, -15)
+            payload = compressor.compress(raw) + compressor.flush()
+        return FRAME.pack(FRAME_MAGIC, algorithm, dict_id) + payload
+
+    def decode(self, book_dir: Path, data: bytes) -> str:
+        """解压章节文件内容
+
+        Raises:
+            CompressionError: 格式错误、字典不匹配或缺少压缩库
+        """
+        algorithm, dict_data = self._frame(book_dir, data)
+        payload = memoryview(data)[FRAME.size:]
+        try:
+            if algorithm == ZSTD:
+                decompressor = zstandard.ZstdDecompressor(
+                    dict_data=zstandard.ZstdCompressionDict(dict_data) if dict_data else None)
+                # 压缩时写入了原始长度，解压不需要逐块扩容
+                raw = decompressor.decompress(payload)
+            else:
+                decompressor = zlib.decompressobj(-15, zdict=dict_data) if dict_data else zlib.decompressobj(-15)
+                raw = decompressor.decompress(payload) + decompressor.flush()
+        except (zlib.error, getattr(zstandard, 'ZstdError', zlib.error)) as e:
+            raise CompressionError(str(e)) from e
+        return raw.decode('utf-8')
+
+    def _frame(self, book_dir: Path, data: bytes) -> Tuple[int, bytes]:
+        """解析压缩章节的文件头
+
+        Returns:
+            Tuple[int, bytes]: (算法, 字典内容)，未使用字典时字典内容为空
+
+        Raises:
+            CompressionError: 格式错误、字典不匹配或缺少压缩库
+        """
+        if len(data) < FRAME.size:
+            raise CompressionError('文件头不完整')
+        magic, algorithm, dict_id = FRAME.unpack_from(data)
+        if magic != FRAME_MAGIC or algorithm not in ALGORITHMS.values():
+            raise CompressionError('不支持的文件格式')
+        if algorithm == ZSTD and zstandard is None:
+            raise CompressionError('章节使用zstd压缩，需要安装zstandard')
+        dict_data = b''
+        if dict_id:
+            dictionary = self._dictionary(Path(book_dir))
+            if dictionary is None or dictionary[1] != dict_id:
+                raise CompressionError('缺少压缩时使用的字典')
+            dict_data = dictionary[2]
+        return algorithm, dict_data
+
+    def write(self, book_dir: Path, chapter_id: int, text: str) -> Path:
+        """写入章节正文（先写临时文件再重命名）
+
+        Returns:
+            Path: 写入的文件路径
+        """
+        path = self.chapter_path(book_dir, chapter_id)
+        data = self.encode(book_dir, text) if self.compress else text.encode('utf-8')
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix='.tmp')
+        try:
+            with open(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        return path
+
+    def has_dictionary(self, book_dir: Path) -> bool:
+        """书籍是否已有字典"""
+        return (Path(book_dir) / DICT_FILE).exists()
+
+    def train(self, book_dir: Path, texts: Iterable[str]) -> bool:
+        """用书中的章节训练字典，书籍已有字典时不覆盖（已压缩的章节依赖原来的字典）
+
+        Returns:
+            bool: 是否写入了新字典
+        """
+        book_dir = Path(book_dir)
+        samples = [text.encode('utf-8') for text in texts if text]
+        if not samples:
+            return False
+        size = self.dict_size if self.algorithm == ZSTD else min(self.dict_size, ZLIB_MAX_DICT)
+        dictionary = None
+        if self.algorithm == ZSTD:
+            try:
+                dictionary = zstandard.train_dictionary(size, samples, level=self.level).as_bytes()
+            except zstandard.ZstdError:
+                # 样本太少时zstd无法训练，改用原始内容字典
+                pass
+        if dictionary is None:
+            dictionary = _cover_dictionary(samples, size)
+        if not dictionary:
+            return False
+
+        book_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=book_dir, prefix=f".{DICT_FILE}.", suffix='.tmp')
+        try:
+            with open(fd, 'wb') as f:
+                f.write(DICT_HEADER.pack(DICT_MAGIC, self.algorithm) + dictionary)
+            # 用硬链接代替重命名，其他进程先写好了字典时不会被覆盖
+            os.link(tmp_path, book_dir / DICT_FILE)
+            return True
+        except FileExistsError:
+            return False
+        finally:
+            os.unlink(tmp_path)
+
+    def maybe_train(self, book_dir: Path) -> bool:
+        """书中已缓存的章节足够多且还没有字典时，用这些章节训练字典
+
+        Returns:
+            bool: 是否写入了新字典
+        """
+        book_dir = Path(book_dir)
+        if not self.compress or self.has_dictionary(book_dir):
+            return False
+        with self._train_lock:
+            if self.has_dictionary(book_dir):
+                return False
+            paths = [path for path in book_dir.iterdir()
+                     if path.name.endswith('.txt') or path.name.endswith('.txt' + COMPRESSED_SUFFIX)]
+            if len(paths) < self.train_after:
+                return False
+            texts = []
+            for path in paths:
+                try:
+                    texts.append(self.read_file(path))
+                except (OSError, CompressionError):
+                    continue
+            return self.train(book_dir, texts)
+
+    def compress_book(self, book_dir: Path, keep: bool = False) -> Tuple[int, int, int]:
+        """压缩一本书的所有章节，书籍还没有字典时先用全部章节训练字典
+
+        Args:
+            book_dir (Path): 书籍目录，包含chapters.json
+            keep (bool): 是否保留原来的.txt文件
+
+        Returns:
+            Tuple[int, int, int]: (压缩的章节数, 原始字节数, 压缩后字节数)
+        """
+        book_dir = Path(book_dir)
+        with open(book_dir / 'chapters.json', 'r', encoding='utf-8') as f:
+            chapters = json.load(f)
+
+        texts = {}
+        for chapter in chapters:
+            text = self.read(book_dir, chapter['id'])
+            if text is not None:
+                texts[chapter['id']] = text
+        if not self.has_dictionary(book_dir):
+            self.train(book_dir, texts.values())
+
+        raw_bytes = stored_bytes = 0
+        for chapter_id, text in texts.items():
+            path = self.write(book_dir, chapter_id, text)
+            raw_bytes += len(text.encode('utf-8'))
+            stored_bytes += path.stat().st_size
+            if not keep:
+                try:
+                    os.unlink(book_dir / f"{chapter_id}.txt")
+                except FileNotFoundError:
+                    pass
+        return len(texts), raw_bytes, stored_bytes
+
+    def _dictionary(self, book_dir: Path) -> Optional[Tuple[int, int, bytes]]:
+        """读取并缓存书籍字典，字典文件变化时重新读取
+
+        Returns:
+            Optional[Tuple[int, int, bytes]]: (算法, 字典ID, 字典内容)，没有字典时返回None
+        """
+        path = book_dir / DICT_FILE
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        signature = (stat.st_mtime_ns, stat.st_size)
+        key = str(path)
+        with self._lock:
+            cached = self._dicts.get(key)
+            if cached is not None and cached[0] == signature:
+                self._dicts.move_to_end(key)
+                return cached[1]
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        magic, algorithm = DICT_HEADER.unpack_from(data) if len(data) >= DICT_HEADER.size else (None, None)
+        if magic != DICT_MAGIC or algorithm not in ALGORITHMS.values():
+            raise CompressionError(f"{path}: 字典格式错误")
+        content = data[DICT_HEADER.size:]
+        dictionary = (algorithm, zlib.crc32(content) or 1, content)
+
+        with self._lock:
+            self._dicts[key] = (signature, dictionary)
+            while len(self._dicts) > self.max_dicts:
+                self._dicts.popitem(last=False)
+        return dictionary
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """命令行：压缩书库中的章节正文"""
+    parser = argparse.ArgumentParser(description='按书训练字典并压缩章节正文')
+    parser.add_argument('--books-dir', default='data/books', help='书籍目录路径')
+    parser.add_argument('--algorithm', default='auto', choices=['auto'] + list(ALGORITHMS), help='压缩算法')
+    parser.add_argument('--keep', action='store_true', help='保留原来的.txt文件')
+    args = parser.parse_args(argv)
+
+    store = ChapterStore(compress=True, algorithm=args.algorithm)
+    total_chapters = total_raw = total_stored = 0
+    for book_dir in sorted(Path(args.books_dir).iterdir()):
+        if not (book_dir / 'chapters.json').exists():
+            continue
+        chapters, raw_bytes, stored_bytes = store.compress_book(book_dir, keep=args.keep)
+        total_chapters += chapters
+        total_raw += raw_bytes
+        total_stored += stored_bytes
+    ratio = total_raw / total_stored if total_stored else 0
+    print(f"压缩完成: 共{total_chapters}章，{total_raw}字节 -> {total_stored}字节（{ratio:.1f}倍）")
+
+
+if __name__ == '__main__':
+    main()
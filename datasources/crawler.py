@@ -0,0 +1,321 @@
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Dict, Optional, Any, Callable
+
+from .compression import ChapterStore
+from .ddtkorea import DDTKoreaDataSource
+from .http_client import HttpClient, RateLimiter
+
+
+def _write_json(path: Path, data: Any) -> None:
+    """先写临时文件再重命名，读取方不会看到写了一半的文件"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix='.tmp')
+    try:
+        with open(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+class CrawlStats:
+    """抓取进度和吞吐量统计，线程安全"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.books_total = 0
+        self.books_done = 0
+        self.chapters_total = 0
+        self.chapters_done = 0
+        self.chapters_skipped = 0
+        self.failures = 0
+        self.pages = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def add(self, **counts: int) -> None:
+        """累加计数"""
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def summary(self) -> str:
+        """当前进度和平均吞吐量"""
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        return (f"[{elapsed:.0f}秒] 书籍 {self.books_done}/{self.books_total}，"
+                f"章节 {self.chapters_done + self.chapters_skipped}/{self.chapters_total}"
+                f"（新抓取{self.chapters_done}，失败{self.failures}），"
+                f"{self.pages / elapsed:.1f}页/秒，{self.bytes / elapsed / 1024:.0f}KB/秒")
+
+
+class _BookJob:
+    """一本书的抓取任务，所有章节完成后写入chapters.json"""
+
+    def __init__(self, book: Dict[str, Any], chapters: List[Dict[str, Any]], remaining: int):
+        self.book = book
+        self.chapters = chapters
+        self.remaining = remaining
+        self.failures = 0
+        self.lock = threading.Lock()
+
+
+class Crawler:
+    """把DDTKorea的书籍批量镜像到本地书库（books.json + books/<书籍ID>/），供本地文件数据源直接使用
+
+    书籍详情、目录和章节都交给同一个线程池抓取，请求速率由HTTP客户端的限速器控制。
+    抓取状态保存在检查点文件中：已完成的书籍下次直接跳过，中断的书籍只补抓本地没有的章节；
+    refresh时重新抓取目录，同样只下载新增的章节。
+    """
+
+    def __init__(self, source: DDTKoreaDataSource, books_dir: str = 'data/books',
+                 books_file: str = 'data/books.json', state_file: str = 'data/crawl_state.json',
+                 workers: int = 8, chapter_store: Optional[ChapterStore] = None,
+                 progress_interval: float = 5.0, log: Callable[[str], None] = print):
+        """初始化爬虫
+
+        Args:
+            source (DDTKoreaDataSource): 提供页面地址、HTTP客户端和解析器的数据源
+            books_dir (str): 本地书库的书籍目录
+            books_file (str): 本地书库的书籍信息文件
+            state_file (str): 检查点文件
+            workers (int): 并发抓取的线程数
+            chapter_store (Optional[ChapterStore]): 章节正文的写入方式，可选压缩
+            progress_interval (float): 输出进度和保存检查点的间隔（秒）
+            log (Callable): 输出进度的函数
+        """
+        self.source = source
+        self.books_dir = Path(books_dir)
+        self.books_file = Path(books_file)
+        self.state_file = Path(state_file)
+        self.workers = workers
+        self.chapter_store = chapter_store or ChapterStore()
+        self.progress_interval = progress_interval
+        self.log = log
+        self.stats = CrawlStats()
+
+        self.state = self._load_json(self.state_file, {'books': {}})
+        self.books = {int(book['id']): book for book in self._load_json(self.books_file, {'books': []})['books']}
+        self._lock = threading.Lock()
+        # 未完成的任务数，归零时唤醒等待的主线程
+        self._pending = 0
+        self._idle = threading.Condition()
+        self._executor = None
+
+    def _load_json(self, path: Path, default: Any) -> Any:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return default
+
+    def _fetch(self, kind: str, *parts: Any) -> Any:
+        """抓取并解析页面，失败时返回None"""
+        url = self.source._page_url(kind, *parts)
+        return self._fetch_url(url, kind, *parts)
+
+    def _fetch_url(self, url: str, kind: str, *parts: Any) -> Any:
+        try:
+            response = self.source.http.get(url)
+        except Exception as e:
+            self.log(f"获取页面失败: {url}, 错误: {e}")
+            return None
+        response.encoding = 'utf-8'
+        self.stats.add(pages=1, bytes=len(response.content))
+        if kind == 'books':
+            # 数据源解析首页时只取前10本，镜像时需要列表页上的全部书籍
+            return self.source.parser.parse_book_list(response.text, '.novel-list .novel-item', limit=None)
+        return self.source._parse_page(kind, response.text, *parts)
+
+    # ---- 书籍列表 ----
+
+    def discover(self, max_pages: int = 100) -> List[int]:
+        """从书籍列表页收集书籍ID，第2页起使用?page=N，某页没有新书时停止
+
+        Args:
+            max_pages (int): 最多抓取的列表页数
+
+        Returns:
+            List[int]: 书籍ID列表
+        """
+        book_ids = []
+        list_url = self.source._page_url('books')
+        for page in range(1, max_pages + 1):
+            url = list_url if page == 1 else f"{list_url}?page={page}"
+            books = [book for book in self._fetch_url(url, 'books') or [] if book['id'] not in book_ids]
+            if not books:
+                break
+            book_ids.extend(book['id'] for book in books)
+        return book_ids
+
+    # ---- 抓取 ----
+
+    def run(self, book_ids: List[int], refresh: bool = False) -> CrawlStats:
+        """抓取书籍，直到全部完成
+
+        Args:
+            book_ids (List[int]): 要抓取的书籍ID
+            refresh (bool): 已完成的书籍也重新抓取目录，下载新增章节
+
+        Returns:
+            CrawlStats: 抓取统计
+        """
+        book_ids = list(dict.fromkeys(int(book_id) for book_id in book_ids))
+        self.stats.add(books_total=len(book_ids))
+        with self._lock:
+            # 新书按请求的顺序写入books.json，抓取完成前先占位
+            for book_id in book_ids:
+                self.books.setdefault(book_id, None)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='crawler')
+        try:
+            for book_id in book_ids:
+                if not refresh and self.state['books'].get(str(book_id), {}).get('complete'):
+                    self.stats.add(books_done=1)
+                    continue
+                self._submit(self._crawl_book, book_id)
+
+            while True:
+                with self._idle:
+                    if not self._pending:
+                        break
+                    self._idle.wait(self.progress_interval)
+                    if not self._pending:
+                        break
+                self.log(self.stats.summary())
+                self.save()
+        finally:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self.save()
+        self.log(self.stats.summary())
+        return self.stats
+
+    def _submit(self, func: Callable, *args: Any) -> None:
+        with self._idle:
+            self._pending += 1
+        self._executor.submit(self._run_task, func, *args)
+
+    def _run_task(self, func: Callable, *args: Any) -> None:
+        try:
+            func(*args)
+        except Exception as e:
+            self.log(f"抓取任务失败: {args}, 错误: {e}")
+            self.stats.add(failures=1)
+        finally:
+            with self._idle:
+                self._pending -= 1
+                if not self._pending:
+                    self._idle.notify_all()
+
+    def _crawl_book(self, book_id: int) -> None:
+        """抓取书籍详情和目录，再把本地没有的章节交给线程池"""
+        book = self._fetch('book', book_id)
+        chapters = self._fetch('chapters', book_id)
+        if not book or not chapters:
+            self.stats.add(failures=1, books_done=1)
+            return
+
+        book_dir = self.books_dir / str(book_id)
+        missing = [chapter for chapter in chapters
+                   if self.chapter_store.signature(book_dir, chapter['id']) is None]
+        self.stats.add(chapters_total=len(chapters), chapters_skipped=len(chapters) - len(missing))
+        job = _BookJob(book, chapters, len(missing))
+        if not missing:
+            self._finish_book(job)
+            return
+        for chapter in missing:
+            self._submit(self._crawl_chapter, job, chapter)
+
+    def _crawl_chapter(self, job: _BookJob, chapter: Dict[str, Any]) -> None:
+        book_id = int(job.book['id'])
+        content = self._fetch('chapter', book_id, chapter['id'])
+        if content:
+            book_dir = self.books_dir / str(book_id)
+            try:
+                self.chapter_store.write(book_dir, chapter['id'], content)
+                # 压缩存储时，书中章节足够多后训练字典
+                self.chapter_store.maybe_train(book_dir)
+            except OSError as e:
+                self.log(f"写入章节失败: {book_id}/{chapter['id']}, 错误: {e}")
+                content = None
+
+        if content:
+            self.stats.add(chapters_done=1)
+        else:
+            self.stats.add(failures=1)
+        with job.lock:
+            if not content:
+                job.failures += 1
+            job.remaining -= 1
+            finished = job.remaining == 0
+        if finished:
+            self._finish_book(job)
+
+    def _finish_book(self, job: _BookJob) -> None:
+        """写入chapters.json（只包含已下载的章节）并更新书籍信息和检查点"""
+        book_id = int(job.book['id'])
+        book_dir = self.books_dir / str(book_id)
+        chapters = [chapter for chapter in job.chapters
+                    if self.chapter_store.signature(book_dir, chapter['id']) is not None]
+        _write_json(book_dir / 'chapters.json', chapters)
+        with self._lock:
+            self.books[book_id] = job.book
+            self.state['books'][str(book_id)] = {'chapters': len(chapters), 'complete': job.failures == 0,
+                                                 'crawled_at': int(time.time())}
+        self.stats.add(books_done=1)
+
+    def save(self) -> None:
+        """保存books.json和检查点"""
+        with self._lock:
+            books = [book for book in self.books.values() if book is not None]
+            state = {'books': dict(self.state['books'])}
+        _write_json(self.books_file, {'books': books})
+        _write_json(self.state_file, state)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """命令行：把DDTKorea的书籍镜像到本地书库"""
+    parser = argparse.ArgumentParser(description='把DDTKorea的书籍批量镜像到本地书库')
+    parser.add_argument('--base-url', default='https://www.ddtkorea.com', help='网站地址')
+    parser.add_argument('--books', default='', help='要抓取的书籍ID，用逗号分隔；不指定时抓取书籍列表中的所有书')
+    parser.add_argument('--max-pages', type=int, default=100, help='最多抓取的书籍列表页数')
+    parser.add_argument('--books-dir', default='data/books', help='本地书库的书籍目录')
+    parser.add_argument('--books-file', default='data/books.json', help='本地书库的书籍信息文件')
+    parser.add_argument('--state', default='data/crawl_state.json', help='检查点文件')
+    parser.add_argument('--workers', type=int, default=8, help='并发抓取的线程数')
+    parser.add_argument('--rate', type=float, default=5.0, help='每个主机每秒的请求数，0表示不限速')
+    parser.add_argument('--burst', type=int, default=5, help='允许连续发出的请求数')
+    parser.add_argument('--refresh', action='store_true', help='重新抓取已完成书籍的目录，只下载新增章节')
+    parser.add_argument('--compress', action='store_true', help='压缩存储章节正文')
+    parser.add_argument('--progress-interval', type=float, default=5.0, help='输出进度的间隔（秒）')
+    args = parser.parse_args(argv)
+
+    # 数据源只用来生成页面地址和解析页面，抓取结果直接写入本地书库，不使用它的缓存目录
+    with tempfile.TemporaryDirectory() as cache_dir:
+        source = DDTKoreaDataSource(args.base_url, cache_dir=cache_dir, prefetch_workers=0, refresh_workers=0)
+        http = source.http = HttpClient(headers=source.headers, pool_maxsize=args.workers,
+                                        rate_limiter=RateLimiter(args.rate, args.burst))
+        crawler = Crawler(source, books_dir=args.books_dir, books_file=args.books_file, state_file=args.state,
+                          workers=args.workers, chapter_store=ChapterStore(compress=args.compress),
+                          progress_interval=args.progress_interval)
+        book_ids = [int(value) for value in args.books.split(',') if value.strip()]
+        if not book_ids:
+            book_ids = crawler.discover(args.max_pages)
+            print(f"书籍列表中共有{len(book_ids)}本书")
+        try:
+            crawler.run(book_ids, refresh=args.refresh)
+        finally:
+            http.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,48 +1,130 @@
-import requests
-import re
+import os
 import json
+import tempfile
+import threading
 import time
+from collections import OrderedDict
 from pathlib import Path
 from typing import List, Dict, Optional, Any
-from bs4 import BeautifulSoup
 
 from .base import DataSource
+from .catalog import Version, combine_signatures, file_signature
+from .compression import COMPRESSED_SUFFIX, ChapterStore
+from .disk_cache import CacheIndex, hashed_name, shard_path
+from .http_client import HttpClient
+from .metrics import CACHE_LOOKUPS, PARSE_SECONDS, UPSTREAM_ERRORS, UPSTREAM_SECONDS
+from .parsers import DDTKoreaParser
+from .prefetch import Prefetcher
+from .singleflight import SingleFlight
+from .toc import ChapterTOC, TOCCache
+
+# 记录后台刷新时间的key数上限
+MAX_REFRESH_ATTEMPTS = 10000
+
+
+def record_refresh(attempts: 'OrderedDict[tuple, float]', key: tuple, now: float, interval: float) -> None:
+    """记录一次后台刷新尝试，并删除已超过刷新间隔、不再起限流作用的记录
+
+    记录按时间从旧到新排列，只需从头部删除；仍然超过上限时删除最旧的记录，不会一次清空所有key的限流。
+    """
+    attempts[key] = now
+    attempts.move_to_end(key)
+    while attempts:
+        oldest_key, oldest = next(iter(attempts.items()))
+        if now - oldest < interval and len(attempts) <= MAX_REFRESH_ATTEMPTS:
+            break
+        del attempts[oldest_key]
 
 class DDTKoreaDataSource(DataSource):
     """韩国小说网站数据源，通过爬虫从DDTKorea获取数据"""
     
-    def __init__(self, base_url: str = 'https://www.ddtkorea.com', cache_dir: str = 'data/cache/ddtkorea'):
+    def __init__(self, base_url: str = 'https://www.ddtkorea.com', cache_dir: str = 'data/cache/ddtkorea',
+                 http_client: Optional[HttpClient] = None, prefetch_workers: int = 2,
+                 prefetch_first: int = 3, read_ahead: int = 2, max_age: int = 86400, search_max_age: int = 3600,
+                 max_stale: int = 7 * 86400, refresh_workers: int = 1, refresh_interval: float = 60,
+                 parser: str = 'auto',
+                 chapter_store: Optional[ChapterStore] = None, cache_max_bytes: int = 1024 * 1024 * 1024,
+                 cache_max_idle: float = 30 * 86400, janitor_interval: float = 600):
         """初始化DDTKorea数据源
         
         Args:
             base_url (str): DDTKorea基础URL
             cache_dir (str): 缓存目录路径
+            http_client (Optional[HttpClient]): HTTP客户端，默认创建带连接池和重试的客户端
+            prefetch_workers (int): 后台预取线程数，0表示禁用预取
+            prefetch_first (int): 打开书籍时预取的前几章数量
+            read_ahead (int): 阅读章节时预取的后续章节数量
+            max_age (int): 书籍、章节列表和章节内容缓存的有效期（秒），过期后重新抓取或在后台刷新
+            search_max_age (int): 搜索结果缓存的有效期（秒）
+            max_stale (int): 缓存过期后仍可先返回旧数据的最长时间（秒），0表示过期即同步抓取
+            refresh_workers (int): 后台刷新过期缓存的线程数，0表示禁用后台刷新
+            refresh_interval (float): 同一缓存两次后台刷新之间的最小间隔（秒）
+            parser (str): HTML解析后端：html.parser、lxml，或auto（安装了lxml时使用lxml）
+            chapter_store (Optional[ChapterStore]): 章节内容缓存的存储方式，压缩时每本书缓存一定章数后训练字典
+            cache_max_bytes (int): 缓存目录的总字节数上限，超出时删除最久未访问的文件，0表示不限制
+            cache_max_idle (float): 缓存文件多少秒未被访问后删除，0表示不按时间删除
+            janitor_interval (float): 后台清理缓存目录的间隔（秒），0表示不清理
         """
         self.base_url = base_url
+        self.parser = DDTKoreaParser(base_url, parser)
         self.cache_dir = Path(cache_dir)
         self.cache_dir.mkdir(parents=True, exist_ok=True)
         
+        # 缓存文件的大小和访问时间索引，后台按容量和访问时间清理
+        self.cache_index = CacheIndex(self.cache_dir, max_bytes=cache_max_bytes, max_idle=cache_max_idle,
+                                      interval=janitor_interval)
+        
+        # 按章节缓存文件签名缓存的书籍目录
+        self.tocs = TOCCache()
+        
+        # 章节内容缓存文件的读写，可选压缩
+        self.chapter_store = chapter_store or ChapterStore()
+        
         # 请求头，模拟浏览器访问
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
+        
+        # 线程间共享的连接池，复用TCP/TLS连接
+        self.http = http_client or HttpClient(headers=self.headers)
+        
+        # 后台预取章节内容，不阻塞当前请求
+        self.prefetcher = Prefetcher(workers=prefetch_workers, name='ddtkorea-prefetch')
+        self.prefetch_first = prefetch_first
+        self.read_ahead = read_ahead
+        
+        # 同一页面的并发抓取合并为一次
+        self._flight = SingleFlight()
+        
+        # 过期缓存的后台刷新
+        self.max_age = max_age
+        self.search_max_age = search_max_age
+        self.max_stale = max_stale
+        self.refresh_interval = refresh_interval
+        self.refresher = Prefetcher(workers=refresh_workers, name='ddtkorea-refresh')
+        # key -> 最后一次尝试刷新的时间，按时间从旧到新排列
+        self._refresh_attempts = OrderedDict()
+        self._refresh_lock = threading.Lock()
     
-    def _get_html(self, url: str) -> str:
+    def _get_html(self, url: str, kind: str = 'page') -> str:
         """获取网页HTML内容
         
         Args:
             url (str): 网页URL
+            kind (str): 页面类型，用于统计抓取耗时和失败次数
             
         Returns:
             str: HTML内容
         """
-        try:
-            response = requests.get(url, headers=self.headers, timeout=10)
-            response.encoding = 'utf-8'  # 确保韩文正确解码
-            return response.text
-        except Exception as e:
-            print(f"获取页面失败: {url}, 错误: {e}")
-            return ""
+        with UPSTREAM_SECONDS.time(kind):
+            try:
+                response = self.http.get(url)
+                response.encoding = 'utf-8'  # 确保韩文正确解码
+                return response.text
+            except Exception as e:
+                UPSTREAM_ERRORS.inc(kind, type(e.__cause__ or e).__name__)
+                print(f"获取页面失败: {url}, 错误: {e}")
+                return ""
     
     def _cache_data(self, cache_file: Path, data: Any) -> None:
         """缓存数据到本地文件
@@ -52,309 +134,329 @@ class DDTKoreaDataSource(DataSource):
             data (Any): 要缓存的数据
         """
         cache_file.parent.mkdir(parents=True, exist_ok=True)
-        with open(cache_file, 'w', encoding='utf-8') as f:
-            if isinstance(data, str):
-                f.write(data)
+        if cache_file.suffix == COMPRESSED_SUFFIX:
+            data = self.chapter_store.encode(cache_file.parent, data)
+        
+        # 先写入同目录下的临时文件再重命名，读取方不会看到写了一半的文件
+        fd, tmp_path = tempfile.mkstemp(dir=cache_file.parent, prefix=f".{cache_file.name}.", suffix='.tmp')
+        try:
+            if isinstance(data, bytes):
+                with open(fd, 'wb') as f:
+                    f.write(data)
             else:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+                with open(fd, 'w', encoding='utf-8') as f:
+                    if isinstance(data, str):
+                        f.write(data)
+                    else:
+                        json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, cache_file)
+            self.cache_index.record(cache_file, os.stat(cache_file).st_size)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
     
-    def _get_cached_data(self, cache_file: Path, max_age: int = 86400) -> Optional[Any]:
+    def _get_cached_data(self, cache_file: Path, max_age: Optional[int] = None) -> Optional[Any]:
         """获取缓存数据
         
         Args:
             cache_file (Path): 缓存文件路径
-            max_age (int): 最大缓存时间（秒），默认1天
+            max_age (Optional[int]): 最大缓存时间（秒），默认为self.max_age
             
         Returns:
             Optional[Any]: 缓存数据，如果缓存不存在或已过期则返回None
         """
-        if not cache_file.exists():
+        # 检查缓存是否存在、是否过期
+        age = self._cache_age(cache_file)
+        if age is None or age > (self.max_age if max_age is None else max_age):
             return None
-            
-        # 检查缓存是否过期
-        file_time = cache_file.stat().st_mtime
-        if time.time() - file_time > max_age:
+        return self._load_cache_file(cache_file)
+    
+    def _cache_age(self, cache_file: Path) -> Optional[float]:
+        """缓存文件的年龄（秒），文件不存在返回None"""
+        try:
+            return time.time() - cache_file.stat().st_mtime
+        except FileNotFoundError:
             return None
-            
+    
+    def _load_cache_file(self, cache_file: Path) -> Optional[Any]:
+        """读取缓存文件，不检查是否过期，读取失败返回None"""
         try:
-            if cache_file.suffix == '.json':
+            if cache_file.suffix == COMPRESSED_SUFFIX:
+                data = self.chapter_store.read_file(cache_file)
+            elif cache_file.suffix == '.json':
                 with open(cache_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                    data = json.load(f)
             else:
                 with open(cache_file, 'r', encoding='utf-8') as f:
-                    return f.read()
+                    data = f.read()
         except Exception:
             return None
+        self.cache_index.touch(cache_file)
+        return data
     
-    def get_books(self) -> List[Dict[str, Any]]:
-        """获取所有书籍列表"""
-        cache_file = self.cache_dir / 'books.json'
+    def _get_or_fetch(self, kind: str, *parts: Any, max_age: Optional[int] = None) -> Any:
+        """按stale-while-revalidate策略获取数据
         
-        # 尝试从缓存获取
-        cached_data = self._get_cached_data(cache_file)
-        if cached_data:
-            return cached_data
+        缓存未过期时直接返回；过期但未超过max_stale时立即返回旧数据并在后台刷新；
+        超过max_stale或没有缓存时同步抓取。抓取失败时只要有旧数据就返回旧数据。
         
-        books = []
-        try:
-            # 获取首页内容
-            html = self._get_html(f"{self.base_url}/novel/")
-            if not html:
-                return []
-                
-            soup = BeautifulSoup(html, 'html.parser')
+        Args:
+            kind (str): 数据类型，见_cache_file
+            *parts: 书籍ID、章节ID或搜索关键词
+            max_age (Optional[int]): 最大缓存时间（秒），默认为self.max_age
             
-            # 查找小说列表
-            book_items = soup.select('.novel-list .novel-item')
-            for i, item in enumerate(book_items):
-                try:
-                    link = item.select_one('a.novel-title')
-                    if not link:
-                        continue
-                        
-                    book_url = link.get('href')
-                    if not book_url.startswith('http'):
-                        book_url = self.base_url + book_url
-                        
-                    title = link.text.strip()
-                    author = item.select_one('.novel-author').text.strip() if item.select_one('.novel-author') else '未知作者'
-                    cover = item.select_one('.novel-cover img').get('src') if item.select_one('.novel-cover img') else ''
-                    description = item.select_one('.novel-desc').text.strip() if item.select_one('.novel-desc') else '暂无简介'
-                    
-                    # 从URL中提取ID
-                    book_id = re.search(r'/novel/([\d]+)', book_url)
-                    if not book_id:
-                        continue
-                        
-                    books.append({
-                        'id': int(book_id.group(1)),
-                        'title': title,
-                        'author': author,
-                        'cover': cover,
-                        'description': description,
-                        'source_url': book_url
-                    })
-                    
-                    # 限制爬取数量
-                    if len(books) >= 10:
-                        break
-                except Exception as e:
-                    print(f"解析书籍信息失败: {e}")
-                    continue
-        except Exception as e:
-            print(f"获取书籍列表失败: {e}")
-        
-        # 缓存结果
-        if books:
-            self._cache_data(cache_file, books)
+        Returns:
+            Any: 缓存或抓取的数据
+        """
+        max_age = self.max_age if max_age is None else max_age
+        key = (kind,) + parts
+        cache_file = self._cache_file(kind, *parts)
+        stale_data = None
+        age = self._cache_age(cache_file)
+        if age is not None:
+            cached_data = self._load_cache_file(cache_file)
+            if cached_data and age <= max_age:
+                CACHE_LOOKUPS.inc(kind, 'hit')
+                return cached_data
+            stale_data = cached_data
+            if stale_data and age <= max_age + self.max_stale and self._revalidate(key, max_age):
+                CACHE_LOOKUPS.inc(kind, 'stale')
+                return stale_data
         
-        return books
+        CACHE_LOOKUPS.inc(kind, 'miss')
+        data = self._fetch_once(key, max_age)
+        return data if data or not stale_data else stale_data
     
-    def get_book_by_id(self, book_id: int) -> Optional[Dict[str, Any]]:
-        """根据ID获取书籍详情"""
-        # 直接访问书籍详情页
-        book_url = f"{self.base_url}/novel/{book_id}"
+    def _revalidate(self, key: tuple, max_age: int) -> bool:
+        """安排后台刷新过期的缓存
         
-        cache_file = self.cache_dir / f"book_{book_id}.json"
+        同一个key在refresh_interval秒内只尝试刷新一次，避免网站故障时反复请求。
         
-        # 尝试从缓存获取
-        cached_data = self._get_cached_data(cache_file)
-        if cached_data:
-            return cached_data
+        Returns:
+            bool: 是否可以先返回旧数据（后台刷新未启用时返回False）
+        """
+        if self.refresher.workers <= 0:
+            return False
+        now = time.monotonic()
+        with self._refresh_lock:
+            last_attempt = self._refresh_attempts.get(key)
+            if last_attempt is not None and now - last_attempt < self.refresh_interval:
+                return True
+            record_refresh(self._refresh_attempts, key, now, self.refresh_interval)
+        self.refresher.submit(('refresh', key), self._fetch_once, key, max_age)
+        return True
+    
+    def _fetch_once(self, key: tuple, max_age: Optional[int] = None) -> Any:
+        """合并同一个key的并发抓取，只有一个调用真正访问网站，其他调用等待并共享结果
         
-        try:
-            html = self._get_html(book_url)
-            if not html:
-                return None
-                
-            soup = BeautifulSoup(html, 'html.parser')
-            
-            title = soup.select_one('.novel-title').text.strip() if soup.select_one('.novel-title') else '未知标题'
-            author = soup.select_one('.novel-author').text.strip() if soup.select_one('.novel-author') else '未知作者'
-            cover = soup.select_one('.novel-cover img').get('src') if soup.select_one('.novel-cover img') else ''
-            description = soup.select_one('.novel-desc').text.strip() if soup.select_one('.novel-desc') else '暂无简介'
+        Args:
+            key (tuple): 抓取标识，(数据类型, *参数)
+            max_age (Optional[int]): 最大缓存时间（秒），默认为self.max_age
             
-            book = {
-                'id': book_id,
-                'title': title,
-                'author': author,
-                'cover': cover,
-                'description': description,
-                'source_url': book_url
-            }
+        Returns:
+            Any: 抓取结果
+        """
+        def run():
+            # 排队期间上一次抓取可能已经写好了缓存
+            cached_data = self._get_cached_data(self._cache_file(*key), max_age)
+            if cached_data:
+                return cached_data
+            return self._scrape(*key)
+        
+        return self._flight.do(key, run)
+    
+    def _is_cached(self, cache_file: Path, max_age: Optional[int] = None) -> bool:
+        """缓存文件是否存在且未过期"""
+        signature = file_signature(cache_file)
+        return signature is not None and \
+            time.time() - signature[0] / 1e9 <= (self.max_age if max_age is None else max_age)
+    
+    def _prefetch_chapters(self, book_id: int, chapters: List[Dict[str, Any]]) -> None:
+        """将尚未缓存的章节加入后台预取队列
+        
+        Args:
+            book_id (int): 书籍ID
+            chapters (List[Dict[str, Any]]): 要预取的章节
+        """
+        for chapter in chapters:
+            chapter_id = int(chapter['id'])
+            if not self._is_cached(self._cache_file('chapter', book_id, chapter_id)):
+                self.prefetcher.submit(('chapter', int(book_id), chapter_id),
+                                       self._load_chapter_content, book_id, chapter_id)
+    
+    def _read_ahead(self, book_id: int, chapter_id: int) -> None:
+        """预取当前章节之后的几章，只使用已缓存的章节列表，不会为此抓取目录"""
+        if self.read_ahead <= 0 or self.prefetcher.workers <= 0:
+            return
+        cache_file = self._cache_file('chapters', int(book_id))
+        signature = file_signature(cache_file)
+        if signature is None:
+            return
+        toc = self.tocs.get(int(book_id), signature, lambda: self._load_cache_file(cache_file) or [])
+        index = toc.positions.get(int(chapter_id))
+        if index is not None:
+            self._prefetch_chapters(book_id, toc.chapters[index + 1:index + 1 + self.read_ahead])
+    
+    def _book_dir(self, book_id: int) -> Path:
+        """一本书的缓存目录，存放书籍信息、章节列表、章节内容和压缩字典
+        
+        按书籍ID的摘要分为两层子目录，书籍再多每个目录中的文件也很少
+        """
+        return shard_path(self.cache_dir / 'books', str(int(book_id))) / str(int(book_id))
+    
+    def _cache_file(self, kind: str, *parts: Any) -> Path:
+        """缓存文件路径
+        
+        每本书的文件在_book_dir中；搜索结果以关键词的摘要命名，同样分层存放
+        
+        Args:
+            kind (str): 数据类型：books, book, chapters, chapter, search
+            *parts: 书籍ID、章节ID或搜索关键词
             
-            # 缓存结果
-            self._cache_data(cache_file, book)
-            return book
-        except Exception as e:
-            print(f"获取书籍详情失败: {e}")
+        Returns:
+            Path: 缓存文件路径
+        """
+        if kind == 'books':
+            return self.cache_dir / 'books.json'
+        if kind == 'book':
+            return self._book_dir(parts[0]) / 'book.json'
+        if kind == 'chapters':
+            return self._book_dir(parts[0]) / 'chapters.json'
+        if kind == 'chapter':
+            return self.chapter_store.chapter_path(self._book_dir(parts[0]), parts[1])
+        if kind == 'search':
+            return shard_path(self.cache_dir / 'search', parts[0]) / f"{hashed_name(parts[0])}.json"
+        raise ValueError(f"未知的缓存类型: {kind}")
+    
+    def _page_url(self, kind: str, *parts: Any) -> str:
+        """网站页面URL，参数与_cache_file相同"""
+        if kind == 'books':
+            return f"{self.base_url}/novel/"
+        if kind == 'book':
+            return f"{self.base_url}/novel/{parts[0]}"
+        if kind == 'chapters':
+            return f"{self.base_url}/novel/{parts[0]}/chapters"
+        if kind == 'chapter':
+            # 直接访问章节内容页
+            return f"{self.base_url}/chapter/{parts[1]}"
+        if kind == 'search':
+            return f"{self.base_url}/search?q={parts[0]}"
+        raise ValueError(f"未知的页面类型: {kind}")
+    
+    def _parse_page(self, kind: str, html: str, *parts: Any) -> Any:
+        """解析网站页面，参数与_cache_file相同
+        
+        Returns:
+            Any: 解析结果，解析失败时返回空结果
+        """
+        with PARSE_SECONDS.time(kind):
+            if kind == 'books':
+                return self.parser.parse_book_list(html, '.novel-list .novel-item')
+            if kind == 'book':
+                return self.parser.parse_book(html, parts[0], self._page_url(kind, *parts))
+            if kind == 'chapters':
+                return self.parser.parse_chapters(html)
+            if kind == 'chapter':
+                return self.parser.parse_chapter_content(html)
+            if kind == 'search':
+                return self.parser.parse_book_list(html, '.search-results .novel-item')
+            raise ValueError(f"未知的页面类型: {kind}")
+    
+    def _scrape(self, kind: str, *parts: Any) -> Any:
+        """抓取并解析页面，结果非空时写入缓存"""
+        html = self._get_html(self._page_url(kind, *parts), kind)
+        if not html:
             return None
+        return self._store(kind, self._parse_page(kind, html, *parts), *parts)
+    
+    def _store(self, kind: str, data: Any, *parts: Any) -> Any:
+        """将解析结果写入缓存，新抓取的章节列表还会触发前几章的预取"""
+        if data:
+            self._cache_data(self._cache_file(kind, *parts), data)
+            if kind == 'chapter':
+                # 压缩缓存时，书中缓存的章节足够多后训练字典
+                self.chapter_store.maybe_train(self._book_dir(parts[0]))
+            elif kind == 'chapters':
+                # 在后台预先缓存前几章内容
+                self._prefetch_chapters(parts[0], data[:self.prefetch_first])
+        return data
+    
+    def get_books(self) -> List[Dict[str, Any]]:
+        """获取所有书籍列表"""
+        # 优先使用缓存，过期时返回旧数据并在后台刷新
+        return self._get_or_fetch('books') or []
+    
+    def get_book_by_id(self, book_id: int) -> Optional[Dict[str, Any]]:
+        """根据ID获取书籍详情"""
+        # 优先使用缓存，过期时返回旧数据并在后台刷新
+        return self._get_or_fetch('book', int(book_id))
     
     def get_chapters(self, book_id: int) -> List[Dict[str, Any]]:
         """获取指定书籍的所有章节"""
         book = self.get_book_by_id(book_id)
         if not book:
             return []
-            
-        cache_file = self.cache_dir / str(book_id) / 'chapters.json'
         
-        # 尝试从缓存获取
-        cached_data = self._get_cached_data(cache_file)
-        if cached_data:
-            return cached_data
-        
-        chapters = []
-        try:
-            # 获取章节列表页面
-            chapters_url = f"{self.base_url}/novel/{book_id}/chapters"
-            html = self._get_html(chapters_url)
-            if not html:
-                return []
-                
-            soup = BeautifulSoup(html, 'html.parser')
-            
-            # 查找章节列表
-            chapter_items = soup.select('.chapter-list .chapter-item')
-            for i, item in enumerate(chapter_items):
-                try:
-                    link = item.select_one('a')
-                    if not link:
-                        continue
-                        
-                    chapter_url = link.get('href')
-                    if not chapter_url.startswith('http'):
-                        chapter_url = self.base_url + chapter_url
-                    
-                    # 从URL中提取章节ID
-                    chapter_id = re.search(r'/chapter/([\d]+)', chapter_url)
-                    if not chapter_id:
-                        continue
-                        
-                    chapters.append({
-                        'id': int(chapter_id.group(1)),
-                        'title': link.text.strip(),
-                        'source_url': chapter_url
-                    })
-                except Exception as e:
-                    print(f"解析章节信息失败: {e}")
-                    continue
-        except Exception as e:
-            print(f"获取章节列表失败: {e}")
-        
-        # 缓存结果
-        if chapters:
-            self._cache_data(cache_file, chapters)
-            
-            # 预先缓存前几章内容
-            for chapter in chapters[:3]:
-                self.get_chapter_content(book_id, chapter['id'])
-        
-        return chapters
+        # 优先使用缓存，过期时返回旧数据并在后台刷新
+        return self._get_or_fetch('chapters', int(book_id)) or []
+    
+    def get_chapter_toc(self, book_id: int) -> ChapterTOC:
+        """获取指定书籍的目录，章节缓存文件未变化时直接使用内存中的目录"""
+        cache_file = self._cache_file('chapters', int(book_id))
+        age = self._cache_age(cache_file)
+        if age is not None and self.max_age < age <= self.max_age + self.max_stale:
+            # 已过期：先沿用旧目录，在后台刷新
+            if not self._revalidate(('chapters', int(book_id)), self.max_age):
+                age = None
+        if age is None or age > self.max_age + self.max_stale:
+            # 缓存不存在或过期太久，交给get_chapters重新抓取
+            chapters = self.get_chapters(book_id)
+            if file_signature(cache_file) is None:
+                return ChapterTOC(chapters)
+        signature = file_signature(cache_file)
+        # 目录在内存中命中时也算一次访问，避免正在阅读的书的章节列表被当作长期未用而清理
+        self.cache_index.touch(cache_file)
+        return self.tocs.get(int(book_id), signature, lambda: self._load_cache_file(cache_file) or [])
     
     def get_chapter_content(self, book_id: int, chapter_id: int) -> Optional[str]:
-        """获取指定章节的内容"""
-        cache_file = self.cache_dir / str(book_id) / f"{chapter_id}.txt"
-        
-        # 尝试从缓存获取
-        cached_data = self._get_cached_data(cache_file)
-        if cached_data:
-            return cached_data
+        """获取指定章节的内容，并在后台预取后续章节"""
+        content = self._load_chapter_content(book_id, chapter_id)
+        if content:
+            self._read_ahead(book_id, chapter_id)
+        return content
+    
+    def _load_chapter_content(self, book_id: int, chapter_id: int) -> Optional[str]:
+        """从缓存或网站获取章节内容"""
+        # 优先使用缓存，过期时返回旧数据并在后台刷新
+        return self._get_or_fetch('chapter', int(book_id), int(chapter_id))
+    
+    def get_version(self, book_id: Optional[int] = None, chapter_id: Optional[int] = None) -> Optional[Version]:
+        """获取数据版本，由缓存文件的签名组成
         
-        try:
-            # 直接访问章节内容页
-            chapter_url = f"{self.base_url}/chapter/{chapter_id}"
-            html = self._get_html(chapter_url)
-            if not html:
-                return None
-                
-            soup = BeautifulSoup(html, 'html.parser')
-            
-            # 提取章节内容
-            content_div = soup.select_one('.chapter-content')
-            if not content_div:
-                return None
-                
-            # 处理内容
-            content = content_div.text.strip()
-            # 替换多余的换行符
-            content = re.sub(r'\n+', '\n\n', content)
-            # 去除可能的广告文本
-            content = re.sub(r'(ddtkorea\.com|http://\S+)', '', content)
-            
-            # 缓存结果
-            if content:
-                self._cache_data(cache_file, content)
-            
-            return content
-        except Exception as e:
-            print(f"获取章节内容失败: {e}")
+        缓存不存在或已过期时返回None，交给正常的请求去抓取或在后台刷新；
+        书籍列表和搜索结果按关键词缓存，不提供版本。
+        """
+        if book_id is None:
             return None
+        keys = [('book', int(book_id)), ('chapters', int(book_id))]
+        if chapter_id is not None:
+            keys.append(('chapter', int(book_id), int(chapter_id)))
+        signatures = []
+        for key in keys:
+            cache_file = self._cache_file(*key)
+            age = self._cache_age(cache_file)
+            if age is None or age > self.max_age:
+                return None
+            signatures.append(file_signature(cache_file))
+        return combine_signatures(signatures)
     
     def search_books(self, query: str) -> List[Dict[str, Any]]:
         """搜索书籍"""
         if not query:
             return self.get_books()
-            
-        cache_file = self.cache_dir / f"search_{query}.json"
-        
-        # 尝试从缓存获取
-        cached_data = self._get_cached_data(cache_file, max_age=3600)  # 搜索缓存时间较短
-        if cached_data:
-            return cached_data
-        
-        results = []
-        try:
-            # 构建搜索URL
-            search_url = f"{self.base_url}/search?q={query}"
-            html = self._get_html(search_url)
-            if not html:
-                return []
-                
-            soup = BeautifulSoup(html, 'html.parser')
-            
-            # 查找搜索结果
-            result_items = soup.select('.search-results .novel-item')
-            for i, item in enumerate(result_items):
-                try:
-                    link = item.select_one('a.novel-title')
-                    if not link:
-                        continue
-                        
-                    book_url = link.get('href')
-                    if not book_url.startswith('http'):
-                        book_url = self.base_url + book_url
-                        
-                    # 从URL中提取ID
-                    book_id = re.search(r'/novel/([\d]+)', book_url)
-                    if not book_id:
-                        continue
-                        
-                    title = link.text.strip()
-                    author = item.select_one('.novel-author').text.strip() if item.select_one('.novel-author') else '未知作者'
-                    cover = item.select_one('.novel-cover img').get('src') if item.select_one('.novel-cover img') else ''
-                    description = item.select_one('.novel-desc').text.strip() if item.select_one('.novel-desc') else '暂无简介'
-                    
-                    results.append({
-                        'id': int(book_id.group(1)),
-                        'title': title,
-                        'author': author,
-                        'cover': cover,
-                        'description': description,
-                        'source_url': book_url
-                    })
-                    
-                    # 限制结果数量
-                    if len(results) >= 10:
-                        break
-                except Exception as e:
-                    print(f"解析搜索结果失败: {e}")
-                    continue
-        except Exception as e:
-            print(f"搜索书籍失败: {e}")
-            return []
-        
-        # 缓存结果
-        if results:
-            self._cache_data(cache_file, results)
         
-        return results
\ No newline at end of file
+        # 搜索缓存时间较短
+        return self._get_or_fetch('search', query, max_age=self.search_max_age) or []
@@ -0,0 +1,345 @@
+import asyncio
+import random
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Dict, Optional, Any, Awaitable, Tuple
+
+import aiohttp
+
+from .async_base import AsyncDataSource
+from .catalog import Version, file_signature
+from .compression import ChapterStore
+from .ddtkorea import DDTKoreaDataSource, record_refresh
+from .http_client import HttpClient
+from .metrics import CACHE_LOOKUPS, UPSTREAM_ERRORS, UPSTREAM_SECONDS
+from .toc import ChapterTOC
+
+class AsyncDDTKoreaDataSource(AsyncDataSource):
+    """基于asyncio的DDTKorea数据源
+
+    所有请求在同一个事件循环中进行，共用一个aiohttp连接池，连接数上限即并发抓取数上限，
+    超出的请求在连接池中排队。页面解析和缓存格式与DDTKoreaDataSource完全相同，
+    两者可以共用同一个缓存目录。
+    """
+
+    def __init__(self, base_url: str = 'https://www.ddtkorea.com', cache_dir: str = 'data/cache/ddtkorea',
+                 max_connections: int = 100, max_per_host: int = 32,
+                 connect_timeout: float = 3.05, read_timeout: float = 10,
+                 max_retries: int = 3, backoff_base: float = 0.5, backoff_max: float = 8.0,
+                 prefetch_first: int = 3, read_ahead: int = 2, max_age: int = 86400, search_max_age: int = 3600,
+                 max_stale: int = 7 * 86400, refresh_interval: float = 60, max_background: int = 256,
+                 parser: str = 'auto',
+                 chapter_store: Optional[ChapterStore] = None, cache_max_bytes: int = 1024 * 1024 * 1024,
+                 cache_max_idle: float = 30 * 86400):
+        """初始化异步DDTKorea数据源
+
+        Args:
+            base_url (str): DDTKorea基础URL
+            cache_dir (str): 缓存目录路径
+            max_connections (int): 连接池的连接总数上限
+            max_per_host (int): 每个主机的连接数上限，0表示不单独限制
+            connect_timeout (float): 建立连接超时（秒）
+            read_timeout (float): 读取响应超时（秒）
+            max_retries (int): 最大重试次数
+            backoff_base (float): 指数退避的基础等待时间（秒）
+            backoff_max (float): 单次等待时间上限（秒）
+            prefetch_first (int): 打开书籍时预取的前几章数量
+            read_ahead (int): 阅读章节时预取的后续章节数量
+            max_age (int): 缓存的有效期（秒），见DDTKoreaDataSource
+            search_max_age (int): 搜索结果缓存的有效期（秒）
+            max_stale (int): 缓存过期后仍可先返回旧数据的最长时间（秒），0表示过期即同步抓取
+            refresh_interval (float): 同一缓存两次后台刷新之间的最小间隔（秒）
+            max_background (int): 后台预取和刷新任务的数量上限，0表示禁用
+            parser (str): HTML解析后端，见DDTKoreaDataSource
+            chapter_store (Optional[ChapterStore]): 章节内容缓存的存储方式，见DDTKoreaDataSource
+            cache_max_bytes (int): 缓存目录的总字节数上限，见DDTKoreaDataSource
+            cache_max_idle (float): 缓存文件多少秒未被访问后删除，见DDTKoreaDataSource
+        """
+        # 页面地址、解析和缓存文件复用同步数据源的实现，它自己的线程池全部禁用
+        self.pages = DDTKoreaDataSource(base_url=base_url, cache_dir=cache_dir,
+                                        prefetch_workers=0, refresh_workers=0, parser=parser,
+                                        max_age=max_age, search_max_age=search_max_age,
+                                        chapter_store=chapter_store, cache_max_bytes=cache_max_bytes,
+                                        cache_max_idle=cache_max_idle)
+        self.tocs = self.pages.tocs
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.timeout = aiohttp.ClientTimeout(total=None, sock_connect=connect_timeout, sock_read=read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.prefetch_first = prefetch_first
+        self.read_ahead = read_ahead
+        self.max_stale = max_stale
+        self.refresh_interval = refresh_interval
+        self.max_background = max_background
+
+        # 以下状态只在事件循环线程中访问，不需要加锁
+        self.shared = 0
+        self._session = None
+        self._calls = {}
+        self._tasks = set()
+        self._refresh_attempts = OrderedDict()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """首次使用时在当前事件循环中创建连接池"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, limit_per_host=self.max_per_host,
+                                             ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout,
+                                                  headers=self.pages.headers)
+        return self._session
+
+    async def _get_html(self, url: str, kind: str = 'page') -> str:
+        """获取网页HTML内容，连接错误、超时和可重试的状态码会按指数退避重试
+
+        Args:
+            url (str): 网页URL
+            kind (str): 页面类型，用于统计抓取耗时和失败次数
+
+        Returns:
+            str: HTML内容，失败返回空字符串
+        """
+        with UPSTREAM_SECONDS.time(kind):
+            return await self._fetch_html(url, kind)
+
+    async def _fetch_html(self, url: str, kind: str) -> str:
+        session = self._get_session()
+        error = None
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                async with session.get(url) as response:
+                    if response.status not in HttpClient.RETRY_STATUSES:
+                        response.raise_for_status()
+                        # 确保韩文正确解码
+                        return await response.text(encoding='utf-8')
+                    error = f"HTTP {response.status}"
+                    retry_after = self._retry_after(response.headers.get('Retry-After'))
+            except aiohttp.ClientResponseError as e:
+                UPSTREAM_ERRORS.inc(kind, type(e).__name__)
+                print(f"获取页面失败: {url}, 错误: {e}")
+                return ""
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = e
+
+            if attempt < self.max_retries:
+                backoff = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+                await asyncio.sleep(max(backoff, retry_after or 0))
+
+        # 可重试的状态码耗尽重试时error是状态描述而不是异常
+        UPSTREAM_ERRORS.inc(kind, type(error).__name__ if isinstance(error, BaseException) else 'HTTPError')
+        print(f"获取页面失败: {url}, 重试{self.max_retries}次后仍失败: {error}")
+        return ""
+
+    def _retry_after(self, value: Optional[str]) -> Optional[float]:
+        """解析Retry-After响应头（仅支持秒数），不超过backoff_max"""
+        try:
+            return min(float(value), self.backoff_max) if value else None
+        except (TypeError, ValueError):
+            return None
+
+    async def _scrape(self, kind: str, *parts: Any) -> Any:
+        """抓取页面，在线程池中解析并写入缓存"""
+        html = await self._get_html(self.pages._page_url(kind, *parts), kind)
+        if not html:
+            return None
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(None, self._parse_and_store, kind, html, *parts)
+        if data and kind == 'chapters':
+            # 在后台预先缓存前几章内容
+            self._prefetch_chapters(parts[0], data[:self.prefetch_first])
+        return data
+
+    def _parse_and_store(self, kind: str, html: str, *parts: Any) -> Any:
+        # 解析、压缩和写文件都不占用事件循环
+        return self.pages._store(kind, self.pages._parse_page(kind, html, *parts), *parts)
+
+    async def _fetch_once(self, key: tuple, max_age: Optional[int] = None) -> Any:
+        """合并同一个key的并发抓取，只有一个协程真正访问网站，其他协程等待并共享结果
+
+        Args:
+            key (tuple): 抓取标识，(数据类型, *参数)
+            max_age (Optional[int]): 最大缓存时间（秒），默认为self.pages.max_age
+
+        Returns:
+            Any: 抓取结果
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = self._calls[key] = asyncio.ensure_future(self._load(key, max_age))
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            self.shared += 1
+        # 某个等待方被取消时不影响其他等待方
+        return await asyncio.shield(task)
+
+    async def _load(self, key: tuple, max_age: Optional[int]) -> Any:
+        # 排队期间上一次抓取可能已经写好了缓存；读取、解析和解压在线程池中进行，不占用事件循环
+        loop = asyncio.get_running_loop()
+        cached_data = await loop.run_in_executor(None, self.pages._get_cached_data,
+                                                 self.pages._cache_file(*key), max_age)
+        if cached_data:
+            return cached_data
+        return await self._scrape(*key)
+
+    async def _get_or_fetch(self, kind: str, *parts: Any, max_age: Optional[int] = None) -> Any:
+        """按stale-while-revalidate策略获取数据，规则与DDTKoreaDataSource._get_or_fetch相同"""
+        max_age = self.pages.max_age if max_age is None else max_age
+        key = (kind,) + parts
+        cache_file = self.pages._cache_file(kind, *parts)
+        stale_data = None
+        loop = asyncio.get_running_loop()
+        age, cached_data = await loop.run_in_executor(None, self._read_cache, cache_file)
+        if age is not None:
+            if cached_data and age <= max_age:
+                CACHE_LOOKUPS.inc(kind, 'hit')
+                return cached_data
+            stale_data = cached_data
+            if stale_data and age <= max_age + self.max_stale and self._revalidate(key, max_age):
+                CACHE_LOOKUPS.inc(kind, 'stale')
+                return stale_data
+
+        CACHE_LOOKUPS.inc(kind, 'miss')
+        data = await self._fetch_once(key, max_age)
+        return data if data or not stale_data else stale_data
+
+    def _read_cache(self, cache_file: Path) -> Tuple[Optional[float], Any]:
+        """读取缓存文件，不检查是否过期（在线程池中调用）
+
+        Returns:
+            Tuple[Optional[float], Any]: (缓存年龄, 数据)，文件不存在时为(None, None)
+        """
+        age = self.pages._cache_age(cache_file)
+        if age is None:
+            return None, None
+        return age, self.pages._load_cache_file(cache_file)
+
+    def _revalidate(self, key: tuple, max_age: int) -> bool:
+        """安排后台刷新过期的缓存，同一个key在refresh_interval秒内只尝试一次
+
+        Returns:
+            bool: 是否可以先返回旧数据（后台任务已满时返回False）
+        """
+        now = time.monotonic()
+        last_attempt = self._refresh_attempts.get(key)
+        if last_attempt is not None and now - last_attempt < self.refresh_interval:
+            return True
+        if not self._spawn(self._fetch_once(key, max_age)):
+            return False
+        record_refresh(self._refresh_attempts, key, now, self.refresh_interval)
+        return True
+
+    def _spawn(self, coro: Awaitable[Any]) -> bool:
+        """启动后台任务，任务数达到上限时放弃
+
+        Returns:
+            bool: 是否启动了任务
+        """
+        if len(self._tasks) >= self.max_background:
+            coro.close()
+            return False
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+        return True
+
+    def _task_done(self, task: asyncio.Future) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"后台任务失败: {task.exception()}")
+
+    def _prefetch_chapters(self, book_id: int, chapters: List[Dict[str, Any]]) -> None:
+        """为尚未缓存且不在抓取中的章节启动后台预取"""
+        for chapter in chapters:
+            key = ('chapter', int(book_id), int(chapter['id']))
+            if key not in self._calls and not self.pages._is_cached(self.pages._cache_file(*key)):
+                self._spawn(self._fetch_once(key))
+
+    def _read_ahead(self, book_id: int, chapter_id: int) -> None:
+        """预取当前章节之后的几章，只使用内存中已有的目录，不在事件循环中读取文件"""
+        if self.read_ahead <= 0:
+            return
+        signature = file_signature(self.pages._cache_file('chapters', int(book_id)))
+        toc = self.tocs.lookup(int(book_id), signature) if signature is not None else None
+        if toc is None:
+            return
+        index = toc.positions.get(int(chapter_id))
+        if index is not None:
+            self._prefetch_chapters(book_id, toc.chapters[index + 1:index + 1 + self.read_ahead])
+
+    async def get_books(self) -> List[Dict[str, Any]]:
+        """获取所有书籍列表"""
+        return await self._get_or_fetch('books') or []
+
+    async def get_book_by_id(self, book_id: int) -> Optional[Dict[str, Any]]:
+        """根据ID获取书籍详情"""
+        return await self._get_or_fetch('book', int(book_id))
+
+    async def get_chapters(self, book_id: int) -> List[Dict[str, Any]]:
+        """获取指定书籍的所有章节"""
+        # 书籍详情和章节列表同时抓取
+        book, chapters = await asyncio.gather(self.get_book_by_id(book_id),
+                                              self._get_or_fetch('chapters', int(book_id)))
+        if not book:
+            return []
+        return chapters or []
+
+    async def get_chapter_toc(self, book_id: int) -> ChapterTOC:
+        """获取指定书籍的目录，章节缓存文件未变化时直接使用内存中的目录，规则与DDTKoreaDataSource相同"""
+        cache_file = self.pages._cache_file('chapters', int(book_id))
+        max_age = self.pages.max_age
+        age = self.pages._cache_age(cache_file)
+        if age is not None and max_age < age <= max_age + self.max_stale:
+            # 已过期：先沿用旧目录，在后台刷新
+            if not self._revalidate(('chapters', int(book_id)), max_age):
+                age = None
+        if age is None or age > max_age + self.max_stale:
+            # 缓存不存在或过期太久，交给get_chapters重新抓取
+            chapters = await self.get_chapters(book_id)
+            if file_signature(cache_file) is None:
+                return ChapterTOC(chapters)
+        signature = file_signature(cache_file)
+        self.pages.cache_index.touch(cache_file)
+        toc = self.tocs.lookup(int(book_id), signature)
+        if toc is None:
+            loop = asyncio.get_running_loop()
+            chapters = await loop.run_in_executor(None, self.pages._load_cache_file, cache_file)
+            toc = ChapterTOC(chapters or [])
+            if toc.chapters:
+                self.tocs.put(int(book_id), signature, toc)
+        return toc
+
+    async def get_chapter_content(self, book_id: int, chapter_id: int) -> Optional[str]:
+        """获取指定章节的内容，并在后台预取后续章节"""
+        content = await self._get_or_fetch('chapter', int(book_id), int(chapter_id))
+        if content:
+            self._read_ahead(book_id, chapter_id)
+        return content
+
+    async def get_version(self, book_id: Optional[int] = None, chapter_id: Optional[int] = None) -> Optional[Version]:
+        """获取数据版本，只查看缓存文件的签名"""
+        return self.pages.get_version(book_id, chapter_id)
+
+    async def search_books(self, query: str) -> List[Dict[str, Any]]:
+        """搜索书籍"""
+        if not query:
+            return await self.get_books()
+
+        # 搜索缓存时间较短
+        return await self._get_or_fetch('search', query, max_age=self.pages.search_max_age) or []
+
+    async def join(self) -> None:
+        """等待后台预取和刷新任务全部完成"""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    async def close(self) -> None:
+        """取消后台任务并关闭连接池"""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*list(self._tasks), return_exceptions=True)
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
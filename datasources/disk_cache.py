@@ -0,0 +1,311 @@
+import hashlib
+import os
+import struct
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from .compression import DICT_FILE
+from .metrics import DISK_CACHE_EVICTIONS
+
+# 索引文件：magic(4)，之后每个条目为 大小(8) 最后访问时间(8) 路径长度(2) 相对路径(UTF-8)
+INDEX_FILE = 'index.bin'
+INDEX_MAGIC = b'BCI1'
+INDEX_ENTRY = struct.Struct('<QdH')
+
+# 未知大小的条目（其他进程写入、本进程只读取过），下次清理时再查询
+UNKNOWN_SIZE = -1
+
+
+def hashed_name(key: str, digest_size: int = 16) -> str:
+    """把任意字符串（如搜索关键词）转换为固定长度、可以安全用作文件名的十六进制摘要"""
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=digest_size).hexdigest()
+
+
+def shard_path(root: Path, key: str, levels: int = 2) -> Path:
+    """按key的摘要分层的子目录，每层256个目录，使每个目录中的文件数保持很少
+
+    Args:
+        root (Path): 根目录
+        key (str): 条目标识
+        levels (int): 目录层数
+
+    Returns:
+        Path: root/ab/cd 形式的目录
+    """
+    digest = hashed_name(key, 8)
+    return root.joinpath(*(digest[2 * i:2 * i + 2] for i in range(levels)))
+
+
+class CacheIndex:
+    """磁盘缓存的条目索引和后台清理
+
+    内存中按相对路径记录每个缓存文件的大小和最后访问时间（文件系统的atime常被noatime关闭，不可靠），
+    读写缓存时只更新内存中的记录，不增加系统调用。后台线程定期清理：删除超过max_idle秒未访问的条目，
+    总大小超过max_bytes时按最后访问时间从旧到新删除，直到降到上限的90%，并把索引保存到INDEX_FILE。
+
+    首次清理（没有索引文件）和此后每隔rescan_interval秒会扫描整个目录，纳入其他进程写入的文件、旧版布局
+    留下的文件，并去掉已被删除的文件。每本书的压缩字典不计入索引，书籍目录中只剩字典时随目录一起删除。
+    """
+
+    def __init__(self, root: Path, max_bytes: int = 1024 * 1024 * 1024, max_idle: float = 30 * 86400,
+                 interval: float = 600, rescan_interval: float = 6 * 3600):
+        """初始化缓存索引
+
+        Args:
+            root (Path): 缓存根目录
+            max_bytes (int): 缓存总字节数上限，0表示不限制
+            max_idle (float): 条目未被访问多少秒后删除，0表示不按时间删除
+            interval (float): 后台清理的间隔（秒），0表示不启动后台清理（仍可以手动调用sweep）
+            rescan_interval (float): 完整扫描目录的间隔（秒）
+        """
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.max_idle = max_idle
+        self.interval = interval
+        self.rescan_interval = rescan_interval
+        self.total_bytes = 0
+        self.evictions = 0
+        self._entries = {}  # 相对路径 -> [大小, 最后访问时间]
+        self._lock = threading.Lock()
+        self._sweep_lock = threading.Lock()
+        self._last_scan = None
+        self._thread = None
+        self._stopped = threading.Event()
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _key(self, path: Path) -> Optional[str]:
+        try:
+            return Path(path).relative_to(self.root).as_posix()
+        except ValueError:
+            return None
+
+    def record(self, path: Path, size: int) -> None:
+        """记录写入的缓存文件，首次写入时启动后台清理"""
+        key = self._key(path)
+        if key is None:
+            return
+        with self._lock:
+            old = self._entries.get(key)
+            if old is not None and old[0] != UNKNOWN_SIZE:
+                self.total_bytes -= old[0]
+            self._entries[key] = [size, time.time()]
+            self.total_bytes += size
+            self._start()
+
+    def touch(self, path: Path) -> None:
+        """记录一次读取，更新最后访问时间"""
+        key = self._key(path)
+        if key is None:
+            return
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._entries[key] = [UNKNOWN_SIZE, now]
+            else:
+                entry[1] = now
+
+    def discard(self, path: Path) -> None:
+        """记录调用方自己删除的缓存文件"""
+        key = self._key(path)
+        if key is None:
+            return
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None and entry[0] != UNKNOWN_SIZE:
+                self.total_bytes -= entry[0]
+
+    def stats(self) -> Dict[str, int]:
+        """获取索引统计信息"""
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self.total_bytes,
+                    'max_bytes': self.max_bytes, 'evictions': self.evictions}
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """清理一次：必要时扫描目录，删除过期和超出容量的条目，保存索引
+
+        Args:
+            now (Optional[float]): 当前时间，测试时使用
+
+        Returns:
+            int: 删除的文件数
+        """
+        with self._sweep_lock:
+            now = time.time() if now is None else now
+            if self._last_scan is None or time.monotonic() - self._last_scan >= self.rescan_interval:
+                self._scan()
+            self._resolve_sizes()
+
+            with self._lock:
+                entries = sorted((entry[1], key, entry[0]) for key, entry in self._entries.items())
+                total = self.total_bytes
+            # 从最久未访问的开始删除：先删超过max_idle的，再删到总大小降到上限的90%
+            cutoff = now - self.max_idle if self.max_idle else None
+            over = self.max_bytes and total > self.max_bytes
+            victims = []
+            for atime, key, size in entries:
+                if cutoff is not None and atime < cutoff:
+                    reason = 'idle'
+                elif over and total > self.max_bytes * 0.9:
+                    reason = 'size'
+                else:
+                    break
+                victims.append((atime, key, reason))
+                total -= max(size, 0)
+
+            removed = 0
+            dirs = set()
+            for atime, key, reason in victims:
+                with self._lock:
+                    entry = self._entries.get(key)
+                    # 期间又被读取或重新写入的条目保留
+                    if entry is None or entry[1] != atime:
+                        continue
+                    del self._entries[key]
+                    self.total_bytes -= max(entry[0], 0)
+                    self.evictions += 1
+                path = self.root / key
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    print(f"删除缓存文件失败: {path}, 错误: {e}")
+                    continue
+                DISK_CACHE_EVICTIONS.inc(reason)
+                dirs.add(path.parent)
+                removed += 1
+            for directory in dirs:
+                self._remove_empty(directory)
+            self.save()
+            return removed
+
+    def _scan(self) -> None:
+        """扫描整个缓存目录，与内存中的记录合并"""
+        start = time.time()
+        scanned = {}
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [name for name in dirnames if not name.startswith('.')]
+            for name in filenames:
+                if name.startswith('.') or name == DICT_FILE or (name == INDEX_FILE and dirpath == str(self.root)):
+                    continue
+                path = Path(dirpath) / name
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                scanned[path.relative_to(self.root).as_posix()] = [stat.st_size, stat.st_mtime]
+        with self._lock:
+            for key, entry in self._entries.items():
+                if key in scanned:
+                    scanned[key][1] = max(scanned[key][1], entry[1])
+                elif entry[1] >= start:
+                    # 扫描期间写入的文件
+                    scanned[key] = entry
+            self._entries = scanned
+            self.total_bytes = sum(entry[0] for entry in scanned.values() if entry[0] != UNKNOWN_SIZE)
+        self._last_scan = time.monotonic()
+
+    def _resolve_sizes(self) -> None:
+        """查询只读取过、大小未知的条目，文件已不存在的去掉"""
+        with self._lock:
+            unknown = [key for key, entry in self._entries.items() if entry[0] == UNKNOWN_SIZE]
+        for key in unknown:
+            try:
+                size = (self.root / key).stat().st_size
+            except FileNotFoundError:
+                size = None
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is None or entry[0] != UNKNOWN_SIZE:
+                    continue
+                if size is None:
+                    del self._entries[key]
+                else:
+                    entry[0] = size
+                    self.total_bytes += size
+
+    def _remove_empty(self, directory: Path) -> None:
+        """删除清理后变空的书籍目录（只剩压缩字典时连同字典）和分片目录"""
+        while directory != self.root and self.root in directory.parents:
+            try:
+                names = os.listdir(directory)
+                if names == [DICT_FILE]:
+                    os.unlink(directory / DICT_FILE)
+                directory.rmdir()
+            except OSError:
+                # 不为空，或已被其他线程删除
+                return
+            directory = directory.parent
+
+    def _load(self) -> None:
+        """读取上次保存的索引，文件不存在或损坏时等首次清理扫描目录"""
+        try:
+            with open(self.root / INDEX_FILE, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+        if data[:len(INDEX_MAGIC)] != INDEX_MAGIC:
+            return
+        entries = {}
+        offset = len(INDEX_MAGIC)
+        try:
+            while offset < len(data):
+                size, atime, length = INDEX_ENTRY.unpack_from(data, offset)
+                offset += INDEX_ENTRY.size
+                entries[data[offset:offset + length].decode('utf-8')] = [size, atime]
+                offset += length
+        except (struct.error, UnicodeDecodeError):
+            return
+        with self._lock:
+            self._entries = entries
+            self.total_bytes = sum(entry[0] for entry in entries.values())
+        self._last_scan = time.monotonic()
+
+    def save(self) -> None:
+        """把索引写入INDEX_FILE，先写临时文件再重命名"""
+        with self._lock:
+            entries = [(key, entry[0], entry[1]) for key, entry in self._entries.items() if entry[0] != UNKNOWN_SIZE]
+        parts = [INDEX_MAGIC]
+        for key, size, atime in entries:
+            name = key.encode('utf-8')
+            parts.append(INDEX_ENTRY.pack(size, atime, len(name)))
+            parts.append(name)
+        self.root.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=f".{INDEX_FILE}.", suffix='.tmp')
+        try:
+            with open(fd, 'wb') as f:
+                f.write(b''.join(parts))
+            os.replace(tmp_path, self.root / INDEX_FILE)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+    def _start(self) -> None:
+        """启动后台清理线程（调用方持有锁）"""
+        if self._thread is None and self.interval > 0 and not self._stopped.is_set():
+            self._thread = threading.Thread(target=self._run, name='disk-cache-janitor', daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"清理磁盘缓存失败: {self.root}, 错误: {e}")
+
+    def stop(self) -> None:
+        """停止后台清理线程"""
+        self._stopped.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join()
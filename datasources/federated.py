@@ -0,0 +1,277 @@
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import List, Dict, Optional, Any, Callable, Iterator, Tuple
+
+from .base import DataSource
+from .cached import LRUCache
+from .catalog import Version
+from .metrics import FEDERATED_CALLS, FEDERATED_FALLBACKS
+from .toc import ChapterTOC, Navigation
+
+
+class _Member:
+    """联合数据源中的一个数据源及其分发设置"""
+
+    __slots__ = ('name', 'source', 'deadline', 'executor', 'max_pending', 'pending')
+
+    def __init__(self, name: str, source: DataSource, deadline: Optional[float], workers: int):
+        self.name = name
+        self.source = source
+        self.deadline = deadline
+        # 有期限的数据源在各自的线程池中执行，慢的上游占满线程也不影响其他数据源
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'federated-{name}') \
+            if deadline is not None else None
+        self.max_pending = workers * 2
+        self.pending = 0
+
+
+class FederatedDataSource(DataSource):
+    """把多个数据源按优先级组合成一个数据源
+
+    按书籍ID访问时，由第一个有这本书的数据源负责（例如先本地镜像、再DDTKorea），所属数据源没有结果或
+    出错时依次回退到其他数据源。书籍列表和搜索同时分发给所有数据源，按优先级合并去重；设置了期限的数据源
+    超时后结果被丢弃（请求在后台继续，通常会填充该数据源自己的缓存），不会拖慢其他数据源的结果。
+    """
+
+    def __init__(self, sources: List[Tuple[str, DataSource]], deadline: Optional[float] = 2.0,
+                 deadlines: Optional[Dict[str, Optional[float]]] = None, workers: int = 4,
+                 owner_ttl: float = 300, max_owners: int = 100000):
+        """初始化联合数据源
+
+        Args:
+            sources (List[Tuple[str, DataSource]]): (名称, 数据源)列表，按优先级从高到低排列
+            deadline (Optional[float]): 书籍列表和搜索等待每个数据源的秒数，None表示一直等待
+            deadlines (Optional[Dict[str, Optional[float]]]): 按名称覆盖个别数据源的期限，
+                期限为None的数据源在请求线程中直接调用，适合本地数据源
+            workers (int): 每个有期限的数据源的分发线程数
+            owner_ttl (float): 书籍属于非首选数据源时，隔多少秒重新确认（首选数据源后来有了这本书时改由它负责）
+            max_owners (int): 记录书籍所属数据源的条目上限
+        """
+        if not sources:
+            raise ValueError("至少需要一个数据源")
+        deadlines = deadlines or {}
+        self.members = [_Member(name, source, deadlines.get(name, deadline), workers) for name, source in sources]
+        self.owner_ttl = owner_ttl
+        # 书籍ID -> (数据源序号, 过期时间)
+        self._owners = LRUCache(max_owners, max_item_bytes=1, sizeof=lambda entry: 1)
+        self._lock = threading.Lock()
+
+    def _call(self, member: _Member, method: str, *args: Any) -> Any:
+        """调用数据源的方法，出错时打印并返回None"""
+        try:
+            return getattr(member.source, method)(*args)
+        except Exception as e:
+            print(f"数据源{member.name}的{method}调用失败: {e}")
+            return None
+
+    def _fan_out(self, method: str, *args: Any) -> List[Any]:
+        """同时调用所有数据源的方法，按优先级返回各自的结果，超时、出错或排队过多的数据源结果为None"""
+        start = time.monotonic()
+        futures = []
+        for member in self.members:
+            future = None
+            if member.executor is not None:
+                with self._lock:
+                    busy = member.pending >= member.max_pending
+                    if not busy:
+                        member.pending += 1
+                if busy:
+                    # 之前的请求还卡在上游，不再排队
+                    FEDERATED_CALLS.inc(member.name, 'busy')
+                    future = False
+                else:
+                    future = member.executor.submit(self._call, member, method, *args)
+                    future.add_done_callback(lambda _, member=member: self._done(member))
+            futures.append(future)
+
+        results = []
+        for member, future in zip(self.members, futures):
+            if future is None:
+                result = self._call(member, method, *args)
+            elif future is False:
+                results.append(None)
+                continue
+            else:
+                try:
+                    result = future.result(timeout=max(start + member.deadline - time.monotonic(), 0))
+                except FutureTimeoutError:
+                    FEDERATED_CALLS.inc(member.name, 'timeout')
+                    results.append(None)
+                    continue
+            FEDERATED_CALLS.inc(member.name, 'error' if result is None else 'ok')
+            results.append(result)
+        return results
+
+    def _done(self, member: _Member) -> None:
+        with self._lock:
+            member.pending -= 1
+
+    def _remember(self, book_id: int, index: int) -> None:
+        """记录书籍所属的数据源"""
+        expires = float('inf') if index == 0 else time.monotonic() + self.owner_ttl
+        self._owners.put(int(book_id), (index, expires))
+
+    def _owner(self, book_id: int) -> Optional[int]:
+        """获取已记录的、未过期的所属数据源序号"""
+        entry = self._owners.get(int(book_id))
+        if entry is None or entry[1] < time.monotonic():
+            return None
+        return entry[0]
+
+    def _order(self, book_id: int) -> List[int]:
+        """按访问顺序排列的数据源序号：所属数据源在前，其余按优先级"""
+        owner = self._owner(book_id)
+        if owner is None:
+            self.get_book_by_id(book_id)
+            owner = self._owner(book_id)
+        order = list(range(len(self.members)))
+        if owner:
+            order.remove(owner)
+            order.insert(0, owner)
+        return order
+
+    def _first(self, book_id: int, method: str, *args: Any,
+               accept: Callable[[Any], bool] = lambda result: result is not None) -> Any:
+        """依次调用所属数据源和其他数据源，返回第一个可用的结果"""
+        result = None
+        for position, index in enumerate(self._order(book_id)):
+            member = self.members[index]
+            if position:
+                FEDERATED_FALLBACKS.inc(member.name)
+            result = self._call(member, method, book_id, *args)
+            if result is not None and accept(result):
+                return result
+        return result
+
+    def get_books(self) -> List[Dict[str, Any]]:
+        """获取所有数据源的书籍列表，按优先级合并去重"""
+        return _merge(self._fan_out('get_books'))[0]
+
+    def get_book_by_id(self, book_id: int) -> Optional[Dict[str, Any]]:
+        """根据ID获取书籍详情，所属数据源未知或已过期时按优先级查找"""
+        owner = self._owner(book_id)
+        if owner is not None:
+            book = self._call(self.members[owner], 'get_book_by_id', book_id)
+            if book:
+                return book
+        for index, member in enumerate(self.members):
+            if index == owner:
+                continue
+            book = self._call(member, 'get_book_by_id', book_id)
+            if book:
+                self._remember(book_id, index)
+                return book
+        return None
+
+    def get_books_by_ids(self, book_ids: List[int]) -> List[Dict[str, Any]]:
+        """批量获取书籍详情，每个数据源只查询前面的数据源没有找到的书籍"""
+        found = {}
+        remaining = [int(book_id) for book_id in book_ids]
+        for index, member in enumerate(self.members):
+            if not remaining:
+                break
+            for book in self._call(member, 'get_books_by_ids', remaining) or []:
+                found.setdefault(int(book['id']), book)
+                self._remember(book['id'], index)
+            remaining = [book_id for book_id in remaining if book_id not in found]
+        return [found[int(book_id)] for book_id in book_ids if int(book_id) in found]
+
+    def get_chapters(self, book_id: int) -> List[Dict[str, Any]]:
+        """获取指定书籍的所有章节"""
+        return self._first(book_id, 'get_chapters', accept=bool) or []
+
+    def get_chapter_toc(self, book_id: int) -> ChapterTOC:
+        """获取指定书籍的目录"""
+        return self._first(book_id, 'get_chapter_toc', accept=len) or ChapterTOC([])
+
+    def get_chapter_navigation(self, book_id: int, chapter_id: int) -> Optional[Navigation]:
+        """获取章节及其上一章、下一章"""
+        return self._first(book_id, 'get_chapter_navigation', chapter_id)
+
+    def get_chapters_page(self, book_id: int, offset: int = 0, limit: int = 100) -> Tuple[int, List[Dict[str, Any]]]:
+        """获取指定书籍的一段章节"""
+        return self._first(book_id, 'get_chapters_page', offset, limit, accept=lambda page: page[0] > 0) or (0, [])
+
+    def get_chapter_content(self, book_id: int, chapter_id: int) -> Optional[str]:
+        """获取指定章节的内容，镜像中缺少的章节从后面的数据源获取"""
+        return self._first(book_id, 'get_chapter_content', chapter_id)
+
+    def iter_chapter_content(self, book_id: int, chapter_id: int,
+                             chunk_size: int = 64 * 1024) -> Optional[Iterator[str]]:
+        """逐块获取指定章节的内容"""
+        return self._first(book_id, 'iter_chapter_content', chapter_id, chunk_size)
+
+    def get_version(self, book_id: Optional[int] = None, chapter_id: Optional[int] = None) -> Optional[Version]:
+        """获取数据版本
+
+        书籍目录的版本由所有数据源的版本合并，任一数据源无法提供时返回None；书籍和章节的版本取第一个能
+        提供版本的数据源，顺序与读取内容相同。这里只查看已记录的所属数据源，不为了版本去查询书籍。
+        """
+        if book_id is None:
+            versions = [self._call(member, 'get_version') for member in self.members]
+            if any(version is None for version in versions):
+                return None
+            tag = hashlib.blake2b(repr(versions).encode('utf-8'), digest_size=8).hexdigest()
+            return tag, max(mtime for _, mtime in versions)
+        owner = self._owner(book_id) or 0
+        order = [owner] + [index for index in range(len(self.members)) if index != owner]
+        for index in order:
+            version = self._call(self.members[index], 'get_version', book_id, chapter_id)
+            if version is not None:
+                return version
+        return None
+
+    def search_books(self, query: str) -> List[Dict[str, Any]]:
+        """同时搜索所有数据源，按优先级合并去重"""
+        return _merge(self._fan_out('search_books', query))[0]
+
+    def search_books_page(self, query: str, offset: int = 0, limit: int = 20) -> Tuple[int, List[Dict[str, Any]]]:
+        """分页搜索书籍
+
+        每个数据源取前offset+limit条结果合并；总数为各数据源总数之和减去已发现的重复书籍
+        """
+        end = None if limit is None else offset + limit
+        pages = [page or (0, []) for page in self._fan_out('search_books_page', query, 0, end)]
+        books, duplicates = _merge([results for _, results in pages])
+        total = sum(total for total, _ in pages) - duplicates
+        return total, books[offset:end]
+
+    def reset_owners(self, book_id: Optional[int] = None) -> int:
+        """忘记书籍所属的数据源，下次访问时重新查找
+
+        Args:
+            book_id (Optional[int]): 书籍ID，为None时全部忘记
+
+        Returns:
+            int: 删除的条目数
+        """
+        if book_id is None:
+            return self._owners.invalidate()
+        return self._owners.invalidate(lambda key: key == int(book_id))
+
+    def shutdown(self, wait: bool = True) -> None:
+        """停止分发线程"""
+        for member in self.members:
+            if member.executor is not None:
+                member.executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def _merge(results: List[Optional[List[Dict[str, Any]]]]) -> Tuple[List[Dict[str, Any]], int]:
+    """按优先级合并各数据源的书籍列表，同一ID只保留优先级最高的
+
+    Returns:
+        Tuple[List[Dict[str, Any]], int]: (合并后的列表, 重复的书籍数)
+    """
+    if sum(1 for books in results if books) <= 1:
+        return next((books for books in results if books), []), 0
+    merged = []
+    seen = set()
+    for books in results:
+        for book in books or []:
+            if book['id'] in seen:
+                continue
+            seen.add(book['id'])
+            merged.append(book)
+    return merged, sum(len(books or []) for books in results) - len(merged)
@@ -0,0 +1,160 @@
+import random
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class FetchError(Exception):
+    """抓取页面失败（重试耗尽或返回错误状态码）"""
+
+
+class RateLimiter:
+    """按主机限制请求速率的令牌桶，可在多个线程间共享"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        """初始化限速器
+
+        Args:
+            rate (float): 每个主机每秒允许的请求数，0表示不限速
+            burst (int): 空闲后允许连续发出的请求数
+        """
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, url: str) -> float:
+        """等待直到可以向url所在主机发出请求
+
+        Returns:
+            float: 等待的秒数
+        """
+        if self.rate <= 0:
+            return 0.0
+        host = urlsplit(url).netloc
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                tokens, last = self._buckets.get(host, (self.burst, now))
+                tokens = min(self.burst, tokens + (now - last) * self.rate)
+                if tokens >= 1:
+                    self._buckets[host] = (tokens - 1, now)
+                    return waited
+                self._buckets[host] = (tokens, now)
+                wait = (1 - tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+class HttpClient:
+    """带连接池和重试的HTTP客户端，可在多个线程间共享
+
+    所有线程共用一个HTTPAdapter（即同一个urllib3连接池，本身是线程安全的），
+    每个线程各自持有一个Session，避免在线程间共享Session的Cookie等状态。
+    """
+
+    # 需要重试的状态码
+    RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+    def __init__(self, headers: Optional[Dict[str, str]] = None,
+                 pool_connections: int = 10, pool_maxsize: int = 10, pool_block: bool = False,
+                 connect_timeout: float = 3.05, read_timeout: float = 10,
+                 max_retries: int = 3, backoff_base: float = 0.5, backoff_max: float = 8.0,
+                 rate_limiter: Optional[RateLimiter] = None):
+        """初始化HTTP客户端
+
+        Args:
+            headers (Optional[Dict[str, str]]): 每个请求附带的请求头
+            pool_connections (int): 连接池数量（按主机划分）
+            pool_maxsize (int): 每个主机保持的最大连接数
+            pool_block (bool): 连接数达到上限时是否等待空闲连接，否则临时新建连接
+            connect_timeout (float): 建立连接超时（秒）
+            read_timeout (float): 读取响应超时（秒）
+            max_retries (int): 最大重试次数
+            backoff_base (float): 指数退避的基础等待时间（秒）
+            backoff_max (float): 单次等待时间上限（秒）
+            rate_limiter (Optional[RateLimiter]): 按主机限速，每次请求（包括重试）前等待
+        """
+        self.headers = dict(headers or {})
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rate_limiter = rate_limiter
+
+        # 重试由本类负责，适配器本身不重试
+        self._adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                    pool_block=pool_block, max_retries=0)
+        self._local = threading.local()
+
+    @property
+    def session(self) -> requests.Session:
+        """当前线程的Session，挂载共享的连接池"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(self.headers)
+            session.mount('http://', self._adapter)
+            session.mount('https://', self._adapter)
+            self._local.session = session
+        return session
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """发送GET请求，连接错误、超时和可重试的状态码会按指数退避重试
+
+        Args:
+            url (str): 请求URL
+            **kwargs: 传给requests的其他参数
+
+        Returns:
+            requests.Response: 响应
+
+        Raises:
+            FetchError: 重试耗尽或返回不可重试的错误状态码
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        error = None
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(url)
+            try:
+                response = self.session.get(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            else:
+                if response.status_code not in self.RETRY_STATUSES:
+                    try:
+                        response.raise_for_status()
+                    except requests.HTTPError as e:
+                        raise FetchError(f"{url}: {e}") from e
+                    return response
+                error = FetchError(f"{url}: HTTP {response.status_code}")
+                retry_after = self._retry_after(response)
+                response.close()
+
+            if attempt < self.max_retries:
+                time.sleep(max(self._backoff(attempt), retry_after or 0))
+
+        raise FetchError(f"{url}: 重试{self.max_retries}次后仍失败: {error}") from error
+
+    def _backoff(self, attempt: int) -> float:
+        """计算第attempt次重试前的等待时间（带随机抖动的指数退避）"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _retry_after(self, response: requests.Response) -> Optional[float]:
+        """解析Retry-After响应头（仅支持秒数），不超过backoff_max"""
+        value = response.headers.get('Retry-After')
+        try:
+            return min(float(value), self.backoff_max) if value else None
+        except (TypeError, ValueError):
+            return None
+
+    def close(self) -> None:
+        """关闭连接池"""
+        self._adapter.close()
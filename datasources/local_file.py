@@ -1,18 +1,40 @@
 import json
+import threading
+import time
 from pathlib import Path
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Iterable, Iterator, Tuple
 
 from .base import DataSource
+from .catalog import Catalog, CatalogIndex, Signature, Version, combine_signatures, file_signature
+from .compression import ChapterStore
+from .metrics import DISK_READ_SECONDS
+from .search_index import SearchIndex
+from .snapshot import SnapshotFile
+from .toc import ChapterTOC, TOCCache
+from .watcher import (BOOK_ADDED, BOOK_REMOVED, CATALOG_CHANGED, TOC_CHANGED, ChangeEvent,
+                      LibraryWatcher)
+
+# 搜索索引同步失败后的重试间隔（秒），连续失败时加倍，最长INDEX_RETRY_MAX
+INDEX_RETRY_MIN = 5.0
+INDEX_RETRY_MAX = 600.0
 
 class LocalFileDataSource(DataSource):
     """本地文件数据源，从本地JSON文件读取数据"""
     
-    def __init__(self, books_dir: str = 'data/books', books_info_file: str = 'data/books.json'):
+    def __init__(self, books_dir: str = 'data/books', books_info_file: str = 'data/books.json',
+                 catalog_check_interval: float = 1.0, search_index: Optional[SearchIndex] = None,
+                 chapter_store: Optional[ChapterStore] = None, snapshot: Optional[SnapshotFile] = None,
+                 index_check_interval: float = 60.0):
         """初始化本地文件数据源
         
         Args:
             books_dir (str): 书籍目录路径
             books_info_file (str): 书籍信息文件路径
+            catalog_check_interval (float): 检查books.json变化的最小间隔（秒）
+            search_index (Optional[SearchIndex]): 全文搜索索引，为None时按书名和作者逐本匹配
+            chapter_store (Optional[ChapterStore]): 章节正文的读取方式，默认同时支持普通文本和压缩文件
+            snapshot (Optional[SnapshotFile]): 书库快照，书籍目录和章节列表与快照一致时从快照读取，不解析JSON
+            index_check_interval (float): 未订阅书库监视时，检查各书章节变化并同步搜索索引的最小间隔（秒）
         """
         self.books_dir = Path(books_dir)
         self.books_info_file = Path(books_info_file)
@@ -20,47 +42,213 @@ class LocalFileDataSource(DataSource):
         # 确保必要的目录存在
         self.books_dir.mkdir(parents=True, exist_ok=True)
         self.books_info_file.parent.mkdir(parents=True, exist_ok=True)
+        
+        # 常驻内存的书籍目录，books.json变化时自动重建
+        self.snapshot = snapshot
+        self.catalog = CatalogIndex(self.books_info_file, check_interval=catalog_check_interval,
+                                    snapshot=snapshot.catalog if snapshot is not None else None)
+        # 按chapters.json签名缓存的书籍目录
+        self.tocs = TOCCache()
+        # 章节正文，压缩过的章节读取时自动解压
+        self.chapter_store = chapter_store or ChapterStore()
+        
+        # 全文搜索索引，books.json变化后在后台线程中增量同步，期间沿用旧索引；
+        # 未订阅书库监视时还每隔index_check_interval秒逐本比较签名，发现新增和修改的章节
+        self.search_index = search_index
+        self.index_check_interval = index_check_interval
+        self._indexed_catalog = None
+        self._index_checked = None
+        self._index_failures = 0
+        self._index_retry_at = 0.0
+        self._index_ready = search_index is not None and len(search_index) > 0
+        self._index_thread = None
+        self._index_lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        # 订阅了书库监视后，由变化事件更新索引，不再逐本检查书库
+        self._watched = False
     
     def get_books(self) -> List[Dict[str, Any]]:
-        """获取所有书籍列表"""
-        try:
-            with open(self.books_info_file, 'r', encoding='utf-8') as f:
-                return json.load(f)['books']
-        except FileNotFoundError:
-            return []
+        """获取所有书籍列表（共享的只读列表，调用方不应修改）"""
+        return self.catalog.get().books
     
     def get_book_by_id(self, book_id: int) -> Optional[Dict[str, Any]]:
         """根据ID获取书籍详情"""
-        try:
-            with open(self.books_info_file, 'r', encoding='utf-8') as f:
-                books = json.load(f)['books']
-                return next((b for b in books if b['id'] == int(book_id)), None)
-        except FileNotFoundError:
-            return None
+        return self.catalog.get().get(book_id)
+    
+    def get_books_by_ids(self, book_ids: List[int]) -> List[Dict[str, Any]]:
+        """批量获取书籍详情，所有书籍取自同一个目录快照"""
+        catalog = self.catalog.get()
+        return [book for book in (catalog.get(book_id) for book_id in book_ids) if book]
     
     def get_chapters(self, book_id: int) -> List[Dict[str, Any]]:
-        """获取指定书籍的所有章节"""
+        """获取指定书籍的所有章节（共享的只读列表，调用方不应修改）"""
+        return self.get_chapter_toc(book_id).chapters
+    
+    def get_chapter_toc(self, book_id: int) -> ChapterTOC:
+        """获取指定书籍的目录，chapters.json未变化时直接使用缓存"""
+        chapters_file = self.books_dir / str(book_id) / 'chapters.json'
+        signature = file_signature(chapters_file)
+        if signature is None:
+            return ChapterTOC([])
+        return self.tocs.get(int(book_id), signature, lambda: self._load_chapters(chapters_file, book_id, signature))
+    
+    def _load_chapters(self, chapters_file: Path, book_id: Optional[int] = None,
+                       signature: Signature = None) -> List[Dict[str, Any]]:
+        """读取章节列表，快照中有签名相同的章节列表时直接使用"""
+        if self.snapshot is not None and book_id is not None:
+            chapters = self.snapshot.chapters(book_id, signature)
+            if chapters is not None:
+                return chapters
         try:
-            chapters_file = self.books_dir / str(book_id) / 'chapters.json'
-            with open(chapters_file, 'r', encoding='utf-8') as f:
+            with DISK_READ_SECONDS.time('chapters'), open(chapters_file, 'r', encoding='utf-8') as f:
                 return json.load(f)
         except FileNotFoundError:
             return []
     
     def get_chapter_content(self, book_id: int, chapter_id: int) -> Optional[str]:
         """获取指定章节的内容"""
-        try:
-            content_file = self.books_dir / str(book_id) / f'{chapter_id}.txt'
-            with open(content_file, 'r', encoding='utf-8') as f:
-                return f.read()
-        except FileNotFoundError:
-            return None
+        with DISK_READ_SECONDS.time('chapter'):
+            return self.chapter_store.read(self.books_dir / str(book_id), chapter_id)
+    
+    def iter_chapter_content(self, book_id: int, chapter_id: int,
+                             chunk_size: int = 64 * 1024) -> Optional[Iterator[str]]:
+        """逐块读取指定章节的内容，压缩过的章节边读边解压"""
+        with DISK_READ_SECONDS.time('chapter'):
+            chunks = self.chapter_store.iter_read(self.books_dir / str(book_id), chapter_id, chunk_size)
+        return DISK_READ_SECONDS.time_iter(chunks, 'chapter') if chunks is not None else None
+    
+    def get_version(self, book_id: Optional[int] = None, chapter_id: Optional[int] = None) -> Optional[Version]:
+        """获取数据版本，由books.json、chapters.json和章节文件的签名组成"""
+        signatures = [self.catalog.get().signature]
+        if book_id is not None:
+            book_dir = self.books_dir / str(book_id)
+            signatures.append(file_signature(book_dir / 'chapters.json'))
+            if chapter_id is not None:
+                signatures.append(self.chapter_store.signature(book_dir, chapter_id))
+        return combine_signatures(signatures)
     
     def search_books(self, query: str) -> List[Dict[str, Any]]:
         """搜索书籍"""
         books = self.get_books()
         if not query:
             return books
-        
+        if self.search_index is not None:
+            return self.search_books_page(query, 0, None)[1]
+        return self._match_books(books, query)
+    
+    def _match_books(self, books: List[Dict[str, Any]], query: str) -> List[Dict[str, Any]]:
+        """逐本匹配书名和作者"""
         query = query.lower()
-        return [b for b in books if query in b['title'].lower() or query in b['author'].lower()]
\ No newline at end of file
+        return [b for b in books if query in b['title'].lower() or query in b['author'].lower()]
+    
+    def search_books_page(self, query: str, offset: int = 0, limit: int = 20) -> Tuple[int, List[Dict[str, Any]]]:
+        """分页搜索书籍，有全文索引时按相关度排序"""
+        if self.search_index is None or not query:
+            return super().search_books_page(query, offset, limit)
+        
+        if not self.sync_search_index():
+            # 索引首次构建完成前，逐本匹配书名和作者
+            books = self._match_books(self.get_books(), query)
+            return len(books), books[offset:None if limit is None else offset + limit]
+        catalog = self.catalog.get()
+        total, book_ids = self.search_index.search(query, offset, limit)
+        return total, [book for book in (catalog.get(book_id) for book_id in book_ids) if book]
+    
+    def sync_search_index(self, wait: bool = False) -> bool:
+        """目录快照变化或到了检查间隔时在后台线程中增量同步搜索索引，不阻塞请求
+        
+        同步期间继续使用旧的索引，已删除的书籍从结果中过滤掉；索引为空时没有可用的旧索引，
+        由调用方改为逐本匹配。同步失败后等待一段时间再重试，不会每次搜索都重新开始。
+        书库很大时可以先用 python -m datasources.search_index 离线构建索引。
+        
+        Args:
+            wait (bool): 是否等待同步完成
+            
+        Returns:
+            bool: 索引是否可用
+        """
+        thread = self._index_thread
+        if thread is None and time.monotonic() >= self._index_retry_at and \
+                (self.catalog.get() is not self._indexed_catalog or self._index_stale()):
+            with self._index_lock:
+                thread = self._index_thread
+                if thread is None:
+                    thread = self._index_thread = threading.Thread(target=self._build_search_index,
+                                                                   name='search-index', daemon=True)
+                    thread.start()
+        if wait and thread is not None:
+            thread.join()
+        return self._index_ready
+    
+    def _index_stale(self) -> bool:
+        """未订阅书库监视时，距上次逐本检查是否已超过检查间隔"""
+        return not self._watched and (self._index_checked is None or
+                                      time.monotonic() - self._index_checked >= self.index_check_interval)
+    
+    def _build_search_index(self) -> None:
+        """后台同步线程，一直同步到最新的目录快照"""
+        checked = False
+        try:
+            while True:
+                catalog = self.catalog.get()
+                with self._build_lock:
+                    if catalog is self._indexed_catalog and (checked or not self._index_stale()):
+                        break
+                    if self._watched and self._indexed_catalog is not None:
+                        self._index_changes(self._indexed_catalog, catalog)
+                    else:
+                        # 逐本比较签名（书籍信息、chapters.json和书籍目录），只重建有变化的书籍
+                        self.search_index.sync(catalog.books, self.books_dir)
+                        self._index_checked = time.monotonic()
+                    checked = True
+                    self._indexed_catalog = catalog
+                    self._index_ready = True
+            self._index_failures = 0
+        except Exception as e:
+            self._index_failures += 1
+            delay = min(INDEX_RETRY_MIN * 2 ** (self._index_failures - 1), INDEX_RETRY_MAX)
+            self._index_retry_at = time.monotonic() + delay
+            print(f"同步搜索索引失败: {self.search_index.index_file}, 错误: {e}，{delay:.0f}秒后重试")
+        finally:
+            with self._index_lock:
+                self._index_thread = None
+    
+    def _index_changes(self, previous: Catalog, catalog: Catalog, book_ids: Iterable[int] = ()) -> None:
+        """只重建信息有变化的书籍和book_ids中的书籍，删除目录中已没有的书籍（调用方持有写入锁）"""
+        changed = set(book_ids)
+        if previous is not catalog:
+            # 在内存中比较新旧目录，不需要访问每本书的文件
+            old, new = previous.by_id, catalog.by_id
+            for book_id in old.keys() - new.keys():
+                self.search_index.remove_book(book_id)
+            changed.update(book_id for book_id, book in new.items() if old.get(book_id) != book)
+        for book_id in sorted(changed):
+            book = catalog.get(book_id)
+            if book is not None:
+                self.search_index.index_book(book, self.books_dir / str(book_id))
+    
+    def watch(self, watcher: LibraryWatcher) -> None:
+        """订阅书库监视，此后目录、章节列表缓存和搜索索引都按变化事件更新"""
+        self._watched = True
+        watcher.subscribe(self.apply_changes)
+    
+    def apply_changes(self, events: List[ChangeEvent]) -> None:
+        """按一批书库变化更新目录、章节列表缓存和搜索索引，只处理涉及的书籍"""
+        if any(event.kind == CATALOG_CHANGED for event in events):
+            self.catalog.refresh()
+        for event in events:
+            if event.kind in (TOC_CHANGED, BOOK_ADDED, BOOK_REMOVED):
+                self.tocs.invalidate(event.book_id)
+        if self.search_index is None:
+            return
+        
+        book_ids = {event.book_id for event in events if event.book_id is not None}
+        with self._build_lock:
+            catalog = self.catalog.get()
+            if self._indexed_catalog is None:
+                self.search_index.sync(catalog.books, self.books_dir)
+                self._index_checked = time.monotonic()
+            else:
+                self._index_changes(self._indexed_catalog, catalog, book_ids)
+            self._indexed_catalog = catalog
+            self._index_ready = True
@@ -0,0 +1,277 @@
+import bisect
+import math
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# 延迟直方图的默认分桶（秒），覆盖从内存命中到上游超时的范围
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    """指标基类，每组标签值对应一个序列"""
+
+    type = ''
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _check(self, labels: Tuple[str, ...]) -> None:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name}需要{len(self.labelnames)}个标签值，实际为{len(labels)}个")
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        """Prometheus文本格式"""
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.type}']
+        lines.extend(self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+
+    type = 'counter'
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        """计数加amount
+
+        Args:
+            *labels (str): 标签值，顺序与labelnames相同
+            amount (float): 增加的数量
+        """
+        with self._lock:
+            value = self._series.get(labels)
+            if value is None:
+                self._check(labels)
+                value = 0
+            self._series[labels] = value + amount
+
+    def get(self, *labels: str) -> float:
+        """当前计数，没有记录过时为0"""
+        return self._series.get(labels, 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            series = sorted(self._series.items())
+        return [f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}'
+                for labels, value in series]
+
+
+# 迭代器结束的标记
+_DONE = object()
+
+
+class _Timer:
+    """记录代码块耗时的上下文管理器"""
+
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram: 'Histogram', labels: Tuple[str, ...]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self) -> '_Timer':
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+class Histogram(_Metric):
+    """分桶直方图，每个序列记录各桶计数、总和和次数"""
+
+    type = 'histogram'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: str) -> None:
+        """记录一次观测值
+
+        Args:
+            value (float): 观测值，耗时以秒为单位
+            *labels (str): 标签值，顺序与labelnames相同
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                self._check(labels)
+                # 每桶只记本桶的次数，输出时再累加
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, *labels: str) -> _Timer:
+        """返回记录代码块耗时的上下文管理器"""
+        return _Timer(self, labels)
+
+    def time_iter(self, items: Iterator, *labels: str) -> Iterator:
+        """包装迭代器，全部取完或关闭时记录一次耗时
+
+        只累计迭代器本身产生每一项的时间，不包括调用方处理每一项的时间
+        """
+        elapsed = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                item = next(items, _DONE)
+                elapsed += time.perf_counter() - start
+                if item is _DONE:
+                    break
+                yield item
+        finally:
+            self.observe(elapsed, *labels)
+            close = getattr(items, 'close', None)
+            if close is not None:
+                close()
+
+    def count(self, *labels: str) -> int:
+        """观测次数，没有记录过时为0"""
+        series = self._series.get(labels)
+        return series[2] if series is not None else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            series = sorted((labels, (list(counts), total, count))
+                            for labels, (counts, total, count) in self._series.items())
+        lines = []
+        for labels, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}')
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f'{self.name}_sum{label_text} {_format_value(total)}')
+            lines.append(f'{self.name}_count{label_text} {count}')
+        return lines
+
+
+class Gauge(_Metric):
+    """导出时调用回调函数取值的仪表，用于缓存占用等已有统计"""
+
+    type = 'gauge'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 collect: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None):
+        super().__init__(name, help, labelnames)
+        self.collect = collect
+
+    def samples(self) -> List[str]:
+        try:
+            series = sorted(self.collect().items()) if self.collect is not None else []
+        except Exception as e:
+            print(f"读取指标失败: {self.name}, 错误: {e}")
+            series = []
+        return [f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}'
+                for labels, value in series]
+
+
+class Registry:
+    """指标注册表，按注册顺序以Prometheus文本格式导出所有指标
+
+    记录指标只是在锁内更新几个数字，开销在微秒以下，可以在生产环境中一直开启。
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"指标已注册: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        """注册计数器"""
+        return self._register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        """注册直方图"""
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = (),
+              collect: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None) -> Gauge:
+        """注册仪表
+
+        Args:
+            collect (Optional[Callable]): 返回{标签值元组: 数值}的回调函数，每次导出时调用
+        """
+        return self._register(Gauge(name, help, labelnames, collect))
+
+    def render(self) -> str:
+        """所有指标的Prometheus文本格式（text/plain; version=0.0.4）"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+# 进程内的默认注册表，由/metrics导出
+REGISTRY = Registry()
+
+# DDTKorea数据源
+CACHE_LOOKUPS = REGISTRY.counter(
+    'booksite_ddtkorea_cache_lookups_total',
+    'DDTKorea页面缓存查询次数，result为hit（未过期）、stale（先返回旧数据并后台刷新）或miss（同步抓取）',
+    ('kind', 'result'))
+UPSTREAM_SECONDS = REGISTRY.histogram(
+    'booksite_upstream_request_seconds', '抓取DDTKorea页面的耗时（包括重试），成功和失败都记录', ('kind',))
+UPSTREAM_ERRORS = REGISTRY.counter(
+    'booksite_upstream_errors_total', '抓取DDTKorea页面失败的次数，error为最后一次失败的异常类型', ('kind', 'error'))
+PARSE_SECONDS = REGISTRY.histogram('booksite_parse_seconds', '解析DDTKorea页面的耗时', ('kind',))
+DISK_CACHE_EVICTIONS = REGISTRY.counter(
+    'booksite_disk_cache_evictions_total', '磁盘缓存（DDTKorea缓存和页面缓存）清理删除的文件数，reason为idle（长期未访问）或size（超出容量）',
+    ('reason',))
+
+# 本地书库
+DISK_READ_SECONDS = REGISTRY.histogram(
+    'booksite_disk_read_seconds', '本地书库读取文件的耗时，file为chapters（目录）或chapter（章节正文）', ('file',))
+LIBRARY_CHANGES = REGISTRY.counter(
+    'booksite_library_changes_total', '书库监视发现的变化数，kind为变化类型（见datasources.watcher）', ('kind',))
+
+# 多数据源联合
+FEDERATED_CALLS = REGISTRY.counter(
+    'booksite_federated_calls_total',
+    '联合数据源向各数据源分发书籍列表和搜索的次数，result为ok、timeout（超过期限，结果被丢弃）、busy（积压的请求过多，未分发）或error',
+    ('source', 'result'))
+FEDERATED_FALLBACKS = REGISTRY.counter(
+    'booksite_federated_fallbacks_total', '联合数据源在前一级数据源没有结果或出错后改用source查询的次数', ('source',))
+
+# HTTP路由
+REQUEST_SECONDS = REGISTRY.histogram(
+    'booksite_http_request_seconds', '各路由生成响应的耗时，流式响应不包括发送正文的时间',
+    ('endpoint', 'method', 'status'))
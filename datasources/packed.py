@@ -0,0 +1,312 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+from .catalog import Version, combine_signatures, file_signature
+from .compression import ChapterStore, iter_utf8
+from .local_file import LocalFileDataSource
+from .toc import ChapterTOC
+
+# 打包书籍文件格式（小端序）：
+#   文件头    magic(4) version(2) reserved(2) 章节数(4) 章节信息长度(8)
+#   索引      每章一项：章节ID(8) 正文偏移(8) 正文字节数(8)，字节数为-1表示章节文件缺失
+#   章节信息  UTF-8编码的JSON，与chapters.json内容相同
+#   正文      各章节UTF-8正文依次拼接，偏移从文件开头算起
+MAGIC = b'BKPK'
+VERSION = 1
+HEADER = struct.Struct('<4sHHIQ')
+ENTRY = struct.Struct('<qqq')
+
+PACKED_SUFFIX = '.book'
+
+
+class PackedFormatError(ValueError):
+    """打包书籍文件格式错误"""
+
+
+class PackedBook:
+    """以内存映射方式打开的打包书籍，读取章节不需要再打开文件"""
+
+    def __init__(self, path: Path):
+        """打开打包书籍
+
+        Args:
+            path (Path): 打包文件路径
+
+        Raises:
+            PackedFormatError: 文件不是有效的打包书籍
+        """
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            # 用已打开文件的签名，避免打开前文件被替换
+            stat = os.fstat(f.fileno())
+            self.signature = (stat.st_mtime_ns, stat.st_size)
+            try:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as e:
+                raise PackedFormatError(f"{path}: 空文件") from e
+        self._view = memoryview(self._mm)
+
+        if len(self._view) < HEADER.size:
+            raise PackedFormatError(f"{path}: 文件头不完整")
+        magic, version, _, count, meta_len = HEADER.unpack_from(self._view)
+        if magic != MAGIC or version != VERSION:
+            raise PackedFormatError(f"{path}: 不支持的文件格式")
+        meta_start = HEADER.size + count * ENTRY.size
+        if meta_start + meta_len > len(self._view):
+            raise PackedFormatError(f"{path}: 文件不完整")
+
+        # 正文必须位于章节信息之后、文件末尾之前，截断或损坏的文件在打开时报错，而不是返回残缺的正文
+        body_start = meta_start + meta_len
+        self._index = {}
+        for chapter_id, offset, length in ENTRY.iter_unpack(self._view[HEADER.size:meta_start]):
+            if length < -1 or (length >= 0 and (offset < body_start or offset + length > len(self._view))):
+                raise PackedFormatError(f"{path}: 章节{chapter_id}的正文超出文件范围")
+            self._index[chapter_id] = (offset, length)
+        self.chapters = json.loads(str(self._view[meta_start:meta_start + meta_len], 'utf-8'))
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def chapter_bytes(self, chapter_id: int) -> Optional[memoryview]:
+        """章节正文的UTF-8字节，直接引用映射的内存，不复制
+
+        Returns:
+            Optional[memoryview]: 章节正文，章节不存在返回None
+        """
+        entry = self._index.get(int(chapter_id))
+        if entry is None or entry[1] < 0:
+            return None
+        offset, length = entry
+        return self._view[offset:offset + length]
+
+    def chapter_text(self, chapter_id: int) -> Optional[str]:
+        """章节正文，章节不存在返回None"""
+        data = self.chapter_bytes(chapter_id)
+        return str(data, 'utf-8') if data is not None else None
+
+    def iter_chapter_text(self, chapter_id: int, chunk_size: int = 64 * 1024) -> Optional[Iterator[str]]:
+        """逐块解码章节正文，每次只解码chunk_size字节的映射内存
+
+        Returns:
+            Optional[Iterator[str]]: 章节正文的文本块，章节不存在返回None
+        """
+        data = self.chapter_bytes(chapter_id)
+        if data is None:
+            return None
+        return iter_utf8(data[i:i + chunk_size] for i in range(0, len(data), chunk_size))
+
+    def close(self) -> None:
+        """关闭内存映射，仍有chapter_bytes返回的切片在使用时保持打开，由垃圾回收关闭"""
+        try:
+            self._view.release()
+            self._mm.close()
+        except BufferError:
+            pass
+
+
+class PackedBookCache:
+    """按文件签名缓存已打开的打包书籍，限制同时映射的文件数，线程安全"""
+
+    def __init__(self, max_open: int = 256):
+        """初始化缓存
+
+        Args:
+            max_open (int): 同时保持映射的书籍数量上限
+        """
+        self.max_open = max_open
+        self._books = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, book_id: int, path: Path) -> Optional[PackedBook]:
+        """获取打包书籍，文件变化时重新映射
+
+        Args:
+            book_id (int): 书籍ID
+            path (Path): 打包文件路径
+
+        Returns:
+            Optional[PackedBook]: 打包书籍，文件不存在或格式错误时返回None
+        """
+        signature = file_signature(path)
+        with self._lock:
+            book = self._books.get(book_id)
+            if book is not None and book.signature == signature:
+                self._books.move_to_end(book_id)
+                return book
+            # 被替换的旧映射不主动关闭，其他线程可能还在读取，引用释放后自动关闭
+            self._books.pop(book_id, None)
+            if signature is None:
+                return None
+            try:
+                book = PackedBook(path)
+            except (OSError, PackedFormatError) as e:
+                print(f"打开打包书籍失败: {path}, 错误: {e}")
+                return None
+            self._books[book_id] = book
+            while len(self._books) > self.max_open:
+                self._books.popitem(last=False)
+            return book
+
+    def invalidate(self, book_id: Optional[int] = None) -> None:
+        """丢弃已打开的书籍，book_id为None时全部丢弃"""
+        with self._lock:
+            if book_id is None:
+                self._books.clear()
+            else:
+                self._books.pop(book_id, None)
+
+
+class PackedFileDataSource(LocalFileDataSource):
+    """打包书籍数据源：书籍信息仍来自books.json，每本书的目录和正文来自一个打包文件"""
+
+    def __init__(self, packed_dir: str = 'data/packed', books_info_file: str = 'data/books.json',
+                 catalog_check_interval: float = 1.0, max_open: int = 256):
+        """初始化打包书籍数据源
+
+        Args:
+            packed_dir (str): 打包文件目录，每本书一个<书籍ID>.book文件
+            books_info_file (str): 书籍信息文件路径
+            catalog_check_interval (float): 检查books.json变化的最小间隔（秒）
+            max_open (int): 同时保持映射的书籍数量上限
+        """
+        super().__init__(books_dir=packed_dir, books_info_file=books_info_file,
+                         catalog_check_interval=catalog_check_interval)
+        self.packed_books = PackedBookCache(max_open)
+
+    def _packed_book(self, book_id: int) -> Optional[PackedBook]:
+        return self.packed_books.get(int(book_id), self.books_dir / f"{int(book_id)}{PACKED_SUFFIX}")
+
+    def get_chapter_toc(self, book_id: int) -> ChapterTOC:
+        """获取指定书籍的目录，打包文件未变化时直接使用缓存"""
+        book = self._packed_book(book_id)
+        if book is None:
+            return ChapterTOC([])
+        return self.tocs.get(int(book_id), book.signature, lambda: book.chapters)
+
+    def get_version(self, book_id: Optional[int] = None, chapter_id: Optional[int] = None) -> Optional[Version]:
+        """获取数据版本，由books.json和打包文件的签名组成，同一本书的章节共用打包文件的版本"""
+        signatures = [self.catalog.get().signature]
+        if book_id is not None:
+            signatures.append(file_signature(self.books_dir / f"{int(book_id)}{PACKED_SUFFIX}"))
+        return combine_signatures(signatures)
+
+    def get_chapter_content(self, book_id: int, chapter_id: int) -> Optional[str]:
+        """获取指定章节的内容"""
+        book = self._packed_book(book_id)
+        return book.chapter_text(chapter_id) if book is not None else None
+
+    def iter_chapter_content(self, book_id: int, chapter_id: int,
+                             chunk_size: int = 64 * 1024) -> Optional[Iterator[str]]:
+        """逐块读取指定章节的内容"""
+        book = self._packed_book(book_id)
+        return book.iter_chapter_text(chapter_id, chunk_size) if book is not None else None
+
+
+def pack_book(book_dir: Path, packed_file: Path, chapter_store: Optional[ChapterStore] = None) -> int:
+    """把一本书的chapters.json和章节文本打包成一个文件
+
+    Args:
+        book_dir (Path): 书籍目录，包含chapters.json和<章节ID>.txt（或压缩后的.txt.z）
+        packed_file (Path): 输出的打包文件路径
+        chapter_store (Optional[ChapterStore]): 章节正文的读取方式
+
+    Returns:
+        int: 打包的章节数
+    """
+    book_dir = Path(book_dir)
+    packed_file = Path(packed_file)
+    chapter_store = chapter_store or ChapterStore()
+    with open(book_dir / 'chapters.json', 'r', encoding='utf-8') as f:
+        chapters = json.load(f)
+
+    meta = json.dumps(chapters, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    body_start = HEADER.size + len(chapters) * ENTRY.size + len(meta)
+
+    # 先写临时文件再重命名，已映射旧文件的读取方不受影响
+    packed_file.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=packed_file.parent, prefix=f".{packed_file.name}.", suffix='.tmp')
+    try:
+        with open(fd, 'wb') as f:
+            # 正文逐章写入，写完后再回填索引，不需要把整本书读入内存
+            f.seek(body_start)
+            offset = body_start
+            index = []
+            for chapter in chapters:
+                # 按文本方式读取，换行符与直接读取.txt文件时一致
+                text = chapter_store.read(book_dir, chapter['id'])
+                if text is None:
+                    index.append(ENTRY.pack(int(chapter['id']), 0, -1))
+                    continue
+                body = text.encode('utf-8')
+                f.write(body)
+                index.append(ENTRY.pack(int(chapter['id']), offset, len(body)))
+                offset += len(body)
+
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, VERSION, 0, len(chapters), len(meta)))
+            f.writelines(index)
+            f.write(meta)
+        os.replace(tmp_path, packed_file)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return len(chapters)
+
+
+def _newest_mtime(book_dir: Path) -> int:
+    """书籍目录及其中文件的最新修改时间"""
+    with os.scandir(book_dir) as entries:
+        return max([book_dir.stat().st_mtime_ns] + [entry.stat().st_mtime_ns for entry in entries])
+
+
+def convert_library(books_dir: Path, packed_dir: Path, force: bool = False) -> Tuple[int, int]:
+    """把书籍目录下的所有书打包，打包文件比书籍目录新时跳过
+
+    Args:
+        books_dir (Path): 书籍目录，每本书一个<书籍ID>子目录
+        packed_dir (Path): 打包文件目录
+        force (bool): 是否重新打包所有书籍
+
+    Returns:
+        Tuple[int, int]: (打包的书籍数, 打包的章节数)
+    """
+    books_dir = Path(books_dir)
+    packed_dir = Path(packed_dir)
+    packed_books = packed_chapters = 0
+    for book_dir in sorted(books_dir.iterdir()):
+        if not book_dir.is_dir() or not book_dir.name.isdigit() or not (book_dir / 'chapters.json').exists():
+            continue
+        packed_file = packed_dir / f"{book_dir.name}{PACKED_SUFFIX}"
+        signature = file_signature(packed_file)
+        if not force and signature is not None and signature[0] >= _newest_mtime(book_dir):
+            continue
+        packed_chapters += pack_book(book_dir, packed_file)
+        packed_books += 1
+    return packed_books, packed_chapters
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """命令行：把按目录存放的书籍转换为打包格式"""
+    parser = argparse.ArgumentParser(description='把书籍目录转换为打包格式')
+    parser.add_argument('--books-dir', default='data/books', help='书籍目录路径')
+    parser.add_argument('--packed-dir', default='data/packed', help='打包文件目录')
+    parser.add_argument('--force', action='store_true', help='重新打包所有书籍')
+    args = parser.parse_args(argv)
+
+    books, chapters = convert_library(Path(args.books_dir), Path(args.packed_dir), args.force)
+    print(f"打包完成: 更新{books}本书，共{chapters}章")
+
+
+if __name__ == '__main__':
+    main()
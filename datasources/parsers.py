@@ -0,0 +1,290 @@
+import re
+from typing import List, Dict, Optional, Any
+
+from bs4 import BeautifulSoup
+
+try:
+    import lxml.html
+    from lxml import etree
+except ImportError:  # lxml是可选依赖，没有安装时使用html.parser
+    lxml = None
+
+
+class SoupBackend:
+    """BeautifulSoup解析后端，纯Python实现，不需要额外依赖"""
+
+    name = 'html.parser'
+
+    def parse(self, html: str) -> Any:
+        return BeautifulSoup(html, 'html.parser')
+
+    def select(self, node: Any, selector: str) -> List[Any]:
+        return node.select(selector)
+
+    def select_one(self, node: Any, selector: str) -> Optional[Any]:
+        return node.select_one(selector)
+
+    def text(self, node: Any) -> str:
+        return node.text
+
+    def attr(self, node: Any, name: str) -> Optional[str]:
+        return node.get(name)
+
+
+class LxmlBackend:
+    """lxml解析后端，由libxml2解析HTML，CSS选择器预先编译为XPath"""
+
+    name = 'lxml'
+
+    # 支持的选择器：用空格连接的若干个 tag、.class、#id 组合，如 '.novel-list .novel-item'、'a.novel-title'
+    _SIMPLE = re.compile(r'^([a-zA-Z][\w-]*)?((?:[.#][\w-]+)*)$')
+
+    _ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
+
+    def __init__(self):
+        if lxml is None:
+            raise ImportError('lxml解析后端需要安装lxml')
+        self._compiled = {}
+        self._texts = etree.XPath('descendant::text()[not(ancestor::script or ancestor::style or ancestor::template)]')
+
+    def parse(self, html: str) -> Any:
+        try:
+            return lxml.html.document_fromstring(html).getroottree()
+        except etree.ParserError:
+            # 空白页面
+            return lxml.html.document_fromstring('<html></html>').getroottree()
+
+    def select(self, node: Any, selector: str) -> List[Any]:
+        return self._xpath(selector)(node)
+
+    def select_one(self, node: Any, selector: str) -> Optional[Any]:
+        # XPath在找到所有匹配后才返回，这里的选择器匹配的节点都很少
+        matches = self._xpath(selector)(node)
+        return matches[0] if matches else None
+
+    def text(self, node: Any) -> str:
+        # 与BeautifulSoup一致：不含script/style内的文字，标签间只有空白的文字
+        # 按是否含换行压缩为一个换行或一个空格（pre/textarea内除外）
+        pieces = []
+        for piece in self._texts(node):
+            if not piece.strip(self._ASCII_SPACES) and not self._preserves_whitespace(piece):
+                piece = '\n' if '\n' in piece else ' '
+            pieces.append(piece)
+        return ''.join(pieces)
+
+    def attr(self, node: Any, name: str) -> Optional[str]:
+        value = node.get(name)
+        return str(value) if value is not None else None
+
+    @staticmethod
+    def _preserves_whitespace(piece: Any) -> bool:
+        """文字是否位于pre或textarea中"""
+        element = piece.getparent()
+        if piece.is_tail:
+            element = element.getparent()
+        while element is not None:
+            if element.tag in ('pre', 'textarea'):
+                return True
+            element = element.getparent()
+        return False
+
+    def _xpath(self, selector: str) -> Any:
+        """编译并缓存选择器对应的XPath"""
+        xpath = self._compiled.get(selector)
+        if xpath is None:
+            xpath = self._compiled[selector] = etree.XPath(self.css_to_xpath(selector))
+        return xpath
+
+    @classmethod
+    def css_to_xpath(cls, selector: str) -> str:
+        """把简单CSS选择器转换为XPath，匹配范围与BeautifulSoup的select相同（只匹配后代节点）
+
+        Raises:
+            ValueError: 选择器包含不支持的语法
+        """
+        steps = []
+        for part in selector.split():
+            match = cls._SIMPLE.match(part)
+            if not match:
+                raise ValueError(f"不支持的选择器: {selector}")
+            tag, qualifiers = match.groups()
+            conditions = []
+            for kind, value in re.findall(r'([.#])([\w-]+)', qualifiers):
+                if kind == '.':
+                    conditions.append(f"contains(concat(' ', normalize-space(@class), ' '), ' {value} ')")
+                else:
+                    conditions.append(f"@id='{value}'")
+            step = 'descendant::' + (tag.lower() if tag else '*')
+            if conditions:
+                step += '[' + ' and '.join(conditions) + ']'
+            steps.append(step)
+        return '/'.join(steps)
+
+
+BACKENDS = {
+    'html.parser': SoupBackend,
+    'lxml': LxmlBackend,
+}
+
+
+def get_backend(name: str = 'auto') -> Any:
+    """创建解析后端
+
+    Args:
+        name (str): 后端名称：html.parser、lxml，或auto（安装了lxml时使用lxml）
+
+    Returns:
+        Any: 解析后端
+    """
+    if name == 'auto':
+        name = 'lxml' if lxml is not None else 'html.parser'
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"未知的解析后端: {name}")
+
+
+class DDTKoreaParser:
+    """DDTKorea页面解析器
+
+    每个选择器对每个节点只求值一次，解析结果与后端无关。
+    """
+
+    def __init__(self, base_url: str, backend: str = 'auto'):
+        """初始化解析器
+
+        Args:
+            base_url (str): DDTKorea基础URL，用于补全相对链接
+            backend (str): 解析后端，见get_backend
+        """
+        self.base_url = base_url
+        self.backend = get_backend(backend)
+
+    def _text(self, node: Any, selector: str, default: str) -> str:
+        """node下第一个匹配selector的节点的文本，不存在时返回default"""
+        found = self.backend.select_one(node, selector)
+        return self.backend.text(found).strip() if found is not None else default
+
+    def _absolute(self, url: str) -> str:
+        return url if url.startswith('http') else self.base_url + url
+
+    def parse_book_list(self, html: str, item_selector: str, limit: Optional[int] = 10) -> List[Dict[str, Any]]:
+        """解析书籍列表（首页或搜索结果页）
+
+        Args:
+            html (str): 页面HTML
+            item_selector (str): 书籍条目的CSS选择器
+            limit (Optional[int]): 最多解析的书籍数量，None表示不限制
+
+        Returns:
+            List[Dict[str, Any]]: 书籍列表
+        """
+        backend = self.backend
+        books = []
+        try:
+            root = backend.parse(html)
+
+            # 查找小说列表
+            for item in backend.select(root, item_selector):
+                try:
+                    link = backend.select_one(item, 'a.novel-title')
+                    if link is None:
+                        continue
+
+                    book_url = self._absolute(backend.attr(link, 'href'))
+
+                    # 从URL中提取ID
+                    book_id = re.search(r'/novel/([\d]+)', book_url)
+                    if not book_id:
+                        continue
+
+                    cover = backend.select_one(item, '.novel-cover img')
+                    books.append({
+                        'id': int(book_id.group(1)),
+                        'title': backend.text(link).strip(),
+                        'author': self._text(item, '.novel-author', '未知作者'),
+                        'cover': backend.attr(cover, 'src') if cover is not None else '',
+                        'description': self._text(item, '.novel-desc', '暂无简介'),
+                        'source_url': book_url
+                    })
+
+                    # 限制爬取数量
+                    if limit is not None and len(books) >= limit:
+                        break
+                except Exception as e:
+                    print(f"解析书籍信息失败: {e}")
+                    continue
+        except Exception as e:
+            print(f"解析书籍列表失败: {e}")
+        return books
+
+    def parse_book(self, html: str, book_id: int, source_url: str) -> Optional[Dict[str, Any]]:
+        """解析书籍详情页"""
+        backend = self.backend
+        try:
+            root = backend.parse(html)
+            cover = backend.select_one(root, '.novel-cover img')
+            return {
+                'id': book_id,
+                'title': self._text(root, '.novel-title', '未知标题'),
+                'author': self._text(root, '.novel-author', '未知作者'),
+                'cover': backend.attr(cover, 'src') if cover is not None else '',
+                'description': self._text(root, '.novel-desc', '暂无简介'),
+                'source_url': source_url
+            }
+        except Exception as e:
+            print(f"解析书籍详情失败: {e}")
+            return None
+
+    def parse_chapters(self, html: str) -> List[Dict[str, Any]]:
+        """解析章节列表页"""
+        backend = self.backend
+        chapters = []
+        try:
+            root = backend.parse(html)
+
+            # 查找章节列表
+            for item in backend.select(root, '.chapter-list .chapter-item'):
+                try:
+                    link = backend.select_one(item, 'a')
+                    if link is None:
+                        continue
+
+                    chapter_url = self._absolute(backend.attr(link, 'href'))
+
+                    # 从URL中提取章节ID
+                    chapter_id = re.search(r'/chapter/([\d]+)', chapter_url)
+                    if not chapter_id:
+                        continue
+
+                    chapters.append({
+                        'id': int(chapter_id.group(1)),
+                        'title': backend.text(link).strip(),
+                        'source_url': chapter_url
+                    })
+                except Exception as e:
+                    print(f"解析章节信息失败: {e}")
+                    continue
+        except Exception as e:
+            print(f"解析章节列表失败: {e}")
+        return chapters
+
+    def parse_chapter_content(self, html: str) -> Optional[str]:
+        """解析章节内容页"""
+        backend = self.backend
+        try:
+            # 提取章节内容
+            content_div = backend.select_one(backend.parse(html), '.chapter-content')
+            if content_div is None:
+                return None
+
+            # 处理内容
+            content = backend.text(content_div).strip()
+            # 替换多余的换行符
+            content = re.sub(r'\n+', '\n\n', content)
+            # 去除可能的广告文本
+            content = re.sub(r'(ddtkorea\.com|http://\S+)', '', content)
+            return content
+        except Exception as e:
+            print(f"解析章节内容失败: {e}")
+            return None
@@ -0,0 +1,103 @@
+import queue
+import threading
+from typing import Any, Callable, Hashable
+
+
+class Prefetcher:
+    """后台预取执行器
+
+    固定数量的工作线程从有界队列中取任务执行。队列已满时直接丢弃新任务，
+    不会阻塞提交任务的请求线程；同一个key在排队或执行期间只会保留一份。
+    """
+
+    def __init__(self, workers: int = 2, max_queue: int = 256, name: str = 'prefetch'):
+        """初始化预取执行器
+
+        Args:
+            workers (int): 工作线程数，0表示禁用预取
+            max_queue (int): 队列长度上限
+            name (str): 工作线程名前缀
+        """
+        self.workers = workers
+        self.name = name
+        self.submitted = 0
+        self.dropped = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._pending = set()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def submit(self, key: Hashable, fn: Callable[..., Any], *args: Any) -> bool:
+        """提交预取任务
+
+        Args:
+            key (Hashable): 任务标识，用于去重
+            fn (Callable): 要执行的函数
+            *args: 函数参数
+
+        Returns:
+            bool: 是否加入了队列（禁用、重复或队列已满时返回False）
+        """
+        if self.workers <= 0:
+            return False
+        with self._lock:
+            if key in self._pending:
+                return False
+            self._pending.add(key)
+            self._start()
+        try:
+            self._queue.put_nowait((key, fn, args))
+        except queue.Full:
+            with self._lock:
+                self._pending.discard(key)
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.submitted += 1
+        return True
+
+    def is_pending(self, key: Hashable) -> bool:
+        """任务是否在排队或执行中"""
+        with self._lock:
+            return key in self._pending
+
+    def join(self) -> None:
+        """等待队列中的任务全部完成"""
+        self._queue.join()
+
+    def shutdown(self, wait: bool = True) -> None:
+        """停止工作线程，已排队的任务会先执行完"""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(None)
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def _start(self) -> None:
+        """首次提交任务时启动工作线程（调用方持有锁）"""
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._run, name=f"{self.name}-{len(self._threads)}",
+                                      daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                break
+            key, fn, args = item
+            try:
+                fn(*args)
+            except Exception as e:
+                with self._lock:
+                    self.failed += 1
+                print(f"预取任务失败: {key}, 错误: {e}")
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+                self._queue.task_done()
@@ -0,0 +1,422 @@
+import argparse
+import hashlib
+import heapq
+import json
+import math
+import re
+import sqlite3
+import threading
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import List, Dict, Optional, Any, Iterable, Tuple
+
+from .catalog import file_signature
+from .compression import ChapterStore
+
+# 中日韩文字（含韩文音节、假名）的范围
+_CJK = 'ᄀ-ᇿ぀-ヿ㄰-㆏㐀-䶿一-鿿가-힯豈-﫿'
+# 中日韩文字连续片段，或其他语言的单词；单词不包含中日韩文字，混排的文本（如ABC小说）在文字交界处切开
+_TOKEN_RE = re.compile(f'[{_CJK}]+|[^\\W_{_CJK}]+')
+_CJK_RE = re.compile(f'[{_CJK}]')
+
+# 分词规则的版本，计入书籍签名，规则变化后sync会重建所有书籍
+TOKENIZER_VERSION = 2
+
+# 书籍信息各字段的权重
+FIELD_WEIGHTS = (('title', 3.0), ('author', 2.0), ('description', 1.0))
+
+# 书籍信息文档相对章节文档的加权
+META_BOOST = 2.0
+
+# BM25参数
+K1 = 1.2
+B = 0.75
+
+# 单字前缀最多展开的词项数，取文档频率最高的若干个
+MAX_PREFIX_TERMS = 64
+
+# 每批打分的文档数，每批之后检查能否提前结束
+SCORE_BATCH = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    id INTEGER PRIMARY KEY,
+    book_id INTEGER NOT NULL,
+    chapter_id INTEGER,
+    length REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS docs_book ON docs(book_id);
+CREATE TABLE IF NOT EXISTS terms (
+    term TEXT PRIMARY KEY,
+    df INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    book_id INTEGER NOT NULL,
+    docs BLOB NOT NULL,
+    PRIMARY KEY (term, book_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_book ON postings(book_id);
+CREATE TABLE IF NOT EXISTS books (
+    book_id INTEGER PRIMARY KEY,
+    signature TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stats (
+    key TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
+
+
+def tokenize(text: str) -> List[str]:
+    """分词
+
+    中日韩文字按相邻两字切分（二元组），并保留每段的最后一个字，
+    这样单字查询可以通过前缀匹配命中；其他文字按单词切分并转为小写。
+
+    Args:
+        text (str): 文本
+
+    Returns:
+        List[str]: 词项列表
+    """
+    tokens = []
+    for match in _TOKEN_RE.finditer(text.lower()):
+        run = match.group()
+        if _CJK_RE.match(run):
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+            tokens.append(run[-1])
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def _query_groups(query: str) -> List[Tuple[str, bool]]:
+    """把查询拆成必须全部命中的词项，单个中日韩文字按前缀匹配
+
+    Returns:
+        List[Tuple[str, bool]]: (词项, 是否前缀匹配)
+    """
+    groups = []
+    for match in _TOKEN_RE.finditer(query.lower()):
+        run = match.group()
+        if _CJK_RE.match(run):
+            if len(run) == 1:
+                groups.append((run, True))
+            else:
+                groups.extend((run[i:i + 2], False) for i in range(len(run) - 1))
+        else:
+            groups.append((run, False))
+    # 去重并保持顺序
+    return list(dict.fromkeys(groups))
+
+
+class SearchIndex:
+    """基于SQLite的磁盘倒排索引，覆盖书名、作者、简介和章节正文
+
+    每本书的信息是一个文档，每个章节是一个文档，查询结果按书籍聚合后用BM25排序。
+    倒排记录按(词项, 书籍)分块存储，一本书的所有文档打包成一个BLOB，
+    写入和删除一本书只涉及该书的行。每本书记录一个签名，sync时只重建签名变化的书籍。
+    """
+
+    def __init__(self, index_file: str = 'data/index/search.db', chapter_store: Optional[ChapterStore] = None):
+        """初始化搜索索引
+
+        Args:
+            index_file (str): 索引文件路径
+            chapter_store (Optional[ChapterStore]): 章节正文的读取方式，默认同时支持普通文本和压缩文件
+        """
+        self.index_file = Path(index_file)
+        self.chapter_store = chapter_store or ChapterStore()
+        self.index_file.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        with self._write_lock:
+            conn = self._conn()
+            conn.executescript(SCHEMA)
+            conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        """当前线程的数据库连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.index_file), check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA cache_size=-65536')
+            self._local.conn = conn
+        return conn
+
+    def __len__(self) -> int:
+        """已索引的书籍数"""
+        return self._conn().execute('SELECT COUNT(*) FROM books').fetchone()[0]
+
+    # ---- 写入 ----
+
+    def sync(self, books: List[Dict[str, Any]], books_dir: Path) -> int:
+        """按签名增量同步书库，删除已不存在的书籍
+
+        Args:
+            books (List[Dict[str, Any]]): 书籍列表
+            books_dir (Path): 书籍目录
+
+        Returns:
+            int: 重建的书籍数量
+        """
+        books_dir = Path(books_dir)
+        with self._write_lock:
+            conn = self._conn()
+            indexed = dict(conn.execute('SELECT book_id, signature FROM books'))
+
+        updated = 0
+        for book in books:
+            book_id = int(book['id'])
+            signature = self.book_signature(book, books_dir / str(book_id))
+            if indexed.pop(book_id, None) != signature:
+                self.index_book(book, books_dir / str(book_id), signature)
+                updated += 1
+
+        for book_id in indexed:
+            self.remove_book(book_id)
+        return updated
+
+    def book_signature(self, book: Dict[str, Any], book_dir: Path) -> str:
+        """书籍签名：分词规则版本 + 书籍信息 + chapters.json和书籍目录的mtime/size
+
+        章节文件通过重命名或新增写入时会改变目录的mtime。
+        """
+        parts = [str(TOKENIZER_VERSION), json.dumps(book, sort_keys=True, ensure_ascii=False),
+                 repr(file_signature(book_dir / 'chapters.json')),
+                 repr(file_signature(book_dir))]
+        return hashlib.sha1('\n'.join(parts).encode('utf-8')).hexdigest()
+
+    def index_book(self, book: Dict[str, Any], book_dir: Optional[Path] = None,
+                   signature: Optional[str] = None) -> None:
+        """索引（或重建）一本书
+
+        Args:
+            book (Dict[str, Any]): 书籍信息
+            book_dir (Optional[Path]): 书籍目录，包含chapters.json和章节文本
+            signature (Optional[str]): 书籍签名，默认根据book_dir计算
+        """
+        book_id = int(book['id'])
+        if book_dir is not None and signature is None:
+            signature = self.book_signature(book, book_dir)
+
+        docs = [(None, self._weighted_terms(book))]
+        for chapter_id, text in self._read_chapters(book_dir):
+            docs.append((chapter_id, Counter(tokenize(text))))
+
+        # 按词项汇总整本书的倒排记录：词项 -> [文档, 词频, 文档, 词频, ...]
+        book_postings = {}
+        lengths = []
+        for chapter_id, terms in docs:
+            if terms:
+                lengths.append((chapter_id, sum(terms.values()), terms))
+
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                self._delete_book(conn, book_id)
+                for chapter_id, length, terms in lengths:
+                    cursor = conn.execute('INSERT INTO docs (book_id, chapter_id, length) VALUES (?, ?, ?)',
+                                          (book_id, chapter_id, length))
+                    doc = cursor.lastrowid
+                    for term, tf in terms.items():
+                        book_postings.setdefault(term, []).extend((doc, tf))
+                # 按词项排序写入，B树插入更连续
+                rows = sorted(book_postings.items())
+                conn.executemany('INSERT INTO postings (term, book_id, docs) VALUES (?, ?, ?)',
+                                 [(term, book_id, array('d', entries).tobytes()) for term, entries in rows])
+                conn.executemany('INSERT INTO terms (term, df) VALUES (?, ?) '
+                                 'ON CONFLICT(term) DO UPDATE SET df = df + excluded.df',
+                                 [(term, len(entries) // 2) for term, entries in rows])
+                self._adjust_stats(conn, len(lengths), sum(length for _, length, _ in lengths))
+                conn.execute('INSERT OR REPLACE INTO books (book_id, signature) VALUES (?, ?)',
+                             (book_id, signature or ''))
+
+    def remove_book(self, book_id: int) -> None:
+        """从索引中删除一本书"""
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                self._delete_book(conn, int(book_id))
+                conn.execute('DELETE FROM books WHERE book_id = ?', (int(book_id),))
+
+    def _delete_book(self, conn: sqlite3.Connection, book_id: int) -> None:
+        """删除一本书的文档、倒排记录，并更新文档频率和统计"""
+        doc_count, total_length = conn.execute('SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs '
+                                               'WHERE book_id = ?', (book_id,)).fetchone()
+        if not doc_count:
+            return
+        counts = [(len(docs) // 16, term) for term, docs in
+                  conn.execute('SELECT term, docs FROM postings WHERE book_id = ?', (book_id,))]
+        conn.executemany('UPDATE terms SET df = df - ? WHERE term = ?', counts)
+        conn.execute('DELETE FROM terms WHERE df <= 0')
+        conn.execute('DELETE FROM postings WHERE book_id = ?', (book_id,))
+        conn.execute('DELETE FROM docs WHERE book_id = ?', (book_id,))
+        self._adjust_stats(conn, -doc_count, -total_length)
+
+    def _adjust_stats(self, conn: sqlite3.Connection, doc_delta: int, length_delta: float) -> None:
+        """累加文档总数和总长度（BM25需要平均文档长度）"""
+        conn.executemany('INSERT INTO stats (key, value) VALUES (?, ?) '
+                         'ON CONFLICT(key) DO UPDATE SET value = value + excluded.value',
+                         [('doc_count', doc_delta), ('total_length', length_delta)])
+
+    def _weighted_terms(self, book: Dict[str, Any]) -> Counter:
+        terms = Counter()
+        for field, weight in FIELD_WEIGHTS:
+            for term in tokenize(str(book.get(field) or '')):
+                terms[term] += weight
+        return terms
+
+    def _read_chapters(self, book_dir: Optional[Path]) -> Iterable[Tuple[int, str]]:
+        """读取书籍目录下chapters.json列出的章节文本"""
+        if book_dir is None:
+            return
+        try:
+            with open(book_dir / 'chapters.json', 'r', encoding='utf-8') as f:
+                chapters = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+        for chapter in chapters:
+            text = self.chapter_store.read(book_dir, chapter['id'])
+            if text is not None:
+                yield int(chapter['id']), text
+
+    # ---- 查询 ----
+
+    def search(self, query: str, offset: int = 0, limit: Optional[int] = 20) -> Tuple[int, List[int]]:
+        """搜索书籍
+
+        查询中的所有词项都必须出现在同一个文档（书籍信息或某一章）中。
+
+        Args:
+            query (str): 搜索关键词
+            offset (int): 结果偏移
+            limit (Optional[int]): 返回数量，None表示全部
+
+        Returns:
+            Tuple[int, List[int]]: (命中的书籍总数, 按相关度排序的书籍ID)
+        """
+        groups = _query_groups(query)
+        if not groups:
+            return 0, []
+
+        conn = self._conn()
+        stats = dict(conn.execute('SELECT key, value FROM stats'))
+        doc_count = stats.get('doc_count', 0)
+        if not doc_count:
+            return 0, []
+        avg_length = stats.get('total_length', 0) / doc_count or 1.0
+
+        # 每个查询词项展开为索引中的词项及其文档频率
+        expanded = []
+        for term, prefix in groups:
+            if prefix:
+                rows = conn.execute('SELECT term, df FROM terms WHERE term >= ? AND term < ? ORDER BY df DESC LIMIT ?',
+                                    (term, term + '\U0010ffff', MAX_PREFIX_TERMS)).fetchall()
+            else:
+                rows = conn.execute('SELECT term, df FROM terms WHERE term = ?', (term,)).fetchall()
+            if not rows:
+                return 0, []
+            expanded.append(rows)
+
+        # 从最稀有的词项开始逐步缩小候选书籍和文档，记录每个文档命中的(idf, tf)；
+        # 只有第一组读取完整的倒排记录，之后各组只读取候选书籍的
+        expanded.sort(key=lambda rows: sum(df for _, df in rows))
+        matches = None
+        for rows in expanded:
+            group_matches = {}
+            for term, df in rows:
+                idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+                if matches is None:
+                    postings = conn.execute('SELECT book_id, docs FROM postings WHERE term = ?', (term,))
+                else:
+                    postings = self._postings_for(conn, term, {book_id for book_id, _ in matches})
+                for book_id, blob in postings:
+                    entries = array('d')
+                    entries.frombytes(blob)
+                    for i in range(0, len(entries), 2):
+                        key = (book_id, int(entries[i]))
+                        group_matches.setdefault(key, []).append((idf, entries[i + 1]))
+            if matches is None:
+                matches = group_matches
+            else:
+                matches = {key: hits + group_matches[key] for key, hits in matches.items() if key in group_matches}
+            if not matches:
+                return 0, []
+
+        # BM25打分，并按书籍聚合（取最高分的文档）。按得分上界从高到低打分，已有offset + limit本书、
+        # 且剩余文档的上界都低于其中最低分时停止，不再读取其余文档的长度
+        total = len({book_id for book_id, _ in matches})
+        wanted = None if limit is None else offset + limit
+        bounds = self._score_bounds(matches)
+        order = sorted(matches, key=lambda key: -bounds[key])
+        book_scores = {}
+        for i in range(0, len(order), SCORE_BATCH):
+            if wanted and len(book_scores) >= wanted and \
+                    bounds[order[i]] < heapq.nlargest(wanted, book_scores.values())[-1]:
+                break
+            for doc, book_id, chapter_id, length in self._docs(conn, [doc for _, doc in order[i:i + SCORE_BATCH]]):
+                norm = K1 * (1 - B + B * length / avg_length)
+                score = sum(idf * tf * (K1 + 1) / (tf + norm) for idf, tf in matches[(book_id, doc)])
+                if chapter_id is None:
+                    score *= META_BOOST
+                if score > book_scores.get(book_id, 0.0):
+                    book_scores[book_id] = score
+
+        ranked = sorted(book_scores, key=lambda book_id: (-book_scores[book_id], book_id))
+        return total, ranked[offset:None if wanted is None else wanted]
+
+    @staticmethod
+    def _score_bounds(matches: Dict[Tuple[int, int], List[Tuple[float, float]]]) -> Dict[Tuple[int, int], float]:
+        """每个文档BM25得分的上界，即文档长度为0时的得分
+
+        书籍信息文档是每本书第一个写入的文档，编号最小；每本书命中的编号最小的文档可能是书籍信息，按其加权计算。
+        """
+        first_docs = {}
+        for book_id, doc in matches:
+            if book_id not in first_docs or doc < first_docs[book_id]:
+                first_docs[book_id] = doc
+        min_norm = K1 * (1 - B)
+        bounds = {}
+        for (book_id, doc), hits in matches.items():
+            bound = sum(idf * tf * (K1 + 1) / (tf + min_norm) for idf, tf in hits)
+            bounds[(book_id, doc)] = bound * max(META_BOOST, 1.0) if doc == first_docs[book_id] else bound
+        return bounds
+
+    def _postings_for(self, conn: sqlite3.Connection, term: str, book_ids: Iterable[int]) -> Iterable[Tuple[int, bytes]]:
+        """查询词项在候选书籍中的倒排记录"""
+        book_ids = list(book_ids)
+        for i in range(0, len(book_ids), 500):
+            batch = book_ids[i:i + 500]
+            placeholders = ','.join('?' * len(batch))
+            yield from conn.execute(f'SELECT book_id, docs FROM postings WHERE term = ? AND book_id IN ({placeholders})',
+                                    [term] + batch)
+
+    def _docs(self, conn: sqlite3.Connection, docs: List[int]) -> Iterable[Tuple[int, int, Optional[int], float]]:
+        for i in range(0, len(docs), 500):
+            batch = docs[i:i + 500]
+            placeholders = ','.join('?' * len(batch))
+            yield from conn.execute(f'SELECT id, book_id, chapter_id, length FROM docs WHERE id IN ({placeholders})',
+                                    batch)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """命令行：根据books.json和书籍目录构建或增量更新搜索索引"""
+    parser = argparse.ArgumentParser(description='构建书库全文搜索索引')
+    parser.add_argument('--books-file', default='data/books.json', help='书籍信息文件路径')
+    parser.add_argument('--books-dir', default='data/books', help='书籍目录路径')
+    parser.add_argument('--index', default='data/index/search.db', help='索引文件路径')
+    args = parser.parse_args(argv)
+
+    with open(args.books_file, 'r', encoding='utf-8') as f:
+        books = json.load(f)['books']
+    updated = SearchIndex(args.index).sync(books, Path(args.books_dir))
+    print(f"索引完成: 共{len(books)}本书，更新{updated}本")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+import threading
+from typing import Any, Callable, Hashable
+
+
+class _Call:
+    """一次正在进行的调用"""
+
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """合并相同key的并发调用
+
+    同一时刻同一个key只有一个调用真正执行，其余调用等待它完成并共享结果（或异常）。
+    调用完成后立即移除，之后的调用会重新执行。
+    """
+
+    def __init__(self):
+        self.shared = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args: Any) -> Any:
+        """执行调用，相同key已在执行时等待其结果
+
+        Args:
+            key (Hashable): 调用标识
+            fn (Callable): 要执行的函数
+            *args: 函数参数
+
+        Returns:
+            Any: 函数返回值
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.shared += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self, key: Hashable) -> bool:
+        """key是否正在执行"""
+        with self._lock:
+            return key in self._calls
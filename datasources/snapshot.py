@@ -0,0 +1,311 @@
+import argparse
+import json
+import marshal
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import List, Dict, Optional, Any, Tuple
+
+from .catalog import Signature, file_signature
+
+# 书库快照文件格式（小端序），由 python -m datasources.snapshot 生成：
+#   文件头    magic(4) version(2) marshal版本(2) books.json的mtime_ns(8)和大小(8) 书籍数(4) 章节列表数(4)
+#   书籍索引  按书籍ID排序，每本书一项：书籍ID(8) 书籍信息偏移(8)和长度(8)
+#   目录索引  按书籍ID排序，每本书一项：书籍ID(8) chapters.json的mtime_ns(8)和大小(8) 章节列表偏移(8)和长度(8)
+#   数据      marshal序列化的各书籍信息（按books.json中的顺序）和各书章节列表，偏移从文件开头算起
+# 每项单独序列化，打开快照时不解码任何数据，查询哪本书才解码哪本；marshal格式随Python版本变化，版本不同的快照不使用
+MAGIC = b'BKSS'
+VERSION = 1
+HEADER = struct.Struct('<4sHHqqII')
+BOOK_ENTRY = struct.Struct('<qQQ')
+TOC_ENTRY = struct.Struct('<qqqQQ')
+
+
+class SnapshotFormatError(ValueError):
+    """快照文件格式错误或由不兼容的Python版本生成"""
+
+
+def _search(view: memoryview, start: int, count: int, entry: struct.Struct, book_id: int) -> Optional[tuple]:
+    """在映射的索引上按书籍ID二分查找，不需要先建立字典"""
+    low, high = 0, count
+    while low < high:
+        middle = (low + high) // 2
+        item = entry.unpack_from(view, start + middle * entry.size)
+        if item[0] < book_id:
+            low = middle + 1
+        elif item[0] > book_id:
+            high = middle
+        else:
+            return item
+    return None
+
+
+class SnapshotCatalog:
+    """由快照提供的书籍目录，接口与Catalog相同
+
+    按ID查询时只解码这一本书；books和by_id在首次访问时才解码全部书籍（首页、无索引的搜索）。
+    """
+
+    def __init__(self, snapshot: 'Snapshot'):
+        self.snapshot = snapshot
+        self.signature = snapshot.catalog_signature
+        self._books = None
+        self._by_id = None
+        self._decoded = {}
+
+    def get(self, book_id: int) -> Optional[Dict[str, Any]]:
+        """按ID查找书籍，O(log n)，解码过的书籍直接返回"""
+        book_id = int(book_id)
+        book = self._decoded.get(book_id)
+        if book is None:
+            book = self.snapshot.book(book_id)
+            if book is not None:
+                self._decoded[book_id] = book
+        return book
+
+    @property
+    def books(self) -> List[Dict[str, Any]]:
+        if self._books is None:
+            self._books = self.snapshot.all_books()
+        return self._books
+
+    @property
+    def by_id(self) -> Dict[int, Dict[str, Any]]:
+        if self._by_id is None:
+            self._by_id = {int(book['id']): book for book in self.books}
+        return self._by_id
+
+
+class Snapshot:
+    """以内存映射方式打开的书库快照
+
+    多个工作进程映射同一个文件时共享页缓存；打开时只读取文件头，查询时才解码对应的数据。
+    每项数据都带有生成时源文件的签名，源文件变化后调用方应改为读取源文件。
+    """
+
+    def __init__(self, path: Path):
+        """打开快照
+
+        Args:
+            path (Path): 快照文件路径
+
+        Raises:
+            SnapshotFormatError: 文件不是有效的快照或版本不兼容
+        """
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            self.signature = (stat.st_mtime_ns, stat.st_size)
+            try:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as e:
+                raise SnapshotFormatError(f"{path}: 空文件") from e
+        self._view = memoryview(self._mm)
+
+        if len(self._view) < HEADER.size:
+            raise SnapshotFormatError(f"{path}: 文件头不完整")
+        magic, version, marshal_version, catalog_mtime, catalog_size, self._book_count, self._toc_count = \
+            HEADER.unpack_from(self._view)
+        if magic != MAGIC or version != VERSION:
+            raise SnapshotFormatError(f"{path}: 不支持的文件格式")
+        if marshal_version != marshal.version:
+            raise SnapshotFormatError(f"{path}: 由不同版本的Python生成，请重新生成")
+        self._toc_start = HEADER.size + self._book_count * BOOK_ENTRY.size
+        if self._toc_start + self._toc_count * TOC_ENTRY.size > len(self._view):
+            raise SnapshotFormatError(f"{path}: 文件不完整")
+        self.catalog_signature = (catalog_mtime, catalog_size)
+
+    def __len__(self) -> int:
+        return self._book_count
+
+    def catalog(self, signature: Signature) -> Optional[SnapshotCatalog]:
+        """书籍目录
+
+        Args:
+            signature (Signature): books.json当前的签名
+
+        Returns:
+            Optional[SnapshotCatalog]: 书籍目录，快照生成后books.json有变化时返回None
+        """
+        if signature is None or tuple(signature) != self.catalog_signature:
+            return None
+        return SnapshotCatalog(self)
+
+    def book(self, book_id: int) -> Optional[Dict[str, Any]]:
+        """解码一本书的信息，不存在返回None"""
+        entry = _search(self._view, HEADER.size, self._book_count, BOOK_ENTRY, int(book_id))
+        if entry is None:
+            return None
+        _, offset, length = entry
+        return marshal.loads(self._view[offset:offset + length])
+
+    def all_books(self) -> List[Dict[str, Any]]:
+        """按books.json中的顺序解码全部书籍"""
+        index = self._view[HEADER.size:self._toc_start]
+        spans = sorted((offset, length) for _, offset, length in BOOK_ENTRY.iter_unpack(index))
+        view = self._view
+        return [marshal.loads(view[offset:offset + length]) for offset, length in spans]
+
+    def chapters(self, book_id: int, signature: Signature) -> Optional[List[Dict[str, Any]]]:
+        """一本书的章节列表
+
+        Args:
+            book_id (int): 书籍ID
+            signature (Signature): chapters.json当前的签名
+
+        Returns:
+            Optional[List[Dict[str, Any]]]: 章节列表，快照中没有这本书或chapters.json有变化时返回None
+        """
+        if signature is None:
+            return None
+        entry = _search(self._view, self._toc_start, self._toc_count, TOC_ENTRY, int(book_id))
+        if entry is None:
+            return None
+        _, mtime, size, offset, length = entry
+        if (mtime, size) != tuple(signature):
+            return None
+        return marshal.loads(self._view[offset:offset + length])
+
+    def close(self) -> None:
+        """关闭内存映射"""
+        try:
+            self._view.release()
+            self._mm.close()
+        except BufferError:
+            pass
+
+
+class SnapshotFile:
+    """按需打开快照文件，文件被重新生成后自动换用新文件，线程安全
+
+    只在加载目录或章节列表时检查一次文件签名，请求的热路径上没有额外开销。
+    """
+
+    def __init__(self, path: Path):
+        """初始化
+
+        Args:
+            path (Path): 快照文件路径，文件不存在时所有查询返回None
+        """
+        self.path = Path(path)
+        self._snapshot = None
+        self._invalid = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Optional[Snapshot]:
+        """当前的快照，文件不存在或无效时返回None"""
+        signature = file_signature(self.path)
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.signature == signature:
+                return snapshot
+            # 旧映射不主动关闭，其他线程可能还在解码，引用释放后自动关闭
+            self._snapshot = None
+            # 无效的文件只报告一次，重新生成后再尝试
+            if signature is None or signature == self._invalid:
+                return None
+            try:
+                self._snapshot = Snapshot(self.path)
+            except (OSError, SnapshotFormatError) as e:
+                self._invalid = signature
+                print(f"打开书库快照失败: {self.path}, 错误: {e}")
+            return self._snapshot
+
+    def catalog(self, signature: Signature) -> Optional[SnapshotCatalog]:
+        """书籍目录，见Snapshot.catalog"""
+        snapshot = self.get()
+        return snapshot.catalog(signature) if snapshot is not None else None
+
+    def chapters(self, book_id: int, signature: Signature) -> Optional[List[Dict[str, Any]]]:
+        """一本书的章节列表，见Snapshot.chapters"""
+        snapshot = self.get()
+        return snapshot.chapters(book_id, signature) if snapshot is not None else None
+
+
+def _load_json(path: Path) -> Tuple[Any, Signature]:
+    """读取JSON文件，返回内容和读取时的文件签名"""
+    with open(path, 'r', encoding='utf-8') as f:
+        stat = os.fstat(f.fileno())
+        return json.load(f), (stat.st_mtime_ns, stat.st_size)
+
+
+def build_snapshot(books_file: Path, books_dir: Path, output: Path) -> Tuple[int, int]:
+    """把books.json和所有书籍的chapters.json写入快照文件
+
+    Args:
+        books_file (Path): 书籍信息文件
+        books_dir (Path): 书籍目录，每本书一个<书籍ID>子目录
+        output (Path): 快照文件路径
+
+    Returns:
+        Tuple[int, int]: (书籍数, 写入章节列表的书籍数)
+    """
+    books_dir = Path(books_dir)
+    output = Path(output)
+    data, catalog_signature = _load_json(Path(books_file))
+    book_blobs = [(int(book['id']), marshal.dumps(book)) for book in data['books']]
+
+    tocs = []
+    book_dirs = [path for path in books_dir.iterdir() if path.name.isdigit()] if books_dir.exists() else []
+    for book_dir in sorted(book_dirs, key=lambda path: int(path.name)):
+        try:
+            chapters, signature = _load_json(book_dir / 'chapters.json')
+        except FileNotFoundError:
+            continue
+        except ValueError as e:
+            print(f"跳过无法解析的章节列表: {book_dir / 'chapters.json'}, 错误: {e}")
+            continue
+        tocs.append((int(book_dir.name), signature, marshal.dumps(chapters)))
+
+    # 数据区依次为各书籍信息和各章节列表
+    offset = HEADER.size + len(book_blobs) * BOOK_ENTRY.size + len(tocs) * TOC_ENTRY.size
+    book_entries = []
+    for book_id, blob in book_blobs:
+        book_entries.append((book_id, offset, len(blob)))
+        offset += len(blob)
+    toc_entries = []
+    for book_id, signature, blob in tocs:
+        toc_entries.append((book_id, signature[0], signature[1], offset, len(blob)))
+        offset += len(blob)
+    book_entries.sort(key=lambda entry: entry[0])
+
+    # 先写临时文件再重命名，已映射旧文件的工作进程不受影响
+    output.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=output.parent, prefix=f".{output.name}.", suffix='.tmp')
+    try:
+        with open(fd, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, marshal.version, catalog_signature[0], catalog_signature[1],
+                                len(book_entries), len(toc_entries)))
+            f.writelines(BOOK_ENTRY.pack(*entry) for entry in book_entries)
+            f.writelines(TOC_ENTRY.pack(*entry) for entry in toc_entries)
+            f.writelines(blob for _, blob in book_blobs)
+            f.writelines(blob for _, _, blob in tocs)
+        os.replace(tmp_path, output)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return len(book_blobs), len(tocs)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """命令行：生成书库快照"""
+    parser = argparse.ArgumentParser(description='生成书籍目录和章节列表的快照，加快工作进程启动')
+    parser.add_argument('--books-file', default='data/books.json', help='书籍信息文件路径')
+    parser.add_argument('--books-dir', default='data/books', help='书籍目录路径')
+    parser.add_argument('--output', default='data/snapshot.bin', help='快照文件路径')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    books, tocs = build_snapshot(Path(args.books_file), Path(args.books_dir), Path(args.output))
+    print(f"快照生成完成: {books}本书，{tocs}份章节列表，耗时{time.perf_counter() - start:.2f}秒")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,348 @@
+import argparse
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Dict, Optional, Any, Iterator, Tuple
+
+from .base import DataSource
+from .catalog import Version
+from .compression import ChapterStore, iter_utf8
+from .search_index import FIELD_WEIGHTS, tokenize, _query_groups
+from .toc import ChapterTOC, Navigation, TOCCache
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS books (
+    id INTEGER PRIMARY KEY,
+    position INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS books_position ON books(position);
+CREATE TABLE IF NOT EXISTS chapters (
+    book_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    id INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (book_id, position)
+) WITHOUT ROWID;
+CREATE UNIQUE INDEX IF NOT EXISTS chapters_id ON chapters(book_id, id);
+CREATE TABLE IF NOT EXISTS contents (
+    book_id INTEGER NOT NULL,
+    chapter_id INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    PRIMARY KEY (book_id, chapter_id)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(title, author, description, tokenize='unicode61');
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+class SQLiteDataSource(DataSource):
+    """SQLite数据源，书籍、章节和正文都存放在一个数据库文件中
+
+    数据库使用WAL模式，读取不阻塞写入；每个线程持有自己的连接。
+    书籍信息按原样以JSON保存，返回的字典与本地文件数据源相同。
+    """
+
+    def __init__(self, db_file: str = 'data/library.db', mmap_size: int = 256 * 1024 * 1024):
+        """初始化SQLite数据源
+
+        Args:
+            db_file (str): 数据库文件路径
+            mmap_size (int): 内存映射读取数据库的字节数上限，0表示不使用内存映射
+        """
+        self.db_file = Path(db_file)
+        self.db_file.parent.mkdir(parents=True, exist_ok=True)
+        self.mmap_size = mmap_size
+        self.tocs = TOCCache()
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._books_cache = (None, [])
+        with self._write_lock:
+            conn = self._conn()
+            conn.executescript(SCHEMA)
+            conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        """当前线程的数据库连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_file), check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA cache_size=-65536')
+            conn.execute(f'PRAGMA mmap_size={int(self.mmap_size)}')
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _snapshot(self) -> Iterator[sqlite3.Connection]:
+        """在一个读事务中执行多条查询，WAL模式下这些查询看到同一个数据库版本
+
+        sqlite3模块不会为SELECT自动开启事务，不包在事务里时两次查询之间可能插入一次导入。
+        结果需要在事务内读完。
+        """
+        conn = self._conn()
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute('BEGIN')
+        try:
+            yield conn
+        finally:
+            conn.execute('COMMIT')
+
+    def _catalog_version(self) -> int:
+        """书库版本，每次导入后递增"""
+        row = self._conn().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return row[0] if row else 0
+
+    # ---- 查询 ----
+
+    def get_books(self) -> List[Dict[str, Any]]:
+        """获取所有书籍列表（共享的只读列表，调用方不应修改）"""
+        version = self._catalog_version()
+        cached_version, books = self._books_cache
+        if cached_version != version:
+            rows = self._conn().execute('SELECT data FROM books ORDER BY position')
+            books = [json.loads(data) for data, in rows]
+            self._books_cache = (version, books)
+        return books
+
+    def get_book_by_id(self, book_id: int) -> Optional[Dict[str, Any]]:
+        """根据ID获取书籍详情"""
+        row = self._conn().execute('SELECT data FROM books WHERE id = ?', (int(book_id),)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_books_by_ids(self, book_ids: List[int]) -> List[Dict[str, Any]]:
+        """批量获取书籍详情，一次查询"""
+        book_ids = [int(book_id) for book_id in book_ids]
+        if not book_ids:
+            return []
+        placeholders = ','.join('?' * len(book_ids))
+        rows = self._conn().execute(f'SELECT id, data FROM books WHERE id IN ({placeholders})', book_ids)
+        books = {book_id: json.loads(data) for book_id, data in rows}
+        return [books[book_id] for book_id in book_ids if book_id in books]
+
+    def get_chapters(self, book_id: int) -> List[Dict[str, Any]]:
+        """获取指定书籍的所有章节（共享的只读列表，调用方不应修改）"""
+        return self.get_chapter_toc(book_id).chapters
+
+    def get_chapters_after(self, book_id: int, after_chapter_id: Optional[int] = None,
+                           limit: int = 100) -> List[Dict[str, Any]]:
+        """按目录顺序获取某章之后的若干章（键集分页，翻到后面的页也只读取需要的行）
+
+        Args:
+            book_id (int): 书籍ID
+            after_chapter_id (Optional[int]): 上一页最后一章的ID，None表示从第一章开始
+            limit (int): 返回的章节数
+
+        Returns:
+            List[Dict[str, Any]]: 章节列表，after_chapter_id不存在时返回空列表
+        """
+        conn = self._conn()
+        after = -1
+        if after_chapter_id is not None:
+            row = conn.execute('SELECT position FROM chapters WHERE book_id = ? AND id = ?',
+                               (int(book_id), int(after_chapter_id))).fetchone()
+            if row is None:
+                return []
+            after = row[0]
+        rows = conn.execute('SELECT data FROM chapters WHERE book_id = ? AND position > ? ORDER BY position LIMIT ?',
+                            (int(book_id), after, int(limit)))
+        return [json.loads(data) for data, in rows]
+
+    def get_chapters_page(self, book_id: int, offset: int = 0, limit: int = 100) -> Tuple[int, List[Dict[str, Any]]]:
+        """获取指定书籍的一段章节，章节位置从0连续编号，直接按(book_id, position)索引范围查询"""
+        with self._snapshot() as conn:
+            total = conn.execute('SELECT max(position) + 1 FROM chapters WHERE book_id = ?',
+                                 (int(book_id),)).fetchone()[0] or 0
+            rows = conn.execute('SELECT data FROM chapters WHERE book_id = ? AND position >= ? AND position < ? '
+                                'ORDER BY position', (int(book_id), int(offset), int(offset) + int(limit))).fetchall()
+        return total, [json.loads(data) for data, in rows]
+
+    def get_chapter_toc(self, book_id: int) -> ChapterTOC:
+        """获取指定书籍的目录，书籍未重新导入时直接使用缓存"""
+        conn = self._conn()
+        row = conn.execute('SELECT version FROM books WHERE id = ?', (int(book_id),)).fetchone()
+        if row is None:
+            return ChapterTOC([])
+
+        def load() -> List[Dict[str, Any]]:
+            rows = conn.execute('SELECT data FROM chapters WHERE book_id = ? ORDER BY position', (int(book_id),))
+            return [json.loads(data) for data, in rows]
+
+        return self.tocs.get(int(book_id), row[0], load)
+
+    def get_chapter_navigation(self, book_id: int, chapter_id: int) -> Optional[Navigation]:
+        """获取章节及其上一章、下一章，通过(book_id, position)索引只读取三行"""
+        conn = self._conn()
+        row = conn.execute('SELECT position, data FROM chapters WHERE book_id = ? AND id = ?',
+                           (int(book_id), int(chapter_id))).fetchone()
+        if row is None:
+            return None
+        position, data = row
+        prev_row = conn.execute('SELECT data FROM chapters WHERE book_id = ? AND position < ? '
+                                'ORDER BY position DESC LIMIT 1', (int(book_id), position)).fetchone()
+        next_row = conn.execute('SELECT data FROM chapters WHERE book_id = ? AND position > ? '
+                                'ORDER BY position LIMIT 1', (int(book_id), position)).fetchone()
+        return (json.loads(prev_row[0]) if prev_row else None, json.loads(data),
+                json.loads(next_row[0]) if next_row else None)
+
+    def get_chapter_content(self, book_id: int, chapter_id: int) -> Optional[str]:
+        """获取指定章节的内容"""
+        row = self._conn().execute('SELECT content FROM contents WHERE book_id = ? AND chapter_id = ?',
+                                   (int(book_id), int(chapter_id))).fetchone()
+        return row[0] if row else None
+
+    def iter_chapter_content(self, book_id: int, chapter_id: int,
+                             chunk_size: int = 64 * 1024) -> Optional[Iterator[str]]:
+        """逐块读取指定章节的内容，通过增量BLOB读取，不把整章读入内存"""
+        conn = self._conn()
+        row = conn.execute('SELECT rowid FROM contents WHERE book_id = ? AND chapter_id = ?',
+                           (int(book_id), int(chapter_id))).fetchone()
+        if row is None:
+            return None
+        blob = conn.blobopen('contents', 'content', row[0], readonly=True)
+
+        def chunks() -> Iterator[str]:
+            with blob:
+                yield from iter_utf8(iter(lambda: blob.read(chunk_size), b''))
+        return chunks()
+
+    def get_version(self, book_id: Optional[int] = None, chapter_id: Optional[int] = None) -> Optional[Version]:
+        """获取数据版本，书库版本和书籍版本都是导入时的时间戳（纳秒）"""
+        catalog_version = self._catalog_version()
+        if book_id is None:
+            return str(catalog_version), catalog_version
+        row = self._conn().execute('SELECT version FROM books WHERE id = ?', (int(book_id),)).fetchone()
+        if row is None:
+            return None
+        return f'{catalog_version}-{row[0]}', max(catalog_version, row[0])
+
+    def search_books(self, query: str) -> List[Dict[str, Any]]:
+        """搜索书籍"""
+        if not query:
+            return self.get_books()
+        return self.search_books_page(query, 0, -1)[1]
+
+    def search_books_page(self, query: str, offset: int = 0, limit: int = 20) -> Tuple[int, List[Dict[str, Any]]]:
+        """分页搜索书籍，按书名、作者、简介的全文索引相关度排序
+
+        Args:
+            query (str): 搜索关键词
+            offset (int): 结果偏移
+            limit (int): 每页数量，-1表示全部
+        """
+        if not query:
+            return super().search_books_page(query, offset, limit)
+        match = self._match_expression(query)
+        if not match:
+            return 0, []
+
+        weights = ', '.join(str(weight) for _, weight in FIELD_WEIGHTS)
+        with self._snapshot() as conn:
+            total = conn.execute('SELECT count(*) FROM books_fts WHERE books_fts MATCH ?', (match,)).fetchone()[0]
+            rows = conn.execute(f'SELECT books.data FROM books_fts JOIN books ON books.id = books_fts.rowid '
+                                f'WHERE books_fts MATCH ? ORDER BY bm25(books_fts, {weights}), books.id '
+                                f'LIMIT ? OFFSET ?', (match, int(limit), int(offset))).fetchall()
+        return total, [json.loads(data) for data, in rows]
+
+    @staticmethod
+    def _match_expression(query: str) -> str:
+        """把查询转换为FTS5表达式，所有词项都必须命中，单个中日韩文字按前缀匹配"""
+        return ' AND '.join(f'"{term}"*' if prefix else f'"{term}"' for term, prefix in _query_groups(query))
+
+    # ---- 导入 ----
+
+    def import_books(self, books: List[Dict[str, Any]], books_dir: Path,
+                     chapter_store: Optional[ChapterStore] = None) -> int:
+        """从books.json的书籍列表和书籍目录导入，替换数据库中的全部书籍
+
+        每本书在一个事务中写入，导入过程中读取方仍能看到其余书籍。
+
+        Args:
+            books (List[Dict[str, Any]]): 书籍列表
+            books_dir (Path): 书籍目录，每本书一个<书籍ID>子目录
+            chapter_store (Optional[ChapterStore]): 章节正文的读取方式
+
+        Returns:
+            int: 导入的章节数
+        """
+        books_dir = Path(books_dir)
+        chapter_store = chapter_store or ChapterStore()
+        version = time.time_ns()
+        imported = 0
+        with self._write_lock:
+            conn = self._conn()
+            for position, book in enumerate(books):
+                book_id = int(book['id'])
+                chapters = self._read_chapters(books_dir / str(book_id))
+                contents = []
+                for chapter in chapters:
+                    text = chapter_store.read(books_dir / str(book_id), chapter['id'])
+                    if text is not None:
+                        contents.append((book_id, int(chapter['id']), text))
+                with conn:
+                    self._delete_book(conn, book_id)
+                    conn.execute('INSERT INTO books (id, position, version, data) VALUES (?, ?, ?, ?)',
+                                 (book_id, position, version,
+                                  json.dumps(book, ensure_ascii=False, separators=(',', ':'))))
+                    conn.execute('INSERT INTO books_fts (rowid, title, author, description) VALUES (?, ?, ?, ?)',
+                                 (book_id, *(' '.join(tokenize(str(book.get(field) or '')))
+                                             for field, _ in FIELD_WEIGHTS)))
+                    conn.executemany('INSERT INTO chapters (book_id, position, id, data) VALUES (?, ?, ?, ?)',
+                                     ((book_id, index, int(chapter['id']),
+                                       json.dumps(chapter, ensure_ascii=False, separators=(',', ':')))
+                                      for index, chapter in enumerate(chapters)))
+                    conn.executemany('INSERT INTO contents (book_id, chapter_id, content) VALUES (?, ?, ?)',
+                                     contents)
+                imported += len(chapters)
+
+            with conn:
+                # 删除books.json中已不存在的书籍
+                keep = {int(book['id']) for book in books}
+                for book_id, in conn.execute('SELECT id FROM books').fetchall():
+                    if book_id not in keep:
+                        self._delete_book(conn, book_id)
+                conn.execute("INSERT INTO meta (key, value) VALUES ('version', ?) "
+                             "ON CONFLICT(key) DO UPDATE SET value = excluded.value", (version,))
+        return imported
+
+    def _read_chapters(self, book_dir: Path) -> List[Dict[str, Any]]:
+        """读取chapters.json，不存在时返回空列表"""
+        try:
+            with open(book_dir / 'chapters.json', 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+
+    def _delete_book(self, conn: sqlite3.Connection, book_id: int) -> None:
+        conn.execute('DELETE FROM books WHERE id = ?', (book_id,))
+        conn.execute('DELETE FROM books_fts WHERE rowid = ?', (book_id,))
+        conn.execute('DELETE FROM chapters WHERE book_id = ?', (book_id,))
+        conn.execute('DELETE FROM contents WHERE book_id = ?', (book_id,))
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """命令行：把books.json和书籍目录导入SQLite数据库"""
+    parser = argparse.ArgumentParser(description='把本地书库导入SQLite数据库')
+    parser.add_argument('--books-file', default='data/books.json', help='书籍信息文件路径')
+    parser.add_argument('--books-dir', default='data/books', help='书籍目录路径')
+    parser.add_argument('--db', default='data/library.db', help='数据库文件路径')
+    args = parser.parse_args(argv)
+
+    with open(args.books_file, 'r', encoding='utf-8') as f:
+        books = json.load(f)['books']
+    chapters = SQLiteDataSource(args.db).import_books(books, Path(args.books_dir))
+    print(f"导入完成: 共{len(books)}本书，{chapters}章")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Optional, Any, Tuple, Callable, Hashable
+
+# (上一章, 当前章, 下一章)
+Navigation = Tuple[Optional[Dict[str, Any]], Dict[str, Any], Optional[Dict[str, Any]]]
+
+
+class ChapterTOC:
+    """书籍目录，章节ID到位置的映射，构建完成后不再修改"""
+
+    __slots__ = ('chapters', 'positions')
+
+    def __init__(self, chapters: List[Dict[str, Any]]):
+        """初始化目录
+
+        Args:
+            chapters (List[Dict[str, Any]]): 按阅读顺序排列的章节列表
+        """
+        self.chapters = chapters
+        self.positions = {int(c['id']): i for i, c in enumerate(chapters)}
+
+    def __len__(self) -> int:
+        return len(self.chapters)
+
+    def get(self, chapter_id: int) -> Optional[Dict[str, Any]]:
+        """按ID查找章节，O(1)"""
+        index = self.positions.get(int(chapter_id))
+        return None if index is None else self.chapters[index]
+
+    def neighbors(self, chapter_id: int) -> Optional[Navigation]:
+        """获取章节及其上一章、下一章，O(1)
+
+        Args:
+            chapter_id (int): 章节ID
+
+        Returns:
+            Optional[Navigation]: (上一章, 当前章, 下一章)，章节不存在返回None
+        """
+        index = self.positions.get(int(chapter_id))
+        if index is None:
+            return None
+        prev_chapter = self.chapters[index - 1] if index > 0 else None
+        next_chapter = self.chapters[index + 1] if index < len(self.chapters) - 1 else None
+        return prev_chapter, self.chapters[index], next_chapter
+
+
+class TOCCache:
+    """按书籍缓存的目录，版本（通常是文件签名）变化时重建，超出容量时淘汰最久未用的书"""
+
+    def __init__(self, max_books: int = 1024):
+        """初始化目录缓存
+
+        Args:
+            max_books (int): 最多缓存的书籍数量
+        """
+        self.max_books = max_books
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, book_id: int, version: Hashable,
+            loader: Callable[[], List[Dict[str, Any]]]) -> ChapterTOC:
+        """获取目录，版本不一致时调用loader重建
+
+        Args:
+            book_id (int): 书籍ID
+            version (Hashable): 数据版本
+            loader (Callable): 加载章节列表的函数
+
+        Returns:
+            ChapterTOC: 书籍目录
+        """
+        toc = self.lookup(book_id, version)
+        if toc is not None:
+            return toc
+
+        toc = ChapterTOC(loader())
+        if toc.chapters:
+            self.put(book_id, version, toc)
+        return toc
+
+    def lookup(self, book_id: int, version: Hashable) -> Optional[ChapterTOC]:
+        """获取版本一致的缓存目录，不加载，未命中返回None"""
+        with self._lock:
+            entry = self._entries.get(book_id)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(book_id)
+            return entry[1]
+
+    def put(self, book_id: int, version: Hashable, toc: ChapterTOC) -> None:
+        """写入目录"""
+        with self._lock:
+            self._entries[book_id] = (version, toc)
+            self._entries.move_to_end(book_id)
+            while len(self._entries) > self.max_books:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, book_id: Optional[int] = None) -> None:
+        """删除指定书籍的目录，book_id为None时清空"""
+        with self._lock:
+            if book_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(book_id, None)
@@ -0,0 +1,415 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from .catalog import Signature, file_signature
+from .compression import COMPRESSED_SUFFIX
+from .metrics import LIBRARY_CHANGES
+
+# 变化类型
+CATALOG_CHANGED = 'catalog'  # books.json
+BOOK_ADDED = 'book_added'  # 新的书籍目录
+BOOK_REMOVED = 'book_removed'
+TOC_CHANGED = 'toc'  # chapters.json
+CHAPTER_ADDED = 'chapter_added'
+CHAPTER_CHANGED = 'chapter_changed'
+CHAPTER_REMOVED = 'chapter_removed'
+
+TOC_FILE = 'chapters.json'
+
+# inotify常量，见linux/inotify.h
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, 'O_CLOEXEC', 0o2000000)
+# 文件写完（不关心写入过程中的每次修改）、重命名进出和删除
+FILE_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE | IN_ONLYDIR
+# 书籍根目录只关心子目录的增删
+ROOT_MASK = IN_CREATE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE | IN_ONLYDIR
+# inotify_event结构：wd(4) mask(4) cookie(4) len(4) name(len)
+_EVENT = struct.Struct('iIII')
+
+# 后台线程检查停止标记的间隔（秒）
+_WAKE_INTERVAL = 0.5
+
+
+class ChangeEvent(NamedTuple):
+    """书库的一项变化，books.json的变化没有书籍ID，书籍和目录的变化没有章节ID"""
+    kind: str
+    book_id: Optional[int] = None
+    chapter_id: Optional[int] = None
+
+
+def _chapter_id(name: str) -> Optional[int]:
+    """从章节文件名（<章节ID>.txt或压缩后的<章节ID>.txt.z）取得章节ID，其他文件返回None"""
+    if name.endswith(COMPRESSED_SUFFIX):
+        name = name[:-len(COMPRESSED_SUFFIX)]
+    stem, _, suffix = name.partition('.')
+    return int(stem) if suffix == 'txt' and stem.isdigit() else None
+
+
+def _tracked(name: str) -> bool:
+    """书籍目录中需要关注的文件：章节列表和章节正文（压缩字典、临时文件等不算）"""
+    return name == TOC_FILE or _chapter_id(name) is not None
+
+
+def _diff(book_id: int, old: Dict[str, Signature], new: Dict[str, Signature],
+          names: Set[str]) -> List[ChangeEvent]:
+    """比较一本书的文件签名，得出变化事件
+
+    同一章节的文件同时消失和出现（如压缩时1.txt换成1.txt.z）视为章节内容变化
+    """
+    events = []
+    chapters = {}
+    for name in sorted(names):
+        before, after = old.get(name), new.get(name)
+        if before == after:
+            continue
+        if name == TOC_FILE:
+            events.append(ChangeEvent(TOC_CHANGED, book_id))
+            continue
+        kind = CHAPTER_ADDED if before is None else CHAPTER_REMOVED if after is None else CHAPTER_CHANGED
+        chapter_id = _chapter_id(name)
+        previous = chapters.get(chapter_id)
+        chapters[chapter_id] = kind if previous is None or previous == kind else CHAPTER_CHANGED
+    events.extend(ChangeEvent(kind, book_id, chapter_id) for chapter_id, kind in chapters.items())
+    return events
+
+
+class _Inotify:
+    """通过ctypes调用libc的inotify，不需要额外依赖"""
+
+    def __init__(self):
+        """创建inotify实例
+
+        Raises:
+            OSError: 系统不支持inotify（非Linux）或实例数超出限制
+        """
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or None, use_errno=True)
+            init1, self._add_watch = libc.inotify_init1, libc.inotify_add_watch
+        except (OSError, AttributeError) as e:
+            raise OSError(f"系统不支持inotify: {e}") from e
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+
+    def add_watch(self, path: Path, mask: int) -> int:
+        """监视目录，返回监视描述符；同一目录重复添加时返回同一个描述符"""
+        wd = self._add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), str(path))
+        return wd
+
+    def read(self, timeout: float) -> List[Tuple[int, int, str]]:
+        """等待最多timeout秒，返回(监视描述符, 事件掩码, 文件名)列表"""
+        ready, _, _ = select.select([self.fd], [], [], max(timeout, 0))
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            events.append((wd, mask, os.fsdecode(data[offset:offset + length].rstrip(b'\0'))))
+            offset += length
+        return events
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class LibraryWatcher:
+    """监视本地书库（books.json和书籍目录），发出按书籍和章节细分的变化事件
+
+    启动时扫描一次书库，记录books.json和每本书的chapters.json、章节文件的签名。Linux上使用inotify，
+    每个书籍目录一个监视，事件到达后只重新stat涉及的文件并与记录比较，处理一次变化的代价与变化的文件数
+    成正比，与书库大小无关。inotify不可用（非Linux，或监视数超过fs.inotify.max_user_watches）时改为
+    每隔interval秒扫描整个书库。
+
+    同一批的变化（短时间内连续写入的多个文件）一起交给订阅者，订阅者在监视线程中调用。
+    """
+
+    def __init__(self, books_dir: str = 'data/books', books_info_file: str = 'data/books.json',
+                 interval: float = 5.0, use_inotify: bool = True, settle: float = 0.05):
+        """初始化书库监视
+
+        Args:
+            books_dir (str): 书籍目录路径，每本书一个<书籍ID>子目录
+            books_info_file (str): 书籍信息文件路径
+            interval (float): 轮询方式扫描书库的间隔（秒）
+            use_inotify (bool): 是否尝试使用inotify
+            settle (float): 收到事件后再等待多少秒，把连续写入的文件合并成一批
+        """
+        self.books_dir = Path(books_dir)
+        self.books_info_file = Path(books_info_file)
+        self.interval = interval
+        self.use_inotify = use_inotify
+        self.settle = settle
+        self.backend = None
+        self._subscribers = []
+        self._catalog = None
+        self._books = None  # 书籍ID -> {文件名: 签名}
+        self._wds = {}  # inotify监视描述符 -> 书籍ID
+        self._root_wd = None
+        self._catalog_wd = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def subscribe(self, callback: Callable[[List[ChangeEvent]], None]) -> None:
+        """订阅变化事件，callback每次收到一批事件"""
+        self._subscribers.append(callback)
+
+    def start(self) -> str:
+        """记录书库当前状态并启动监视线程
+
+        Returns:
+            str: 使用的方式，inotify或polling
+        """
+        if self._thread is not None:
+            return self.backend
+        inotify = None
+        if self.use_inotify:
+            try:
+                inotify = self._setup_inotify()
+            except OSError as e:
+                print(f"无法使用inotify监视书库，改为每{self.interval}秒扫描一次: {e}")
+        # 先添加监视再记录状态，期间发生的变化要么已经记录，要么会收到事件
+        with self._lock:
+            self._books = None
+            self._load_state()
+        self.backend = 'inotify' if inotify is not None else 'polling'
+        self._thread = threading.Thread(target=self._run, args=(inotify,), name='library-watcher', daemon=True)
+        self._thread.start()
+        return self.backend
+
+    def stop(self) -> None:
+        """停止监视线程"""
+        self._stopped.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+
+    def check(self) -> List[ChangeEvent]:
+        """扫描整个书库，与记录的状态比较，把变化交给订阅者（轮询方式每次调用一次）
+
+        Returns:
+            List[ChangeEvent]: 发现的变化，首次调用只记录状态，返回空列表
+        """
+        with self._lock:
+            if self._books is None:
+                self._load_state()
+                return []
+            events = self._check_catalog()
+            for book_id in sorted(set(self._books) | set(self._book_ids())):
+                events.extend(self._check_book(book_id))
+        self._dispatch(events)
+        return events
+
+    # ---- 状态 ----
+
+    def _book_ids(self) -> List[int]:
+        """书籍目录下所有书籍的ID"""
+        try:
+            with os.scandir(self.books_dir) as entries:
+                return [int(entry.name) for entry in entries if entry.name.isdigit() and entry.is_dir()]
+        except FileNotFoundError:
+            return []
+
+    def _scan_book(self, book_id: int) -> Optional[Dict[str, Signature]]:
+        """一本书目录中所有需要关注的文件的签名，目录不存在返回None"""
+        files = {}
+        try:
+            with os.scandir(self.books_dir / str(book_id)) as entries:
+                for entry in entries:
+                    if not _tracked(entry.name):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    files[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        return files
+
+    def _load_state(self) -> None:
+        """记录书库当前的状态（调用方持有锁）"""
+        self._catalog = file_signature(self.books_info_file)
+        self._books = {}
+        for book_id in self._book_ids():
+            files = self._scan_book(book_id)
+            if files is not None:
+                self._books[book_id] = files
+
+    def _check_catalog(self) -> List[ChangeEvent]:
+        """检查books.json（调用方持有锁）"""
+        signature = file_signature(self.books_info_file)
+        if signature == self._catalog:
+            return []
+        self._catalog = signature
+        return [ChangeEvent(CATALOG_CHANGED)]
+
+    def _check_book(self, book_id: int, names: Optional[Set[str]] = None) -> List[ChangeEvent]:
+        """检查一本书（调用方持有锁）
+
+        Args:
+            book_id (int): 书籍ID
+            names (Optional[Set[str]]): 只检查这些文件，为None时扫描整个目录
+        """
+        old = self._books.get(book_id)
+        if names is None or old is None:
+            files = self._scan_book(book_id)
+            if files is None:
+                if old is None:
+                    return []
+                del self._books[book_id]
+                return [ChangeEvent(BOOK_REMOVED, book_id)]
+            self._books[book_id] = files
+            if old is None:
+                return [ChangeEvent(BOOK_ADDED, book_id)]
+            names = set(old) | set(files)
+        else:
+            files = dict(old)
+            book_dir = self.books_dir / str(book_id)
+            for name in names:
+                signature = file_signature(book_dir / name)
+                if signature is None:
+                    files.pop(name, None)
+                else:
+                    files[name] = signature
+            self._books[book_id] = files
+        return _diff(book_id, old, files, names)
+
+    def _dispatch(self, events: List[ChangeEvent]) -> None:
+        """把一批变化交给订阅者，订阅者出错不影响其他订阅者"""
+        if not events:
+            return
+        for event in events:
+            LIBRARY_CHANGES.inc(event.kind)
+        for callback in list(self._subscribers):
+            try:
+                callback(events)
+            except Exception as e:
+                print(f"处理书库变化失败: {callback}, 错误: {e}")
+
+    # ---- 监视线程 ----
+
+    def _setup_inotify(self) -> _Inotify:
+        """创建inotify实例并监视books.json所在目录、书籍目录和每本书的目录"""
+        inotify = _Inotify()
+        try:
+            self.books_dir.mkdir(parents=True, exist_ok=True)
+            self._catalog_wd = inotify.add_watch(self.books_info_file.parent, FILE_MASK)
+            self._root_wd = inotify.add_watch(self.books_dir, ROOT_MASK)
+            for book_id in self._book_ids():
+                self._watch_book(inotify, book_id)
+        except OSError:
+            inotify.close()
+            raise
+        return inotify
+
+    def _watch_book(self, inotify: _Inotify, book_id: int) -> None:
+        try:
+            wd = inotify.add_watch(self.books_dir / str(book_id), FILE_MASK)
+        except (FileNotFoundError, NotADirectoryError):
+            return
+        self._wds[wd] = book_id
+
+    def _run(self, inotify: Optional[_Inotify]) -> None:
+        if inotify is not None:
+            try:
+                self._run_inotify(inotify)
+                return
+            except OSError as e:
+                # 通常是新书的目录超出了监视数上限
+                print(f"inotify监视书库失败，改为每{self.interval}秒扫描一次: {e}")
+                self.backend = 'polling'
+            finally:
+                inotify.close()
+            self._check_safely()
+        while not self._stopped.wait(self.interval):
+            self._check_safely()
+
+    def _check_safely(self) -> None:
+        try:
+            self.check()
+        except Exception as e:
+            print(f"扫描书库失败: {self.books_dir}, 错误: {e}")
+
+    def _run_inotify(self, inotify: _Inotify) -> None:
+        while not self._stopped.is_set():
+            raw = inotify.read(_WAKE_INTERVAL)
+            if not raw:
+                continue
+            # 稍等片刻，把同一次发布中连续写入的文件合并成一批
+            deadline = time.monotonic() + self.settle
+            while time.monotonic() < deadline:
+                more = inotify.read(deadline - time.monotonic())
+                if not more:
+                    break
+                raw.extend(more)
+            self._dispatch(self._handle(inotify, raw))
+
+    def _handle(self, inotify: _Inotify, raw: List[Tuple[int, int, str]]) -> List[ChangeEvent]:
+        """把一批inotify事件归并到涉及的文件，只检查这些文件"""
+        catalog = False
+        overflow = False
+        books = {}  # 书籍ID -> 涉及的文件名，None表示扫描整个目录
+        for wd, mask, name in raw:
+            if mask & IN_Q_OVERFLOW:
+                overflow = True
+                continue
+            if wd == self._catalog_wd and name == self.books_info_file.name:
+                catalog = True
+            if wd == self._root_wd:
+                if name.isdigit():
+                    if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                        # 目录创建后、添加监视前写入的文件由整个目录的扫描补上
+                        self._watch_book(inotify, int(name))
+                    books[int(name)] = None
+                continue
+            book_id = self._wds.get(wd)
+            if book_id is None:
+                continue
+            if mask & IN_IGNORED:
+                # 目录已删除或被移走
+                del self._wds[wd]
+                books[book_id] = None
+            elif _tracked(name):
+                names = books.setdefault(book_id, set())
+                if names is not None:
+                    names.add(name)
+
+        with self._lock:
+            if overflow:
+                # 事件队列溢出，丢失的变化只能通过完整扫描找回
+                for book_id in self._book_ids():
+                    self._watch_book(inotify, book_id)
+                books = dict.fromkeys(set(self._books) | set(self._book_ids()))
+                catalog = True
+            events = self._check_catalog() if catalog else []
+            for book_id, names in sorted(books.items()):
+                events.extend(self._check_book(book_id, names))
+        return events
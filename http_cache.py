@@ -0,0 +1,302 @@
+import functools
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, Optional, Sequence
+from urllib.parse import urlencode
+
+from flask import Response, request, make_response
+from werkzeug.http import is_resource_modified
+
+from datasources.cached import LRUCache
+from datasources.catalog import Version, combine_signatures, file_signature
+from datasources.disk_cache import CacheIndex
+
+try:
+    import brotli
+except ImportError:  # brotli是可选依赖，没有安装时只预压缩gzip
+    brotli = None
+
+
+def directory_version(directory: Path) -> Optional[Version]:
+    """目录下所有文件（如模板）的版本，文件变化后ETag随之变化
+
+    Args:
+        directory (Path): 目录路径
+
+    Returns:
+        Optional[Version]: 目录版本，目录为空或不存在时返回None
+    """
+    signatures = []
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            signatures.append(file_signature(Path(root) / name))
+    return combine_signatures(signatures)
+
+
+class CachedPage:
+    """渲染好的页面及其预压缩版本，构建完成后不再修改"""
+
+    __slots__ = ('etag', 'content_type', 'variants', 'size')
+
+    def __init__(self, etag: str, content_type: str, variants: Dict[str, bytes]):
+        """初始化页面
+
+        Args:
+            etag (str): 生成页面时的ETag
+            content_type (str): 响应的Content-Type
+            variants (Dict[str, bytes]): 内容编码（identity、gzip、br）到响应体的映射
+        """
+        self.etag = etag
+        self.content_type = content_type
+        self.variants = variants
+        self.size = sum(len(body) for body in variants.values())
+
+
+class PageCache:
+    """渲染结果缓存，分内存和磁盘两级
+
+    以请求路径和视图读取的查询参数为键，每个键只保留最新的一份；读取时ETag（包含数据和模板的版本）
+    不一致即视为未命中，因此books.json、chapters.json或章节文件变化后不会返回旧页面。
+    磁盘上的页面由CacheIndex记录大小和访问时间，后台按容量和访问时间清理。
+    """
+
+    def __init__(self, cache_dir: Optional[str] = 'data/cache/pages', max_bytes: int = 32 * 1024 * 1024,
+                 min_compress: int = 512, max_disk_bytes: int = 256 * 1024 * 1024,
+                 max_disk_idle: float = 7 * 86400, janitor_interval: float = 600):
+        """初始化页面缓存
+
+        Args:
+            cache_dir (Optional[str]): 磁盘缓存目录，为None时只使用内存
+            max_bytes (int): 内存缓存的字节数上限
+            min_compress (int): 小于该字节数的页面不预压缩
+            max_disk_bytes (int): 磁盘缓存的总字节数上限，超出时删除最久未访问的页面，0表示不限制
+            max_disk_idle (float): 磁盘上的页面多少秒未被访问后删除，0表示不按时间删除
+            janitor_interval (float): 后台清理磁盘缓存的间隔（秒），0表示不清理
+        """
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.min_compress = min_compress
+        self.memory = LRUCache(max_bytes, sizeof=lambda page: page.size)
+        self.disk_index = CacheIndex(self.cache_dir, max_bytes=max_disk_bytes, max_idle=max_disk_idle,
+                                     interval=janitor_interval) if self.cache_dir is not None else None
+
+    def _disk_file(self, key: str) -> Path:
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return self.cache_dir / digest[:2] / f"{digest}.page"
+
+    def get(self, key: str, etag: str) -> Optional[CachedPage]:
+        """获取页面，不存在或ETag不一致时返回None
+
+        Args:
+            key (str): 缓存键，通常是请求路径和查询参数
+            etag (str): 当前的ETag
+        """
+        page = self.memory.get(key)
+        if page is not None and page.etag == etag:
+            return page
+        if self.cache_dir is None:
+            return None
+        page = self._read_disk(key)
+        if page is None or page.etag != etag:
+            return None
+        self.memory.put(key, page)
+        return page
+
+    def put(self, key: str, etag: str, content_type: str, body: bytes) -> CachedPage:
+        """缓存页面，同时生成gzip和brotli版本
+
+        Returns:
+            CachedPage: 缓存的页面
+        """
+        variants = {'identity': body}
+        if len(body) >= self.min_compress:
+            variants['gzip'] = gzip.compress(body, compresslevel=9, mtime=0)
+            if brotli is not None:
+                variants['br'] = brotli.compress(body, quality=9)
+        page = CachedPage(etag, content_type, variants)
+        self.memory.put(key, page)
+        if self.cache_dir is not None:
+            self._write_disk(key, page)
+        return page
+
+    def _read_disk(self, key: str) -> Optional[CachedPage]:
+        """读取磁盘缓存，文件不存在或损坏时返回None"""
+        path = self._disk_file(key)
+        try:
+            with open(path, 'rb') as f:
+                header = json.loads(f.readline())
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"读取页面缓存失败: {key}, 错误: {e}")
+            return None
+        if header.get('key') != key:
+            return None
+        self.disk_index.touch(path)
+        variants = {}
+        offset = 0
+        for encoding, length in header['variants']:
+            variants[encoding] = data[offset:offset + length]
+            offset += length
+        if offset != len(data):
+            return None
+        return CachedPage(header['etag'], header['content_type'], variants)
+
+    def _write_disk(self, key: str, page: CachedPage) -> None:
+        """写入磁盘缓存：一行JSON文件头（包含缓存键，按键删除时使用），之后依次是各版本的响应体"""
+        path = self._disk_file(key)
+        header = {'key': key, 'etag': page.etag, 'content_type': page.content_type,
+                  'variants': [(encoding, len(body)) for encoding, body in page.variants.items()]}
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # 先写临时文件再重命名，并发读取不会看到写了一半的文件
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix='.tmp')
+            try:
+                with open(fd, 'wb') as f:
+                    f.write(json.dumps(header).encode('utf-8') + b'\n')
+                    f.writelines(page.variants.values())
+                    size = f.tell()
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except OSError as e:
+            print(f"写入页面缓存失败: {key}, 错误: {e}")
+            return
+        self.disk_index.record(path, size)
+
+    def invalidate(self, predicate: Optional[Callable[[str], bool]] = None) -> int:
+        """删除键满足条件的页面，predicate为None时清空，内存和磁盘上的页面都删除
+
+        磁盘上的页面可能由其他进程写入、不在内存中，因此扫描磁盘缓存目录，按文件头中的缓存键判断。
+
+        Returns:
+            int: 删除的页面数（按缓存键计）
+        """
+        if predicate is None:
+            predicate = lambda key: True
+        keys = set()
+
+        def matches(key: str) -> bool:
+            if predicate(key):
+                keys.add(key)
+                return True
+            return False
+
+        self.memory.invalidate(matches)
+        if self.cache_dir is not None:
+            for path in self.cache_dir.glob('*/*.page'):
+                try:
+                    with open(path, 'rb') as f:
+                        key = json.loads(f.readline()).get('key')
+                except FileNotFoundError:
+                    continue
+                except (OSError, ValueError):
+                    key = None
+                # 没有缓存键的文件（旧版本写入或已损坏）一并删除
+                if key is not None and not matches(key):
+                    continue
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    print(f"删除页面缓存失败: {path}, 错误: {e}")
+                    continue
+                self.disk_index.discard(path)
+        return len(keys)
+
+
+def resource_key(query_args: Sequence[str] = ()) -> str:
+    """当前请求的资源标识：请求路径加上视图读取的查询参数
+
+    其他查询参数（如跟踪参数、随机的防缓存参数）不影响响应，不参与ETag和页面缓存键的计算，
+    否则任意查询串都会在页面缓存中产生新的条目。
+
+    Args:
+        query_args (Sequence[str]): 视图读取的查询参数名
+
+    Returns:
+        str: 形如"/search?q=关键词&page=2"的字符串，没有参数时以"?"结尾
+    """
+    params = [(name, request.args[name]) for name in query_args if name in request.args]
+    return f'{request.path}?{urlencode(params)}'
+
+
+def _page_response(page: CachedPage, cache_control: str, last_modified: datetime) -> Response:
+    """按Accept-Encoding选择页面的版本生成响应"""
+    accept = request.accept_encodings
+    encoding = next((name for name in ('br', 'gzip') if name in page.variants and accept[name] > 0), 'identity')
+    response = Response(page.variants[encoding], content_type=page.content_type)
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    # 压缩后的响应体与原文不同，使用弱ETag
+    _set_headers(response, cache_control, page.etag, last_modified, weak=encoding != 'identity')
+    return response
+
+
+def conditional(cache_control: str, version: Optional[Callable[..., Optional[Version]]] = None,
+                salt: Optional[Version] = None, page_cache: Optional[PageCache] = None,
+                query_args: Sequence[str] = ()) -> Callable:
+    """为路由加上Cache-Control和ETag/Last-Modified验证器
+
+    在调用视图函数之前比较If-None-Match/If-Modified-Since，数据未变化时直接返回304，
+    不读取内容也不渲染模板。
+
+    Args:
+        cache_control (str): 响应的Cache-Control
+        version (Optional[Callable]): 以路由参数调用，返回数据版本；为None或返回None时不生成验证器
+        salt (Optional[Version]): 与数据版本一起参与计算的版本，通常是模板目录的版本
+        page_cache (Optional[PageCache]): 渲染结果缓存，命中时不调用视图函数
+        query_args (Sequence[str]): 视图读取的查询参数名，只有这些参数参与ETag和页面缓存键的计算
+
+    Returns:
+        Callable: 路由装饰器
+    """
+    def decorator(view: Callable) -> Callable:
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            current = version(*args, **kwargs) if version is not None else None
+            etag = last_modified = None
+            if current is not None:
+                tag, mtime = current
+                if salt is not None:
+                    tag, mtime = f'{salt[0]}:{tag}', max(salt[1], mtime)
+                # 同一路径的不同查询参数（搜索词、页码）是不同的资源
+                key = resource_key(query_args)
+                etag = hashlib.blake2b(f'{tag}:{key}'.encode('utf-8'), digest_size=12).hexdigest()
+                last_modified = datetime.fromtimestamp(mtime / 1e9, timezone.utc)
+                if request.method in ('GET', 'HEAD') and not is_resource_modified(
+                        request.environ, etag=etag, last_modified=last_modified):
+                    response = make_response('', 304)
+                    _set_headers(response, cache_control, etag, last_modified)
+                    return response
+                if page_cache is not None:
+                    page = page_cache.get(key, etag)
+                    if page is not None:
+                        return _page_response(page, cache_control, last_modified)
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            if page_cache is not None and etag is not None and not response.is_streamed:
+                page = page_cache.put(key, etag, response.content_type, response.get_data())
+                return _page_response(page, cache_control, last_modified)
+            _set_headers(response, cache_control, etag, last_modified)
+            return response
+        return wrapper
+    return decorator
+
+
+def _set_headers(response: Response, cache_control: str, etag: Optional[str], last_modified: Optional[datetime],
+                 weak: bool = False) -> None:
+    response.headers['Cache-Control'] = cache_control
+    if etag is not None:
+        response.set_etag(etag, weak=weak)
+        response.last_modified = last_modified
@@ -0,0 +1,134 @@
+"""用tests/fixtures中的页面模拟DDTKorea站点，供爬虫测试和基准测试使用"""
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit, parse_qs
+
+FIXTURES = Path(__file__).parent / 'fixtures'
+
+LIST_ITEM = '''<div class="novel-item">
+    <div class="novel-cover"><img src="/covers/{id}.jpg" alt="소설 {id}"></div>
+    <a class="novel-title" href="/novel/{id}">소설 {id}</a>
+    <span class="novel-author">작가 {id}</span>
+    <p class="novel-desc">{id}번 소설 소개</p>
+</div>'''
+
+
+def _fixture(name: str) -> str:
+    with open(FIXTURES / name, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+class FakeDDTKoreaHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # 响应头和正文分两次写入，关闭Nagle算法以免长连接上每个请求多等一个延迟确认
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        site = self.server.site
+        with site.lock:
+            site.hits[self.path] = site.hits.get(self.path, 0) + 1
+            failing = self.path in site.failing
+            site.failing.discard(self.path)
+        if site.delay:
+            threading.Event().wait(site.delay)
+        body = None if failing else site.page(self.path)
+        data = (body or '').encode('utf-8')
+        self.send_response(200 if body else 404)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeDDTKorea:
+    """模拟站点：书籍ID从101开始，第n本书的章节ID为<书籍ID>*1000+1起
+
+    书籍详情页和章节页由fixtures中的页面替换书名、章节名得到，章节正文重复若干段以接近真实大小。
+    """
+
+    def __init__(self, books: int = 3, chapters: int = 5, page_size: int = 10, paragraphs: int = 20,
+                 delay: float = 0.0):
+        """初始化模拟站点
+
+        Args:
+            books (int): 书籍数量
+            chapters (int): 每本书的章节数，可在运行中修改以模拟更新
+            page_size (int): 书籍列表每页的书籍数
+            paragraphs (int): 章节正文重复的段落组数
+            delay (float): 每个请求的延迟（秒）
+        """
+        self.books = books
+        self.chapters = chapters
+        self.page_size = page_size
+        self.delay = delay
+        self.hits = {}
+        # 下一次请求返回404的路径
+        self.failing = set()
+        self.lock = threading.Lock()
+
+        self._book_html = _fixture('ddtkorea_book.html')
+        self._chapters_html = _fixture('ddtkorea_chapters.html')
+        chapter_html = _fixture('ddtkorea_chapter.html')
+        content = re.search(r'<div class="chapter-content">(.*?)</div>', chapter_html, re.S).group(1)
+        self._chapter_html = chapter_html.replace(content, content * paragraphs)
+        self._server = None
+
+    def book_ids(self):
+        return list(range(101, 101 + self.books))
+
+    def chapter_ids(self, book_id: int):
+        return [book_id * 1000 + i for i in range(1, self.chapters + 1)]
+
+    def page(self, path: str):
+        """生成页面HTML，不存在的页面返回None"""
+        url = urlsplit(path)
+        if url.path == '/novel/':
+            page = int(parse_qs(url.query).get('page', ['1'])[0])
+            ids = self.book_ids()[(page - 1) * self.page_size:page * self.page_size]
+            items = '\n'.join(LIST_ITEM.format(id=book_id) for book_id in ids)
+            return f'<html><body><div class="novel-list">{items}</div></body></html>'
+
+        match = re.fullmatch(r'/novel/(\d+)(/chapters)?', url.path)
+        if match and int(match.group(1)) in self.book_ids():
+            book_id = int(match.group(1))
+            if not match.group(2):
+                return self._book_html.replace('검의 노래', f'소설 {book_id}').replace('101', str(book_id))
+            items = ''.join(f'<li class="chapter-item"><a href="/chapter/{chapter_id}">제{chapter_id % 1000}화</a></li>'
+                            for chapter_id in self.chapter_ids(book_id))
+            return re.sub(r'<ul class="chapter-list">.*?</ul>', f'<ul class="chapter-list">{items}</ul>',
+                          self._chapters_html, count=1, flags=re.S)
+
+        match = re.fullmatch(r'/chapter/(\d+)', url.path)
+        if match:
+            chapter_id = int(match.group(1))
+            if chapter_id // 1000 in self.book_ids() and 1 <= chapter_id % 1000 <= self.chapters:
+                return self._chapter_html.replace('제1화 귀환', f'제{chapter_id % 1000}화').replace(
+                    '산을 내려온 지 십 년.', f'{chapter_id}번 회차. 산을 내려온 지 십 년.')
+        return None
+
+    def start(self) -> str:
+        """在后台线程启动站点
+
+        Returns:
+            str: 站点地址
+        """
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), FakeDDTKoreaHandler)
+        self._server.daemon_threads = True
+        self._server.site = self
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f'http://127.0.0.1:{self._server.server_address[1]}'
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> str:
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
@@ -0,0 +1,117 @@
+import unittest
+import json
+import tempfile
+from pathlib import Path
+from unittest.mock import MagicMock
+from datasources.cached import LRUCache, CachedDataSource
+from datasources.local_file import LocalFileDataSource
+
+class TestLRUCache(unittest.TestCase):
+    def test_byte_eviction(self):
+        cache = LRUCache(max_bytes=10, max_item_bytes=10, sizeof=len)
+        cache.put('a', 'xxxx')
+        cache.put('b', 'xxxx')
+        self.assertEqual(cache.get('a'), 'xxxx')
+
+        # 超出容量时淘汰最久未用的b
+        cache.put('c', 'xxxx')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 'xxxx')
+        self.assertEqual(cache.current_bytes, 8)
+        self.assertEqual(cache.evictions, 1)
+
+    def test_oversized_item(self):
+        cache = LRUCache(max_bytes=100, max_item_bytes=5, sizeof=len)
+        self.assertFalse(cache.put('a', 'x' * 6))
+        self.assertIsNone(cache.get('a'))
+
+    def test_replace_and_invalidate(self):
+        cache = LRUCache(max_bytes=100, sizeof=len)
+        cache.put(('1', 1), 'xx')
+        cache.put(('1', 1), 'xxx')
+        cache.put(('2', 1), 'xxxx')
+        self.assertEqual(cache.current_bytes, 7)
+
+        self.assertEqual(cache.invalidate(lambda key: key[0] == '1'), 1)
+        self.assertEqual(cache.current_bytes, 4)
+        self.assertEqual(cache.invalidate(), 1)
+        self.assertEqual(len(cache), 0)
+
+class TestCachedDataSource(unittest.TestCase):
+    def setUp(self):
+        self.source = MagicMock()
+        self.source.get_chapter_content.return_value = '章节内容'
+        self.data_source = CachedDataSource(self.source, max_bytes=1024 * 1024)
+
+    def test_content_cached(self):
+        self.assertEqual(self.data_source.get_chapter_content(1, 1), '章节内容')
+        self.assertEqual(self.data_source.get_chapter_content('1', '1'), '章节内容')
+        self.assertEqual(self.source.get_chapter_content.call_count, 1)
+
+        stats = self.data_source.content_cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_missing_content_not_cached(self):
+        self.source.get_chapter_content.return_value = None
+        self.assertIsNone(self.data_source.get_chapter_content(1, 1))
+        self.assertIsNone(self.data_source.get_chapter_content(1, 1))
+        self.assertEqual(self.source.get_chapter_content.call_count, 2)
+
+    def test_iter_content(self):
+        self.source.iter_chapter_content.side_effect = lambda book_id, chapter_id, chunk_size: iter(
+            ['第一块', '第二块'] if chapter_id == 2 else ['章节内容'])
+
+        # 只有一块的章节放入缓存，之后对缓存切块
+        self.assertEqual(list(self.data_source.iter_chapter_content(1, 1)), ['章节内容'])
+        self.assertEqual(list(self.data_source.iter_chapter_content(1, 1, chunk_size=2)), ['章节', '内容'])
+        self.assertEqual(self.source.iter_chapter_content.call_count, 1)
+
+        # 更大的章节不缓存
+        self.assertEqual(list(self.data_source.iter_chapter_content(1, 2)), ['第一块', '第二块'])
+        self.assertIsNone(self.data_source.content_cache.get((1, 2)))
+
+        self.source.iter_chapter_content.side_effect = None
+        self.source.iter_chapter_content.return_value = None
+        self.assertIsNone(self.data_source.iter_chapter_content(1, 3))
+
+    def test_invalidate(self):
+        self.data_source.get_chapter_content(1, 1)
+        self.data_source.get_chapter_content(1, 2)
+        self.data_source.get_chapter_content(2, 1)
+        self.assertEqual(self.data_source.invalidate(1, 2), 1)
+        self.assertEqual(self.data_source.invalidate(1), 1)
+        self.assertEqual(len(self.data_source.content_cache), 1)
+
+    def test_edited_chapter_reloaded(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            books_dir = Path(temp_dir) / 'books'
+            books_file = Path(temp_dir) / 'books.json'
+            books_file.write_text(json.dumps({'books': [{'id': 1, 'title': '测试书籍', 'author': '测试作者'}]}),
+                                  encoding='utf-8')
+            (books_dir / '1').mkdir(parents=True)
+            (books_dir / '1' / 'chapters.json').write_text(json.dumps([{'id': 1, 'title': '第一章'}]),
+                                                           encoding='utf-8')
+            chapter_file = books_dir / '1' / '1.txt'
+            chapter_file.write_text('旧内容', encoding='utf-8')
+            data_source = CachedDataSource(LocalFileDataSource(books_dir=str(books_dir),
+                                                               books_info_file=str(books_file)))
+            self.assertEqual(data_source.get_chapter_content(1, 1), '旧内容')
+            self.assertEqual(list(data_source.iter_chapter_content(1, 1)), ['旧内容'])
+
+            # 修改章节文件后，不经过invalidate也读到新内容
+            chapter_file.write_text('修改后的新内容', encoding='utf-8')
+            self.assertEqual(data_source.get_chapter_content(1, 1), '修改后的新内容')
+            chapter_file.write_text('再次修改的内容！', encoding='utf-8')
+            self.assertEqual(list(data_source.iter_chapter_content(1, 1)), ['再次修改的内容！'])
+            # 版本不一致的条目计为未命中，并被新内容替换
+            stats = data_source.content_cache.stats()
+            self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (1, 3, 1))
+
+    def test_delegation(self):
+        self.source.get_book_by_id.return_value = {'id': 1}
+        self.source.cache_dir = 'data/cache'
+        self.assertEqual(self.data_source.get_book_by_id(1), {'id': 1})
+        self.assertEqual(self.data_source.cache_dir, 'data/cache')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+import unittest
+import json
+import shutil
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+from datasources.compression import ChapterStore, CompressionError, DICT_FILE, zstandard, main
+from datasources.ddtkorea import DDTKoreaDataSource
+from datasources.local_file import LocalFileDataSource
+
+PHRASES = ['韩立心中一动，', '只见那名修士冷哼一声，', '筑基期的修为', '祭出一件法宝，', '神识一扫，',
+           '南宫婉微微一笑。', '数十块灵石', '顿时化作一道青光', '向远处飞去。', '한국어 문장도 섞여 있다. ']
+
+def make_chapter(seed, sentences=20):
+    return '\n\n'.join(''.join(PHRASES[(seed * 7 + i * j) % len(PHRASES)] for j in range(4))
+                       for i in range(sentences))
+
+class TestChapterStore(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.book_dir = Path(self.temp_dir) / '1'
+        self.texts = [make_chapter(i) for i in range(20)]
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def check_round_trip(self, algorithm):
+        store = ChapterStore(compress=True, algorithm=algorithm)
+        plain_size = len(store.encode(self.book_dir, self.texts[0]))
+
+        self.assertTrue(store.train(self.book_dir, self.texts))
+        # 已有字典时不会覆盖
+        self.assertFalse(store.train(self.book_dir, self.texts[:1]))
+
+        for chapter_id, text in enumerate(self.texts):
+            path = store.write(self.book_dir, chapter_id, text)
+            self.assertTrue(path.name.endswith('.txt.z'))
+            self.assertEqual(store.read(self.book_dir, chapter_id), text)
+
+        # 使用字典后短章节压缩得更小
+        self.assertLess(len(store.encode(self.book_dir, self.texts[0])), plain_size)
+
+    def test_zlib(self):
+        self.check_round_trip('zlib')
+
+    @unittest.skipIf(zstandard is None, '没有安装zstandard')
+    def test_zstd(self):
+        self.check_round_trip('zstd')
+
+    def test_reads_plain_and_compressed(self):
+        store = ChapterStore(compress=True, algorithm='zlib')
+        ChapterStore().write(self.book_dir, 1, '普通文本')
+        store.write(self.book_dir, 2, '压缩文本')
+
+        for reader in (store, ChapterStore()):
+            self.assertEqual(reader.read(self.book_dir, 1), '普通文本')
+            self.assertEqual(reader.read(self.book_dir, 2), '压缩文本')
+            self.assertIsNone(reader.read(self.book_dir, 3))
+
+    def test_iter_read(self):
+        text = self.texts[0] * 5
+        algorithms = ['zlib'] + (['zstd'] if zstandard is not None else [])
+        ChapterStore().write(self.book_dir, 1, text)
+        for chapter_id, algorithm in enumerate(algorithms, 2):
+            store = ChapterStore(compress=True, algorithm=algorithm)
+            if chapter_id == 2:
+                store.train(self.book_dir, self.texts)
+            store.write(self.book_dir, chapter_id, text)
+
+        # 块大小不是字符长度的整数倍，多字节字符会跨块
+        for chapter_id in range(1, len(algorithms) + 2):
+            chunks = list(ChapterStore().iter_read(self.book_dir, chapter_id, chunk_size=7))
+            self.assertGreater(len(chunks), 100)
+            self.assertEqual(''.join(chunks), text)
+        self.assertIsNone(ChapterStore().iter_read(self.book_dir, 99))
+
+        (self.book_dir / DICT_FILE).unlink()
+        self.assertIsNone(ChapterStore().iter_read(self.book_dir, 2))
+
+    def test_missing_dictionary(self):
+        store = ChapterStore(compress=True, algorithm='zlib')
+        store.train(self.book_dir, self.texts)
+        store.write(self.book_dir, 1, self.texts[0])
+        (self.book_dir / DICT_FILE).unlink()
+
+        self.assertIsNone(ChapterStore().read(self.book_dir, 1))
+        with self.assertRaises(CompressionError):
+            ChapterStore().read_file(self.book_dir / '1.txt.z')
+
+    def test_maybe_train(self):
+        store = ChapterStore(compress=True, algorithm='zlib', train_after=5)
+        for chapter_id in range(4):
+            store.write(self.book_dir, chapter_id, self.texts[chapter_id])
+            self.assertFalse(store.maybe_train(self.book_dir))
+        store.write(self.book_dir, 4, self.texts[4])
+        self.assertTrue(store.maybe_train(self.book_dir))
+
+        # 训练字典前写入的章节仍可读取
+        store.write(self.book_dir, 5, self.texts[5])
+        for chapter_id in range(6):
+            self.assertEqual(store.read(self.book_dir, chapter_id), self.texts[chapter_id])
+
+class TestCompressedLibrary(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.books_dir = Path(self.temp_dir) / 'books'
+        self.books_file = Path(self.temp_dir) / 'books.json'
+        with open(self.books_file, 'w', encoding='utf-8') as f:
+            json.dump({'books': [{'id': 1, 'title': '凡人修仙传', 'author': '忘语'}]}, f, ensure_ascii=False)
+        book_dir = self.books_dir / '1'
+        book_dir.mkdir(parents=True)
+        self.texts = {i: make_chapter(i) for i in range(1, 31)}
+        with open(book_dir / 'chapters.json', 'w', encoding='utf-8') as f:
+            json.dump([{'id': i, 'title': f'第{i}章'} for i in self.texts], f, ensure_ascii=False)
+        for chapter_id, text in self.texts.items():
+            with open(book_dir / f'{chapter_id}.txt', 'w', encoding='utf-8') as f:
+                f.write(text)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_compress_library(self):
+        with patch('builtins.print'):
+            main(['--books-dir', str(self.books_dir), '--algorithm', 'zlib'])
+
+        book_dir = self.books_dir / '1'
+        self.assertEqual(list(book_dir.glob('*.txt')), [])
+        stored = sum(path.stat().st_size for path in book_dir.glob('*.txt.z'))
+        raw = sum(len(text.encode('utf-8')) for text in self.texts.values())
+        self.assertGreater(raw / stored, 3)
+
+        data_source = LocalFileDataSource(books_dir=str(self.books_dir), books_info_file=str(self.books_file),
+                                          chapter_store=ChapterStore(compress=True))
+        for chapter_id, text in self.texts.items():
+            self.assertEqual(data_source.get_chapter_content(1, chapter_id), text)
+
+        # 默认的读取方式也能透明解压
+        data_source = LocalFileDataSource(books_dir=str(self.books_dir), books_info_file=str(self.books_file))
+        self.assertEqual(data_source.get_chapter_content(1, 1), self.texts[1])
+
+    def test_ddtkorea_compressed_cache(self):
+        cache_dir = Path(self.temp_dir) / 'cache'
+        data_source = DDTKoreaDataSource(cache_dir=str(cache_dir), prefetch_workers=0, refresh_workers=0,
+                                         chapter_store=ChapterStore(compress=True, algorithm='zlib',
+                                                                    train_after=3))
+        for chapter_id in range(1, 5):
+            data_source._store('chapter', self.texts[chapter_id], 1, chapter_id)
+
+        self.assertTrue((data_source._book_dir(1) / DICT_FILE).exists())
+        self.assertTrue((data_source._book_dir(1) / '4.txt.z').exists())
+        for chapter_id in range(1, 5):
+            self.assertEqual(data_source.get_chapter_content(1, chapter_id), self.texts[chapter_id])
+
+if __name__ == '__main__':
+    unittest.main()
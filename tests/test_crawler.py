@@ -0,0 +1,86 @@
+import unittest
+import json
+import shutil
+import tempfile
+from pathlib import Path
+from datasources.crawler import Crawler
+from datasources.ddtkorea import DDTKoreaDataSource
+from datasources.http_client import HttpClient
+from datasources.local_file import LocalFileDataSource
+from fake_ddtkorea import FakeDDTKorea
+
+class TestCrawler(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.site = FakeDDTKorea(books=3, chapters=5, page_size=2)
+        self.base_url = self.site.start()
+
+    def tearDown(self):
+        self.site.stop()
+        shutil.rmtree(self.temp_dir)
+
+    def make_crawler(self):
+        source = DDTKoreaDataSource(self.base_url, cache_dir=str(self.temp_dir / 'cache'),
+                                    http_client=HttpClient(max_retries=0), prefetch_workers=0, refresh_workers=0)
+        return Crawler(source, books_dir=str(self.temp_dir / 'books'), books_file=str(self.temp_dir / 'books.json'),
+                       state_file=str(self.temp_dir / 'state.json'), workers=4, log=lambda message: None)
+
+    def chapter_hits(self):
+        return sum(count for path, count in self.site.hits.items() if path.startswith('/chapter/'))
+
+    def test_mirror(self):
+        crawler = self.make_crawler()
+        self.assertEqual(crawler.discover(), [101, 102, 103])
+        stats = crawler.run([101, 102, 103])
+        self.assertEqual((stats.books_done, stats.chapters_done, stats.failures), (3, 15, 0))
+        self.assertGreater(stats.bytes, 0)
+
+        # 镜像可以直接由本地文件数据源读取
+        local = LocalFileDataSource(books_dir=str(self.temp_dir / 'books'),
+                                    books_info_file=str(self.temp_dir / 'books.json'))
+        self.assertEqual([book['id'] for book in local.get_books()], [101, 102, 103])
+        self.assertEqual(local.get_book_by_id(102)['title'], '소설 102')
+        chapters = local.get_chapters(103)
+        self.assertEqual([chapter['id'] for chapter in chapters], self.site.chapter_ids(103))
+        self.assertIn('103002번 회차', local.get_chapter_content(103, 103002))
+
+    def test_discover_full_pages(self):
+        # 每页超过10本时也要收集列表页上的全部书籍
+        self.site.stop()
+        self.site = FakeDDTKorea(books=25, page_size=20)
+        self.base_url = self.site.start()
+        self.assertEqual(self.make_crawler().discover(), list(range(101, 126)))
+
+    def test_resume_and_refresh(self):
+        # 第一次抓取时有一章失败，这本书不算完成
+        self.site.failing.add('/chapter/101003')
+        stats = self.make_crawler().run([101, 102])
+        self.assertEqual((stats.chapters_done, stats.failures), (9, 1))
+        state = json.loads((self.temp_dir / 'state.json').read_text(encoding='utf-8'))
+        self.assertFalse(state['books']['101']['complete'])
+        self.assertTrue(state['books']['102']['complete'])
+
+        # 再次运行只补抓缺失的章节，已完成的书籍直接跳过
+        hits = self.chapter_hits()
+        stats = self.make_crawler().run([101, 102])
+        self.assertEqual((stats.chapters_done, stats.chapters_skipped), (1, 4))
+        self.assertEqual(self.chapter_hits(), hits + 1)
+        self.assertNotIn('/novel/102', [path for path, count in self.site.hits.items() if count > 1])
+
+        # 增量刷新只下载新增的章节
+        self.site.chapters = 7
+        hits = self.chapter_hits()
+        stats = self.make_crawler().run([101, 102], refresh=True)
+        self.assertEqual(stats.chapters_done, 4)
+        self.assertEqual(self.chapter_hits(), hits + 4)
+        local = LocalFileDataSource(books_dir=str(self.temp_dir / 'books'),
+                                    books_info_file=str(self.temp_dir / 'books.json'))
+        self.assertEqual(len(local.get_chapters(101)), 7)
+
+    def test_missing_book(self):
+        stats = self.make_crawler().run([999])
+        self.assertEqual((stats.books_done, stats.failures), (1, 1))
+        self.assertEqual(json.loads((self.temp_dir / 'books.json').read_text(encoding='utf-8')), {'books': []})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,20 +5,24 @@ import os
 from pathlib import Path
 import tempfile
 import shutil
-from datasources.ddtkorea import DDTKoreaDataSource
+import threading
+import time
+from collections import OrderedDict
+from datasources.ddtkorea import DDTKoreaDataSource, record_refresh
+from datasources.metrics import CACHE_LOOKUPS, PARSE_SECONDS, UPSTREAM_ERRORS, UPSTREAM_SECONDS
 
 class TestDDTKoreaDataSource(unittest.TestCase):
     def setUp(self):
         # 创建临时目录用于测试
         self.temp_dir = tempfile.mkdtemp()
         self.cache_dir = Path(self.temp_dir) / 'cache'
-        self.data_source = DDTKoreaDataSource(cache_dir=str(self.cache_dir))
+        self.data_source = DDTKoreaDataSource(cache_dir=str(self.cache_dir), prefetch_workers=0)
         
     def tearDown(self):
         # 清理临时目录
         shutil.rmtree(self.temp_dir)
         
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_get_html(self, mock_get):
         # 模拟成功的请求
         mock_response = MagicMock()
@@ -53,7 +57,7 @@ class TestDDTKoreaDataSource(unittest.TestCase):
         cached_data = self.data_source._get_cached_data(cache_file)
         self.assertIsNone(cached_data)
         
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_get_books(self, mock_get):
         # 模拟首页HTML
         mock_response = MagicMock()
@@ -76,7 +80,7 @@ class TestDDTKoreaDataSource(unittest.TestCase):
         self.assertEqual(books[0]['title'], '테스트 소설')
         self.assertEqual(books[0]['author'], '작가 이름')
         
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_get_chapters(self, mock_get):
         # 模拟书籍详情页HTML
         book_response = MagicMock()
@@ -107,8 +111,12 @@ class TestDDTKoreaDataSource(unittest.TestCase):
         self.assertTrue(len(chapters) > 0)
         self.assertEqual(chapters[0]['id'], 456)
         self.assertEqual(chapters[0]['title'], '제1장')
+
+        # 按范围读取使用缓存的目录，不再请求上游
+        self.assertEqual(self.data_source.get_chapters_page(123, 1, 10), (2, [chapters[1]]))
+        self.assertEqual(mock_get.call_count, 2)
         
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_get_chapter_content(self, mock_get):
         # 模拟章节内容页HTML
         mock_response = MagicMock()
@@ -125,7 +133,7 @@ class TestDDTKoreaDataSource(unittest.TestCase):
         self.assertIsNotNone(content)
         self.assertTrue('테스트 소설의 내용입니다' in content)
         
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_search_books(self, mock_get):
         # 模拟搜索结果页HTML
         mock_response = MagicMock()
@@ -147,6 +155,164 @@ class TestDDTKoreaDataSource(unittest.TestCase):
         self.assertEqual(results[0]['id'], 123)
         self.assertEqual(results[0]['title'], '검색된 소설')
         
+    @patch('requests.Session.get')
+    def test_prefetch(self, mock_get):
+        def fake_get(url, **kwargs):
+            response = MagicMock()
+            if url.endswith('/chapters'):
+                response.text = '<div class="chapter-list">' + ''.join(
+                    f'<div class="chapter-item"><a href="/chapter/{i}">제{i}장</a></div>'
+                    for i in range(1, 11)) + '</div>'
+            elif '/chapter/' in url:
+                response.text = f'<div class="chapter-content">{url} 내용</div>'
+            else:
+                response.text = '<div class="novel-title">테스트 소설</div>'
+            return response
+        mock_get.side_effect = fake_get
+
+        data_source = DDTKoreaDataSource(cache_dir=str(self.cache_dir), prefetch_workers=2,
+                                         prefetch_first=3, read_ahead=2)
+        try:
+            # 打开书籍时后台预取前3章
+            chapters = data_source.get_chapters(123)
+            self.assertEqual(len(chapters), 10)
+            data_source.prefetcher.join()
+            cached = sorted(p.stem for p in data_source._book_dir(123).glob('*.txt'))
+            self.assertEqual(cached, ['1', '2', '3'])
+
+            # 阅读第3章时预取第4、5章
+            self.assertIn('내용', data_source.get_chapter_content(123, 3))
+            data_source.prefetcher.join()
+            cached = sorted(int(p.stem) for p in data_source._book_dir(123).glob('*.txt'))
+            self.assertEqual(cached, [1, 2, 3, 4, 5])
+
+            # 已缓存的章节不会重复抓取
+            calls = mock_get.call_count
+            data_source.get_chapter_content(123, 2)
+            data_source.prefetcher.join()
+            self.assertEqual(mock_get.call_count, calls)
+        finally:
+            data_source.prefetcher.shutdown()
+        
+    @patch('requests.Session.get')
+    def test_concurrent_misses_fetch_once(self, mock_get):
+        def slow_get(url, **kwargs):
+            time.sleep(0.1)
+            response = MagicMock()
+            response.text = '<div class="chapter-content">동시 요청 내용</div>'
+            return response
+        mock_get.side_effect = slow_get
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.data_source.get_chapter_content(1, 1)))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, ['동시 요청 내용'] * 8)
+        self.assertEqual(mock_get.call_count, 1)
+
+        # 缓存文件通过重命名写入，不会留下临时文件
+        self.assertEqual([p.name for p in self.data_source._book_dir(1).iterdir()], ['1.txt'])
+        
+    def make_stale(self, cache_file, age):
+        old_time = time.time() - age
+        os.utime(cache_file, (old_time, old_time))
+
+    @patch('requests.Session.get')
+    def test_stale_while_revalidate(self, mock_get):
+        cache_file = self.data_source._cache_file('chapter', 1, 1)
+        self.data_source._cache_data(cache_file, '오래된 내용')
+        self.make_stale(cache_file, 90000)
+
+        mock_response = MagicMock()
+        mock_response.text = '<div class="chapter-content">새 내용</div>'
+        mock_get.return_value = mock_response
+
+        # 过期的缓存立即返回，同时在后台刷新
+        self.assertEqual(self.data_source.get_chapter_content(1, 1), '오래된 내용')
+        self.data_source.refresher.join()
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(self.data_source.get_chapter_content(1, 1), '새 내용')
+
+    @patch('requests.Session.get')
+    def test_stale_beyond_limit_blocks(self, mock_get):
+        cache_file = self.data_source._cache_file('chapter', 1, 1)
+        self.data_source._cache_data(cache_file, '오래된 내용')
+        self.make_stale(cache_file, self.data_source.max_age + self.data_source.max_stale + 60)
+
+        mock_response = MagicMock()
+        mock_response.text = '<div class="chapter-content">새 내용</div>'
+        mock_get.return_value = mock_response
+
+        self.assertEqual(self.data_source.get_chapter_content(1, 1), '새 내용')
+
+    def test_max_age(self):
+        data_source = DDTKoreaDataSource(cache_dir=str(self.cache_dir), prefetch_workers=0, max_age=60)
+        cache_file = data_source._cache_file('chapter', 1, 1)
+        data_source._cache_data(cache_file, '내용')
+        self.assertEqual(data_source._get_cached_data(cache_file), '내용')
+        self.make_stale(cache_file, 120)
+        self.assertIsNone(data_source._get_cached_data(cache_file))
+        self.assertFalse(data_source._is_cached(cache_file))
+
+    def test_refresh_attempts_bounded(self):
+        attempts = OrderedDict()
+        with patch('datasources.ddtkorea.MAX_REFRESH_ATTEMPTS', 3):
+            for i in range(5):
+                record_refresh(attempts, ('chapter', 1, i), 100.0 + i, 60)
+            # 超过上限时只删除最旧的记录，其余key仍然限流
+            self.assertEqual(list(attempts), [('chapter', 1, 2), ('chapter', 1, 3), ('chapter', 1, 4)])
+            # 超过刷新间隔的记录被删除
+            record_refresh(attempts, ('chapter', 1, 5), 163.5, 60)
+            self.assertEqual(list(attempts), [('chapter', 1, 4), ('chapter', 1, 5)])
+
+    @patch('requests.Session.get')
+    def test_stale_if_upstream_down(self, mock_get):
+        mock_get.side_effect = Exception('网络错误')
+        cache_file = self.data_source._cache_file('chapter', 1, 1)
+        self.data_source._cache_data(cache_file, '오래된 내용')
+        self.make_stale(cache_file, self.data_source.max_age + self.data_source.max_stale + 60)
+
+        # 即使超过容忍时间，网站不可用时仍返回旧数据
+        self.assertEqual(self.data_source.get_chapter_content(1, 1), '오래된 내용')
+
+        # 后台刷新失败后，短时间内不会再次刷新
+        self.make_stale(cache_file, 90000)
+        self.data_source.get_chapter_content(1, 1)
+        self.data_source.refresher.join()
+        calls = mock_get.call_count
+        self.data_source.get_chapter_content(1, 1)
+        self.data_source.refresher.join()
+        self.assertEqual(mock_get.call_count, calls)
+        
+    @patch('requests.Session.get')
+    def test_metrics(self, mock_get):
+        mock_response = MagicMock()
+        mock_response.text = '<div class="chapter-content">새 내용</div>'
+        mock_get.return_value = mock_response
+        lookups = {result: CACHE_LOOKUPS.get('chapter', result) for result in ('hit', 'stale', 'miss')}
+        fetches = UPSTREAM_SECONDS.count('chapter')
+        parses = PARSE_SECONDS.count('chapter')
+
+        # 第一次同步抓取，第二次命中缓存，过期后先返回旧数据
+        self.data_source.get_chapter_content(1, 1)
+        self.data_source.get_chapter_content(1, 1)
+        self.make_stale(self.data_source._cache_file('chapter', 1, 1), 90000)
+        self.data_source.get_chapter_content(1, 1)
+        self.data_source.refresher.join()
+        self.assertEqual({result: CACHE_LOOKUPS.get('chapter', result) - count for result, count in lookups.items()},
+                         {'hit': 1, 'stale': 1, 'miss': 1})
+        self.assertEqual(UPSTREAM_SECONDS.count('chapter') - fetches, 2)
+        self.assertEqual(PARSE_SECONDS.count('chapter') - parses, 2)
+
+        errors = UPSTREAM_ERRORS.get('chapter', 'Exception')
+        mock_get.side_effect = Exception('网络错误')
+        self.data_source.get_chapter_content(1, 2)
+        self.assertEqual(UPSTREAM_ERRORS.get('chapter', 'Exception') - errors, 1)
+        
     def test_error_handling(self):
         # 测试无效的book_id
         chapters = self.data_source.get_chapters(999)
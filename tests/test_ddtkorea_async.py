@@ -0,0 +1,208 @@
+import asyncio
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from datasources.async_base import SyncDataSourceAdapter
+from datasources.ddtkorea_async import AsyncDDTKoreaDataSource
+
+BOOKS_HTML = '''<div class="novel-list">
+<div class="novel-item"><a class="novel-title" href="/novel/1">테스트 소설</a>
+<span class="novel-author">작가</span><p class="novel-desc">소설 소개</p></div>
+</div>'''
+
+BOOK_HTML = '<h1 class="novel-title">테스트 소설</h1><span class="novel-author">작가</span>'
+
+CHAPTERS_HTML = '<ul class="chapter-list">' + ''.join(
+    f'<li class="chapter-item"><a href="/chapter/{i}">제{i}화</a></li>' for i in range(1, 6)) + '</ul>'
+
+class StubHandler(BaseHTTPRequestHandler):
+    """本地模拟DDTKorea站点，记录每个路径的请求次数和最大并发数"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.hits[self.path] = server.hits.get(self.path, 0) + 1
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            time.sleep(server.delay)
+            if self.path == '/novel/':
+                body = BOOKS_HTML
+            elif self.path == '/novel/1':
+                body = BOOK_HTML
+            elif self.path == '/novel/1/chapters':
+                body = CHAPTERS_HTML
+            elif self.path.startswith('/chapter/'):
+                body = f'<div class="chapter-content">{self.path[9:]}화 내용</div>'
+            else:
+                body = ''
+            data = body.encode('utf-8')
+            self.send_response(200 if body else 404)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+class TestAsyncDDTKoreaDataSource(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        self.server.daemon_threads = True
+        self.server.lock = threading.Lock()
+        self.server.hits = {}
+        self.server.active = 0
+        self.server.max_active = 0
+        self.server.delay = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.cache_dir)
+
+    def make_source(self, **kwargs):
+        kwargs.setdefault('max_background', 0)
+        return AsyncDDTKoreaDataSource(base_url=self.base_url, cache_dir=self.cache_dir,
+                                       backoff_base=0.01, **kwargs)
+
+    async def test_fetch_and_cache(self):
+        source = self.make_source()
+        try:
+            books = await source.get_books()
+            self.assertEqual(books[0]['title'], '테스트 소설')
+
+            chapters = await source.get_chapters(1)
+            self.assertEqual([c['id'] for c in chapters], [1, 2, 3, 4, 5])
+
+            navigation = await source.get_chapter_navigation(1, 2)
+            self.assertEqual(navigation[0]['id'], 1)
+            self.assertEqual(navigation[2]['id'], 3)
+
+            self.assertEqual(await source.get_chapter_content(1, 2), '2화 내용')
+            self.assertEqual(await source.get_chapter_content(1, 2), '2화 내용')
+            self.assertEqual(self.server.hits['/chapter/2'], 1)
+
+            self.assertIsNone(await source.get_book_by_id(2))
+        finally:
+            await source.close()
+
+    async def test_toc_and_cache_reads(self):
+        source = self.make_source()
+        try:
+            self.assertEqual(len(await source.get_chapter_toc(1)), 5)
+
+            # 缓存文件在线程池中读取，不占用事件循环
+            threads = []
+            load = source.pages._load_cache_file
+            def record_load(cache_file):
+                threads.append(threading.get_ident())
+                return load(cache_file)
+            with patch.object(source.pages, '_load_cache_file', side_effect=record_load):
+                self.assertEqual(await source.get_chapter_content(1, 2), '2화 내용')
+                self.assertEqual(await source.get_chapter_content(1, 2), '2화 내용')
+                self.assertTrue(threads)
+                self.assertNotIn(threading.get_ident(), threads)
+
+                # 章节列表缓存文件未变化时直接使用内存中的目录，不再读取和解析
+                threads.clear()
+                toc = await source.get_chapter_toc(1)
+                self.assertEqual(toc.neighbors(3)[2]['id'], 4)
+                self.assertEqual(threads, [])
+            self.assertEqual(self.server.hits['/novel/1/chapters'], 1)
+        finally:
+            await source.close()
+
+    async def test_bounded_concurrency(self):
+        self.server.delay = 0.05
+        source = self.make_source(max_connections=4)
+        try:
+            contents = await asyncio.gather(*[source.get_chapter_content(1, i) for i in range(1, 41)])
+        finally:
+            await source.close()
+
+        self.assertEqual(contents, [f'{i}화 내용' for i in range(1, 41)])
+        self.assertLessEqual(self.server.max_active, 4)
+        self.assertGreater(self.server.max_active, 1)
+
+    async def test_concurrent_misses_fetch_once(self):
+        self.server.delay = 0.05
+        source = self.make_source()
+        try:
+            contents = await asyncio.gather(*[source.get_chapter_content(1, 3) for _ in range(20)])
+        finally:
+            await source.close()
+
+        self.assertEqual(set(contents), {'3화 내용'})
+        self.assertEqual(self.server.hits['/chapter/3'], 1)
+        self.assertEqual(source.shared, 19)
+
+    async def test_prefetch_first_chapters(self):
+        source = self.make_source(max_background=16, prefetch_first=2)
+        try:
+            await source.get_chapters(1)
+            await source.join()
+        finally:
+            await source.close()
+
+        self.assertEqual(self.server.hits.get('/chapter/1'), 1)
+        self.assertEqual(self.server.hits.get('/chapter/2'), 1)
+        self.assertNotIn('/chapter/3', self.server.hits)
+
+class TestSyncDataSourceAdapter(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        self.server.daemon_threads = True
+        self.server.lock = threading.Lock()
+        self.server.hits = {}
+        self.server.active = 0
+        self.server.max_active = 0
+        self.server.delay = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.cache_dir = tempfile.mkdtemp()
+        self.data_source = SyncDataSourceAdapter(AsyncDDTKoreaDataSource(
+            base_url=f'http://127.0.0.1:{self.server.server_address[1]}', cache_dir=self.cache_dir,
+            max_background=0))
+
+    def tearDown(self):
+        self.data_source.close()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.cache_dir)
+
+    def test_sync_calls(self):
+        book = self.data_source.get_book_by_id(1)
+        self.assertEqual(book['author'], '작가')
+        self.assertEqual(len(self.data_source.get_chapters(1)), 5)
+        self.assertEqual(self.data_source.get_chapter_content(1, 5), '5화 내용')
+
+        total, books = self.data_source.search_books_page('', 0, 20)
+        self.assertEqual(total, 1)
+
+    def test_shared_across_threads(self):
+        results = []
+
+        def worker(chapter_id):
+            results.append(self.data_source.get_chapter_content(1, chapter_id))
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(1, 6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(results), sorted(f'{i}화 내용' for i in range(1, 6)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from datasources.compression import DICT_FILE
+from datasources.ddtkorea import DDTKoreaDataSource
+from datasources.disk_cache import CacheIndex, INDEX_FILE, shard_path
+
+class TestCacheIndex(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.root = Path(self.temp_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write(self, index, name, size, atime):
+        path = self.root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b'x' * size)
+        index.record(path, size)
+        index._entries[name][1] = atime
+        return path
+
+    def test_shard_path(self):
+        self.assertEqual(shard_path(self.root, '123'), shard_path(self.root, '123'))
+        self.assertEqual(len(shard_path(self.root, '../../etc').relative_to(self.root).parts), 2)
+        self.assertNotEqual(shard_path(self.root, '1'), shard_path(self.root, '2'))
+
+    def test_sweep_by_idle_and_size(self):
+        index = CacheIndex(self.root, max_bytes=250, max_idle=100, interval=0)
+        now = time.time()
+        idle = self.write(index, 'a/idle.json', 10, now - 200)
+        old = self.write(index, 'a/old.json', 100, now - 50)
+        recent = self.write(index, 'b/recent.json', 100, now - 10)
+        newest = self.write(index, 'b/newest.json', 100, now)
+        self.assertEqual(index.total_bytes, 310)
+
+        # 先删除长期未访问的，总大小仍超出上限时再删除最久未访问的
+        self.assertEqual(index.sweep(now), 2)
+        self.assertFalse(idle.exists())
+        self.assertFalse(old.exists())
+        self.assertTrue(recent.exists() and newest.exists())
+        self.assertEqual(index.total_bytes, 200)
+        self.assertFalse((self.root / 'a').exists())
+
+        # 读取更新访问时间，容量不足时被读取过的条目保留
+        index.touch(recent)
+        self.write(index, 'c/new.json', 100, time.time())
+        index.sweep()
+        self.assertTrue(recent.exists())
+        self.assertFalse(newest.exists())
+
+    def test_index_persisted_and_scan(self):
+        # 旧版布局的文件和其他进程写入的文件由首次扫描纳入索引，压缩字典不计入
+        (self.root / '1').mkdir()
+        (self.root / '1' / '1.txt').write_text('旧章节', encoding='utf-8')
+        (self.root / '1' / DICT_FILE).write_bytes(b'dict')
+        (self.root / 'search_검.json').write_text('[]', encoding='utf-8')
+        old = time.time() - 1000
+        os.utime(self.root / '1' / '1.txt', (old, old))
+
+        index = CacheIndex(self.root, max_bytes=0, max_idle=500, interval=0)
+        self.assertEqual(index.sweep(), 1)
+        # 书籍目录中只剩字典时一起删除
+        self.assertFalse((self.root / '1').exists())
+        self.assertTrue((self.root / INDEX_FILE).exists())
+
+        reloaded = CacheIndex(self.root, max_bytes=0, max_idle=500, interval=0)
+        self.assertEqual(reloaded.stats()['entries'], 1)
+        self.assertEqual(reloaded.total_bytes, 2)
+        self.assertIn('search_검.json', reloaded._entries)
+
+class TestDDTKoreaCacheLayout(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_dir = Path(self.temp_dir)
+        self.data_source = DDTKoreaDataSource(cache_dir=self.temp_dir, prefetch_workers=0, refresh_workers=0,
+                                              janitor_interval=0)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_layout(self):
+        # 搜索关键词不直接用作文件名
+        search_file = self.data_source._cache_file('search', '../검색/어')
+        self.assertEqual(search_file.parent.parent.parent, self.cache_dir / 'search')
+        self.assertRegex(search_file.name, r'^[0-9a-f]{32}\.json$')
+
+        # 一本书的文件在同一个分层目录中
+        book_dir = self.data_source._book_dir(123)
+        self.assertEqual(book_dir.name, '123')
+        self.assertEqual(self.data_source._cache_file('book', 123).parent, book_dir)
+        self.assertEqual(self.data_source._cache_file('chapter', 123, 5).parent, book_dir)
+
+    def test_reads_and_writes_indexed(self):
+        self.data_source._store('search', [{'id': 1, 'title': '검'}], '검')
+        cache_file = self.data_source._cache_file('search', '검')
+        self.assertEqual(self.data_source.cache_index.total_bytes, cache_file.stat().st_size)
+
+        atime = self.data_source.cache_index._entries[cache_file.relative_to(self.cache_dir).as_posix()][1]
+        time.sleep(0.01)
+        self.assertEqual(self.data_source.search_books('검'), [{'id': 1, 'title': '검'}])
+        self.assertGreater(self.data_source.cache_index._entries[
+            cache_file.relative_to(self.cache_dir).as_posix()][1], atime)
+
+if __name__ == '__main__':
+    unittest.main()
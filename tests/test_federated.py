@@ -0,0 +1,101 @@
+import time
+import unittest
+from typing import List, Dict, Optional, Any
+from datasources.base import DataSource
+from datasources.federated import FederatedDataSource
+
+class MemoryDataSource(DataSource):
+    """内存中的简单数据源，可以模拟慢速和出错的上游"""
+
+    def __init__(self, books: List[Dict[str, Any]], chapters: Dict[int, Dict[int, str]], delay: float = 0):
+        self.books = books
+        self.chapters = chapters
+        self.delay = delay
+        self.fail = False
+        self.calls = []
+
+    def _record(self, name):
+        self.calls.append(name)
+        if self.fail:
+            raise IOError('上游不可用')
+
+    def get_books(self) -> List[Dict[str, Any]]:
+        self._record('get_books')
+        return self.books
+
+    def get_book_by_id(self, book_id: int) -> Optional[Dict[str, Any]]:
+        self._record('get_book_by_id')
+        return next((book for book in self.books if book['id'] == int(book_id)), None)
+
+    def get_chapters(self, book_id: int) -> List[Dict[str, Any]]:
+        self._record('get_chapters')
+        return [{'id': chapter_id, 'title': f'第{chapter_id}章'} for chapter_id in self.chapters.get(int(book_id), {})]
+
+    def get_chapter_content(self, book_id: int, chapter_id: int) -> Optional[str]:
+        self._record('get_chapter_content')
+        return self.chapters.get(int(book_id), {}).get(int(chapter_id))
+
+    def search_books(self, query: str) -> List[Dict[str, Any]]:
+        self._record('search_books')
+        time.sleep(self.delay)
+        return [book for book in self.books if query in book['title']]
+
+class TestFederatedDataSource(unittest.TestCase):
+    def setUp(self):
+        # 本地镜像有书1的前两章，上游有书1的全部章节和书2
+        self.local = MemoryDataSource([{'id': 1, 'title': '凡人修仙传'}], {1: {1: '本地第一章', 2: '本地第二章'}})
+        self.remote = MemoryDataSource([{'id': 1, 'title': '凡人修仙传'}, {'id': 2, 'title': '修仙归来'}],
+                                       {1: {1: '远程第一章', 2: '远程第二章', 3: '远程第三章'}, 2: {5: '书2正文'}})
+        self.data_source = FederatedDataSource([('local', self.local), ('remote', self.remote)],
+                                               deadline=0.2, deadlines={'local': None})
+
+    def tearDown(self):
+        self.data_source.shutdown(wait=False)
+
+    def test_routing_and_fallback(self):
+        self.assertEqual(self.data_source.get_chapter_content(1, 1), '本地第一章')
+        self.assertNotIn('get_chapter_content', self.remote.calls)
+
+        # 镜像缺少的章节回退到上游
+        self.assertEqual(self.data_source.get_chapter_content(1, 3), '远程第三章')
+        self.assertEqual(len(self.data_source.get_chapter_toc(1)), 2)
+
+        # 书2只在上游，记住所属数据源后直接访问上游
+        self.assertEqual(self.data_source.get_book_by_id(2)['title'], '修仙归来')
+        self.local.calls.clear()
+        self.assertEqual(''.join(self.data_source.iter_chapter_content(2, 5)), '书2正文')
+        self.assertEqual(self.data_source.get_chapters_page(2), (1, [{'id': 5, 'title': '第5章'}]))
+        self.assertEqual(self.local.calls, [])
+        self.assertIsNone(self.data_source.get_book_by_id(3))
+
+    def test_errors_fall_back(self):
+        self.local.fail = True
+        self.assertEqual(self.data_source.get_book_by_id(1)['title'], '凡人修仙传')
+        self.assertEqual(self.data_source.get_chapter_content(1, 1), '远程第一章')
+        self.assertEqual([book['id'] for book in self.data_source.search_books('修仙')], [1, 2])
+
+    def test_books_by_ids(self):
+        books = self.data_source.get_books_by_ids([2, 3, 1])
+        self.assertEqual([book['id'] for book in books], [2, 1])
+        # 上游只查询本地没有的书籍
+        self.assertEqual(self.remote.calls, ['get_book_by_id', 'get_book_by_id'])
+
+    def test_search_merge(self):
+        self.assertEqual([book['id'] for book in self.data_source.get_books()], [1, 2])
+        self.assertEqual(self.data_source.search_books_page('修仙', 1, 1), (2, [{'id': 2, 'title': '修仙归来'}]))
+
+    def test_search_deadline(self):
+        self.remote.delay = 1
+        start = time.monotonic()
+        results = self.data_source.search_books('修仙')
+        self.assertLess(time.monotonic() - start, 0.8)
+        # 超时的上游结果被丢弃，只返回本地结果
+        self.assertEqual([book['id'] for book in results], [1])
+
+        # 卡住的请求过多时不再排队
+        for _ in range(8):
+            self.data_source.search_books('修仙')
+        self.assertLess(self.remote.calls.count('search_books'), 9)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,247 @@
+import unittest
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from flask import Flask
+from datasources.local_file import LocalFileDataSource
+from http_cache import PageCache, brotli, conditional, directory_version
+
+class TestConditional(unittest.TestCase):
+    def setUp(self):
+        self.version = ('v1', 1_700_000_000 * 10 ** 9)
+        self.renders = 0
+
+        app = Flask(__name__)
+
+        @app.route('/page/<name>')
+        @conditional('public, max-age=60', lambda name: self.version, query_args=('page',))
+        def page(name):
+            self.renders += 1
+            return f'页面{name}'
+
+        @app.route('/missing')
+        @conditional('public, max-age=60', lambda: self.version)
+        def missing():
+            return '不存在', 404
+
+        @app.route('/plain')
+        @conditional('no-cache')
+        def plain():
+            return '没有验证器'
+
+        self.client = app.test_client()
+
+    def test_etag_revalidation(self):
+        response = self.client.get('/page/a')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Cache-Control'], 'public, max-age=60')
+        etag = response.headers['ETag']
+        self.assertIn('Last-Modified', response.headers)
+
+        # 数据未变化时返回304，不调用视图
+        response = self.client.get('/page/a', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['ETag'], etag)
+        self.assertEqual(response.data, b'')
+        self.assertEqual(self.renders, 1)
+
+        # 不同路径和查询参数的ETag不同
+        self.assertNotEqual(self.client.get('/page/b').headers['ETag'], etag)
+        self.assertNotEqual(self.client.get('/page/a?page=2').headers['ETag'], etag)
+        # 视图不读取的查询参数不影响ETag
+        self.assertEqual(self.client.get('/page/a?utm_source=x').headers['ETag'], etag)
+
+        # 数据变化后重新渲染
+        self.version = ('v2', self.version[1])
+        self.assertEqual(self.client.get('/page/a', headers={'If-None-Match': etag}).status_code, 200)
+
+    def test_if_modified_since(self):
+        last_modified = self.client.get('/page/a').headers['Last-Modified']
+        response = self.client.get('/page/a', headers={'If-Modified-Since': last_modified})
+        self.assertEqual(response.status_code, 304)
+
+        self.version = ('v2', self.version[1] + 10 ** 9)
+        response = self.client.get('/page/a', headers={'If-Modified-Since': last_modified})
+        self.assertEqual(response.status_code, 200)
+
+    def test_no_validators(self):
+        response = self.client.get('/missing')
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('ETag', response.headers)
+
+        response = self.client.get('/plain')
+        self.assertEqual(response.headers['Cache-Control'], 'no-cache')
+        self.assertNotIn('ETag', response.headers)
+
+class TestPageCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_dir = Path(self.temp_dir) / 'pages'
+        self.version = ('v1', 1_700_000_000 * 10 ** 9)
+        self.renders = 0
+        self.client = self.make_client(PageCache(str(self.cache_dir)))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def make_client(self, page_cache):
+        app = Flask(__name__)
+
+        @app.route('/chapter/<chapter_id>')
+        @conditional('public, max-age=600', lambda chapter_id: self.version, page_cache=page_cache,
+                     query_args=('font',))
+        def chapter(chapter_id):
+            self.renders += 1
+            return f'<p>第{chapter_id}章 版本{self.version[0]}</p>' * 100
+
+        return app.test_client()
+
+    def test_served_from_cache(self):
+        body = self.client.get('/chapter/1').data
+        self.assertEqual(self.client.get('/chapter/1').data, body)
+        self.assertEqual(self.renders, 1)
+
+        # 数据版本变化后重新渲染
+        self.version = ('v2', self.version[1])
+        self.assertIn('版本v2'.encode('utf-8'), self.client.get('/chapter/1').data)
+        self.assertEqual(self.renders, 2)
+
+    def test_compressed_variants(self):
+        plain = self.client.get('/chapter/1')
+        self.assertNotIn('Content-Encoding', plain.headers)
+        self.assertIn('Accept-Encoding', plain.headers['Vary'])
+
+        response = self.client.get('/chapter/1', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.data), plain.data)
+        self.assertTrue(response.headers['ETag'].startswith('W/'))
+
+        # 弱ETag同样可以得到304
+        response = self.client.get('/chapter/1', headers={'Accept-Encoding': 'gzip',
+                                                          'If-None-Match': response.headers['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+        if brotli is not None:
+            response = self.client.get('/chapter/1', headers={'Accept-Encoding': 'gzip, br'})
+            self.assertEqual(response.headers['Content-Encoding'], 'br')
+            self.assertEqual(brotli.decompress(response.data), plain.data)
+        self.assertEqual(self.renders, 1)
+
+    def test_disk_tier(self):
+        body = self.client.get('/chapter/1').data
+
+        # 新进程（空的内存缓存）直接读取磁盘上的页面
+        client = self.make_client(PageCache(str(self.cache_dir)))
+        self.assertEqual(client.get('/chapter/1').data, body)
+        self.assertEqual(self.renders, 1)
+
+        # 磁盘上的旧版本页面不会被返回
+        self.version = ('v2', self.version[1])
+        client = self.make_client(PageCache(str(self.cache_dir)))
+        self.assertIn('版本v2'.encode('utf-8'), client.get('/chapter/1').data)
+        self.assertEqual(self.renders, 2)
+
+    def test_ignored_query_args(self):
+        page_cache = PageCache(str(self.cache_dir))
+        client = self.make_client(page_cache)
+        body = client.get('/chapter/1').data
+        for i in range(5):
+            self.assertEqual(client.get(f'/chapter/1?nocache={i}').data, body)
+        self.assertEqual((self.renders, len(page_cache.memory)), (1, 1))
+
+        # 视图读取的参数是不同的资源
+        client.get('/chapter/1?font=large&nocache=1')
+        self.assertEqual(sorted(page_cache.memory._entries), ['/chapter/1?', '/chapter/1?font=large'])
+
+    def test_disk_bounded(self):
+        page_cache = PageCache(str(self.cache_dir), max_disk_bytes=10000, janitor_interval=0)
+        client = self.make_client(page_cache)
+        for chapter_id in range(10):
+            client.get(f'/chapter/{chapter_id}')
+        self.assertGreater(page_cache.disk_index.total_bytes, 10000)
+        self.assertGreater(page_cache.disk_index.sweep(), 0)
+        self.assertLessEqual(page_cache.disk_index.total_bytes, 10000)
+        self.assertEqual(sum(path.stat().st_size for path in self.cache_dir.rglob('*.page')),
+                         page_cache.disk_index.total_bytes)
+
+    def test_invalidate_disk_only(self):
+        self.client.get('/chapter/1')
+        self.client.get('/chapter/2')
+
+        # 新进程的内存中没有这些页面，仍按键删除磁盘上的文件
+        page_cache = PageCache(str(self.cache_dir))
+        self.assertEqual(page_cache.invalidate(lambda key: key.startswith('/chapter/1?')), 1)
+        self.assertEqual(len(list(self.cache_dir.rglob('*.page'))), 1)
+        self.assertEqual(page_cache.invalidate(), 1)
+        self.assertEqual(list(self.cache_dir.rglob('*.page')), [])
+
+    def test_selective_invalidate(self):
+        page_cache = PageCache(str(self.cache_dir))
+        client = self.make_client(page_cache)
+        client.get('/chapter/1')
+        client.get('/chapter/2')
+        self.assertEqual(page_cache.invalidate(lambda key: key.startswith('/chapter/1?')), 1)
+        self.assertEqual(len(page_cache.memory), 1)
+        self.assertEqual(len(list(self.cache_dir.rglob('*.page'))), 1)
+
+        # 被删除的页面重新渲染，其余页面仍从缓存返回
+        client.get('/chapter/1')
+        client.get('/chapter/2')
+        self.assertEqual(self.renders, 3)
+
+class TestDataVersions(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.books_dir = Path(self.temp_dir) / 'books'
+        self.books_file = Path(self.temp_dir) / 'books.json'
+        with open(self.books_file, 'w', encoding='utf-8') as f:
+            json.dump({'books': [{'id': 1, 'title': '测试书籍', 'author': '测试作者'}]}, f, ensure_ascii=False)
+        book_dir = self.books_dir / '1'
+        book_dir.mkdir(parents=True)
+        with open(book_dir / 'chapters.json', 'w', encoding='utf-8') as f:
+            json.dump([{'id': 1, 'title': '第一章'}, {'id': 2, 'title': '第二章'}], f, ensure_ascii=False)
+        for chapter_id in (1, 2):
+            with open(book_dir / f'{chapter_id}.txt', 'w', encoding='utf-8') as f:
+                f.write(f'第{chapter_id}章内容')
+        self.data_source = LocalFileDataSource(books_dir=str(self.books_dir), books_info_file=str(self.books_file),
+                                               catalog_check_interval=0)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def touch(self, path):
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    def test_local_versions(self):
+        catalog = self.data_source.get_version()
+        book = self.data_source.get_version(1)
+        chapter1 = self.data_source.get_version(1, 1)
+        chapter2 = self.data_source.get_version(1, 2)
+        self.assertEqual(len({catalog, book, chapter1, chapter2}), 4)
+        self.assertIsNone(self.data_source.get_version(2))
+        self.assertIsNone(self.data_source.get_version(1, 3))
+
+        # 修改章节只影响这一章的版本
+        self.touch(self.books_dir / '1' / '1.txt')
+        self.assertNotEqual(self.data_source.get_version(1, 1), chapter1)
+        self.assertEqual(self.data_source.get_version(1, 2), chapter2)
+        self.assertEqual(self.data_source.get_version(1), book)
+
+        # 修改books.json影响所有页面
+        self.touch(self.books_file)
+        self.assertNotEqual(self.data_source.get_version(), catalog)
+        self.assertNotEqual(self.data_source.get_version(1, 2), chapter2)
+
+    def test_directory_version(self):
+        version = directory_version(self.books_dir)
+        self.assertEqual(directory_version(self.books_dir), version)
+        self.touch(self.books_dir / '1' / '2.txt')
+        self.assertNotEqual(directory_version(self.books_dir), version)
+        self.assertIsNone(directory_version(Path(self.temp_dir) / 'missing'))
+
+if __name__ == '__main__':
+    unittest.main()
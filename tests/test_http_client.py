@@ -0,0 +1,123 @@
+import unittest
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from datasources.http_client import HttpClient, FetchError, RateLimiter
+
+class StubHandler(BaseHTTPRequestHandler):
+    """本地模拟站点：/flaky 前两次返回503，/missing 返回404，其余返回200"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.hits[self.path] = server.hits.get(self.path, 0) + 1
+            server.clients.add(self.client_address)
+            hits = server.hits[self.path]
+
+        if self.path == '/flaky' and hits <= 2:
+            status, body = 503, b'busy'
+        elif self.path == '/missing':
+            status, body = 404, b'missing'
+        else:
+            status, body = 200, '테스트 내용'.encode('utf-8')
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class TestHttpClient(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        self.server.lock = threading.Lock()
+        self.server.hits = {}
+        self.server.clients = set()
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.base_url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self.client = HttpClient(max_retries=3, backoff_base=0.01, backoff_max=0.05)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_keep_alive(self):
+        for _ in range(5):
+            response = self.client.get(f'{self.base_url}/ok')
+            response.encoding = 'utf-8'
+            self.assertEqual(response.text, '테스트 내용')
+
+        # 同一线程的请求复用同一个连接
+        self.assertEqual(len(self.server.clients), 1)
+
+    def test_retry_on_unavailable(self):
+        response = self.client.get(f'{self.base_url}/flaky')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.server.hits['/flaky'], 3)
+
+    def test_retry_exhausted(self):
+        client = HttpClient(max_retries=1, backoff_base=0.01)
+        with self.assertRaises(FetchError):
+            client.get(f'{self.base_url}/flaky')
+        self.assertEqual(self.server.hits['/flaky'], 2)
+
+    def test_client_error_not_retried(self):
+        with self.assertRaises(FetchError):
+            self.client.get(f'{self.base_url}/missing')
+        self.assertEqual(self.server.hits['/missing'], 1)
+
+    def test_connection_error(self):
+        # 找一个没有监听的端口
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+        sock.close()
+
+        client = HttpClient(max_retries=1, backoff_base=0.01, connect_timeout=0.5)
+        with self.assertRaises(FetchError):
+            client.get(f'http://127.0.0.1:{port}/ok')
+
+    def test_shared_across_threads(self):
+        errors = []
+
+        def worker():
+            try:
+                for _ in range(5):
+                    self.client.get(f'{self.base_url}/ok')
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(self.server.hits['/ok'], 20)
+
+class TestRateLimiter(unittest.TestCase):
+    def test_per_host_rate(self):
+        limiter = RateLimiter(rate=50, burst=2)
+        start = time.monotonic()
+        for _ in range(7):
+            limiter.acquire('http://a.example/page')
+        # 前两次不等待，之后每次间隔1/50秒
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+        # 其他主机有自己的配额
+        self.assertEqual(limiter.acquire('http://b.example/page'), 0.0)
+
+    def test_unlimited(self):
+        limiter = RateLimiter(rate=0)
+        self.assertEqual(sum(limiter.acquire('http://a.example/') for _ in range(100)), 0.0)
+
+if __name__ == '__main__':
+    unittest.main()
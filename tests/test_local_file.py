@@ -0,0 +1,119 @@
+import unittest
+import json
+import os
+from pathlib import Path
+import tempfile
+import shutil
+from datasources.local_file import LocalFileDataSource
+
+class TestLocalFileDataSource(unittest.TestCase):
+    def setUp(self):
+        # 创建临时书库
+        self.temp_dir = tempfile.mkdtemp()
+        self.books_dir = Path(self.temp_dir) / 'books'
+        self.books_file = Path(self.temp_dir) / 'books.json'
+        self.write_books([
+            {'id': 1, 'title': '道君', 'author': '跃千愁'},
+            {'id': 2, 'title': '凡人修仙传', 'author': '忘语'},
+        ])
+        self.data_source = LocalFileDataSource(books_dir=str(self.books_dir),
+                                               books_info_file=str(self.books_file),
+                                               catalog_check_interval=0)
+
+    def tearDown(self):
+        # 清理临时目录
+        shutil.rmtree(self.temp_dir)
+
+    def write_books(self, books, mtime=None):
+        with open(self.books_file, 'w', encoding='utf-8') as f:
+            json.dump({'books': books}, f, ensure_ascii=False)
+        if mtime is not None:
+            os.utime(self.books_file, (mtime, mtime))
+
+    def test_catalog_lookup(self):
+        self.assertEqual(len(self.data_source.get_books()), 2)
+        self.assertEqual(self.data_source.get_book_by_id(2)['title'], '凡人修仙传')
+        self.assertEqual(self.data_source.get_book_by_id('1')['author'], '跃千愁')
+        self.assertIsNone(self.data_source.get_book_by_id(999))
+
+    def test_books_by_ids(self):
+        books = self.data_source.get_books_by_ids([2, 999, 1])
+        self.assertEqual([book['id'] for book in books], [2, 1])
+        self.assertEqual(self.data_source.get_books_by_ids([]), [])
+
+    def test_catalog_reload_on_change(self):
+        catalog = self.data_source.catalog.get()
+
+        # 文件未变化时沿用同一快照
+        self.assertIs(self.data_source.catalog.get(), catalog)
+
+        self.write_books([{'id': 3, 'title': '新书', 'author': '作者'}], mtime=1)
+        self.assertIsNone(self.data_source.get_book_by_id(1))
+        self.assertEqual(self.data_source.get_book_by_id(3)['title'], '新书')
+
+        # 旧快照不受影响
+        self.assertEqual(catalog.get(1)['title'], '道君')
+
+    def test_catalog_keeps_snapshot_on_invalid_file(self):
+        self.data_source.get_books()
+        with open(self.books_file, 'w', encoding='utf-8') as f:
+            f.write('{"books": [')
+        self.assertEqual(self.data_source.get_book_by_id(1)['title'], '道君')
+
+    def test_catalog_check_interval(self):
+        data_source = LocalFileDataSource(books_dir=str(self.books_dir),
+                                          books_info_file=str(self.books_file),
+                                          catalog_check_interval=3600)
+        self.assertEqual(len(data_source.get_books()), 2)
+
+        # 检查间隔内不会重新读取文件
+        self.write_books([], mtime=1)
+        self.assertEqual(len(data_source.get_books()), 2)
+
+        data_source.catalog.refresh()
+        self.assertEqual(data_source.get_books(), [])
+
+    def test_missing_books_file(self):
+        self.books_file.unlink()
+        data_source = LocalFileDataSource(books_dir=str(self.books_dir),
+                                          books_info_file=str(self.books_file))
+        self.assertEqual(data_source.get_books(), [])
+        self.assertIsNone(data_source.get_book_by_id(1))
+
+    def write_chapters(self, book_id, chapters, mtime=None):
+        book_dir = self.books_dir / str(book_id)
+        book_dir.mkdir(parents=True, exist_ok=True)
+        chapters_file = book_dir / 'chapters.json'
+        with open(chapters_file, 'w', encoding='utf-8') as f:
+            json.dump(chapters, f, ensure_ascii=False)
+        if mtime is not None:
+            os.utime(chapters_file, (mtime, mtime))
+
+    def test_chapter_navigation(self):
+        self.write_chapters(1, [{'id': i, 'title': f'第{i}章'} for i in range(1, 4)])
+
+        prev_chapter, chapter, next_chapter = self.data_source.get_chapter_navigation(1, 2)
+        self.assertEqual((prev_chapter['id'], chapter['id'], next_chapter['id']), (1, 2, 3))
+        self.assertIsNone(self.data_source.get_chapter_navigation(1, 99))
+        self.assertIsNone(self.data_source.get_chapter_navigation(2, 1))
+
+        # 目录未变化时复用缓存
+        toc = self.data_source.get_chapter_toc(1)
+        self.assertIs(self.data_source.get_chapter_toc(1), toc)
+
+        # 新增章节后重建目录
+        self.write_chapters(1, [{'id': i, 'title': f'第{i}章'} for i in range(1, 5)], mtime=1)
+        self.assertEqual(self.data_source.get_chapter_navigation(1, 3)[2]['id'], 4)
+        self.assertEqual(len(self.data_source.get_chapters(1)), 4)
+
+    def test_chapters_page(self):
+        self.write_chapters(1, [{'id': i, 'title': f'第{i}章'} for i in range(1, 251)])
+
+        total, chapters = self.data_source.get_chapters_page(1, 200, 100)
+        self.assertEqual(total, 250)
+        self.assertEqual([c['id'] for c in chapters], list(range(201, 251)))
+        self.assertEqual(self.data_source.get_chapters_page(1, 300, 100), (250, []))
+        self.assertEqual(self.data_source.get_chapters_page(2), (0, []))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+import threading
+from datasources.metrics import Registry
+
+class TestRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_counter(self):
+        counter = self.registry.counter('test_requests_total', '请求次数', ('kind', 'result'))
+        counter.inc('chapter', 'hit')
+        counter.inc('chapter', 'hit', amount=2)
+        counter.inc('book', 'miss')
+        self.assertEqual(counter.get('chapter', 'hit'), 3)
+        self.assertEqual(counter.get('chapter', 'miss'), 0)
+
+        lines = self.registry.render().splitlines()
+        self.assertEqual(lines[:2], ['# HELP test_requests_total 请求次数', '# TYPE test_requests_total counter'])
+        self.assertIn('test_requests_total{kind="chapter",result="hit"} 3', lines)
+        self.assertIn('test_requests_total{kind="book",result="miss"} 1', lines)
+
+        with self.assertRaises(ValueError):
+            counter.inc('chapter')
+        with self.assertRaises(ValueError):
+            self.registry.counter('test_requests_total', '重复注册')
+
+    def test_histogram(self):
+        histogram = self.registry.histogram('test_seconds', '耗时', ('route',), buckets=(0.1, 1))
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(value, '/')
+        with histogram.time('/book'):
+            pass
+
+        text = self.registry.render()
+        # 各桶计数是累计的，边界值计入该桶
+        self.assertIn('test_seconds_bucket{route="/",le="0.1"} 2\n', text)
+        self.assertIn('test_seconds_bucket{route="/",le="1"} 3\n', text)
+        self.assertIn('test_seconds_bucket{route="/",le="+Inf"} 4\n', text)
+        self.assertIn('test_seconds_sum{route="/"} 3.65\n', text)
+        self.assertIn('test_seconds_count{route="/"} 4\n', text)
+        self.assertEqual(histogram.count('/book'), 1)
+
+    def test_time_iter(self):
+        histogram = self.registry.histogram('test_read_seconds', '读取耗时')
+        closed = threading.Event()
+
+        def chunks():
+            try:
+                yield from ('a', 'b', 'c')
+            finally:
+                closed.set()
+
+        self.assertEqual(list(histogram.time_iter(chunks())), ['a', 'b', 'c'])
+        self.assertEqual(histogram.count(), 1)
+
+        # 提前关闭时同样记录，并关闭被包装的迭代器
+        closed.clear()
+        items = histogram.time_iter(chunks())
+        next(items)
+        items.close()
+        self.assertTrue(closed.is_set())
+        self.assertEqual(histogram.count(), 2)
+
+    def test_gauge_and_escaping(self):
+        stats = {'hits': 5}
+        self.registry.gauge('test_cache', '缓存统计', ('stat',), lambda: {(name,): value for name, value in stats.items()})
+        self.registry.gauge('test_broken', '读取失败', (), lambda: 1 / 0)
+        counter = self.registry.counter('test_paths_total', '路径', ('path',))
+        counter.inc('a"b\\c\n')
+
+        text = self.registry.render()
+        self.assertIn('test_cache{stat="hits"} 5\n', text)
+        self.assertIn('# TYPE test_broken gauge\n', text)
+        self.assertIn('test_paths_total{path="a\\"b\\\\c\\n"} 1\n', text)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import unittest
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from datasources.local_file import LocalFileDataSource
+from datasources.packed import PackedBook, PackedFileDataSource, PackedFormatError, convert_library, main
+
+class TestPackedBooks(unittest.TestCase):
+    def setUp(self):
+        # 创建按目录存放的临时书库
+        self.temp_dir = tempfile.mkdtemp()
+        self.books_dir = Path(self.temp_dir) / 'books'
+        self.packed_dir = Path(self.temp_dir) / 'packed'
+        self.books_file = Path(self.temp_dir) / 'books.json'
+        with open(self.books_file, 'w', encoding='utf-8') as f:
+            json.dump({'books': [{'id': 1, 'title': '道君', 'author': '跃千愁'},
+                                 {'id': 2, 'title': '空书', 'author': '无名'}]}, f, ensure_ascii=False)
+        self.write_book(1, {1: '第一章内容\n第二行', 2: '第二章 한국어 😀', 3: None, 4: ''})
+        self.write_book(2, {})
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write_book(self, book_id, chapters):
+        book_dir = self.books_dir / str(book_id)
+        book_dir.mkdir(parents=True, exist_ok=True)
+        with open(book_dir / 'chapters.json', 'w', encoding='utf-8') as f:
+            json.dump([{'id': chapter_id, 'title': f'第{chapter_id}章'} for chapter_id in chapters], f,
+                      ensure_ascii=False)
+        for chapter_id, content in chapters.items():
+            if content is not None:
+                with open(book_dir / f'{chapter_id}.txt', 'w', encoding='utf-8') as f:
+                    f.write(content)
+
+    def test_matches_directory_layout(self):
+        self.assertEqual(convert_library(self.books_dir, self.packed_dir), (2, 4))
+
+        local = LocalFileDataSource(books_dir=str(self.books_dir), books_info_file=str(self.books_file))
+        packed = PackedFileDataSource(packed_dir=str(self.packed_dir), books_info_file=str(self.books_file))
+        for book_id in (1, 2, 3):
+            self.assertEqual(packed.get_chapters(book_id), local.get_chapters(book_id))
+            for chapter_id in range(6):
+                self.assertEqual(packed.get_chapter_content(book_id, chapter_id),
+                                 local.get_chapter_content(book_id, chapter_id))
+                chunks = packed.iter_chapter_content(book_id, chapter_id, chunk_size=5)
+                self.assertEqual(''.join(chunks) if chunks is not None else None,
+                                 local.get_chapter_content(book_id, chapter_id))
+
+        navigation = packed.get_chapter_navigation(1, 2)
+        self.assertEqual((navigation[0]['id'], navigation[2]['id']), (1, 3))
+        self.assertEqual(packed.search_books('道')[0]['id'], 1)
+
+    def test_zero_copy_slice(self):
+        convert_library(self.books_dir, self.packed_dir)
+        book = PackedBook(self.packed_dir / '1.book')
+        data = book.chapter_bytes(2)
+        self.assertIsInstance(data, memoryview)
+        self.assertEqual(bytes(data).decode('utf-8'), '第二章 한국어 😀')
+        self.assertIsNone(book.chapter_bytes(3))
+        self.assertIsNone(book.chapter_bytes(99))
+        self.assertEqual(len(book), 4)
+
+        # 仍有切片在使用时关闭不会使切片失效
+        book.close()
+        self.assertEqual(bytes(data).decode('utf-8'), '第二章 한국어 😀')
+
+    def test_incremental_convert(self):
+        convert_library(self.books_dir, self.packed_dir)
+        self.assertEqual(convert_library(self.books_dir, self.packed_dir), (0, 0))
+
+        packed = PackedFileDataSource(packed_dir=str(self.packed_dir), books_info_file=str(self.books_file))
+        self.assertEqual(packed.get_chapter_content(1, 1), '第一章内容\n第二行')
+
+        # 修改章节后只重新打包这一本书，数据源自动映射新文件
+        self.write_book(1, {1: '修改后的内容'})
+        stat = (self.packed_dir / '1.book').stat()
+        os.utime(self.books_dir / '1' / '1.txt', ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertEqual(convert_library(self.books_dir, self.packed_dir), (1, 1))
+        self.assertEqual(packed.get_chapter_content(1, 1), '修改后的内容')
+        self.assertEqual(len(packed.get_chapters(1)), 1)
+
+    def test_invalid_file(self):
+        self.packed_dir.mkdir()
+        with open(self.packed_dir / '1.book', 'wb') as f:
+            f.write(b'not a packed book')
+        with self.assertRaises(PackedFormatError):
+            PackedBook(self.packed_dir / '1.book')
+
+        # 截断的文件在打开时报错，不返回残缺的章节
+        convert_library(self.books_dir, self.packed_dir, force=True)
+        data = (self.packed_dir / '1.book').read_bytes()
+        (self.packed_dir / '1.book').write_bytes(data[:-3])
+        with self.assertRaises(PackedFormatError):
+            PackedBook(self.packed_dir / '1.book')
+
+        packed = PackedFileDataSource(packed_dir=str(self.packed_dir), books_info_file=str(self.books_file))
+        self.assertEqual(packed.get_chapters(1), [])
+        self.assertIsNone(packed.get_chapter_content(1, 1))
+
+    def test_command_line(self):
+        main(['--books-dir', str(self.books_dir), '--packed-dir', str(self.packed_dir)])
+        self.assertTrue((self.packed_dir / '1.book').exists())
+        self.assertTrue((self.packed_dir / '2.book').exists())
+
+if __name__ == '__main__':
+    unittest.main()
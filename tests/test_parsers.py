@@ -0,0 +1,94 @@
+import unittest
+from pathlib import Path
+from datasources.parsers import DDTKoreaParser, LxmlBackend, get_backend, lxml
+
+FIXTURES = Path(__file__).parent / 'fixtures'
+BASE_URL = 'https://www.ddtkorea.com'
+
+def parse_all(parser, html):
+    """用所有解析方法解析同一个页面"""
+    return {
+        'books': parser.parse_book_list(html, '.novel-list .novel-item'),
+        'search': parser.parse_book_list(html, '.search-results .novel-item'),
+        'book': parser.parse_book(html, 101, f'{BASE_URL}/novel/101'),
+        'chapters': parser.parse_chapters(html),
+        'content': parser.parse_chapter_content(html),
+    }
+
+class TestDDTKoreaParser(unittest.TestCase):
+    def setUp(self):
+        self.parser = DDTKoreaParser(BASE_URL, 'html.parser')
+
+    def read(self, name):
+        return (FIXTURES / name).read_text(encoding='utf-8')
+
+    def test_book_list(self):
+        books = self.parser.parse_book_list(self.read('ddtkorea_books.html'), '.novel-list .novel-item')
+        self.assertEqual([b['id'] for b in books], [101, 102, 103])
+        self.assertEqual(books[0]['cover'], '/covers/101.jpg')
+        self.assertEqual(books[0]['description'], '무림에 돌아온 검객의 이야기 & 복수극.')
+        self.assertEqual(books[1]['title'], '달빛 조각사')
+        self.assertEqual(books[1]['author'], '이작가')
+        self.assertEqual(books[1]['description'], '暂无简介')
+        self.assertEqual(books[1]['source_url'], f'{BASE_URL}/novel/102')
+        self.assertEqual(books[2]['cover'], None)
+        self.assertEqual(books[2]['author'], '박작가')
+
+    def test_book_list_limit(self):
+        html = '<div class="novel-list">' + ''.join(
+            f'<div class="novel-item"><a class="novel-title" href="/novel/{i}">{i}</a></div>'
+            for i in range(1, 21)) + '</div>'
+        self.assertEqual(len(self.parser.parse_book_list(html, '.novel-list .novel-item')), 10)
+
+    def test_search(self):
+        results = self.parser.parse_book_list(self.read('ddtkorea_search.html'), '.search-results .novel-item')
+        self.assertEqual([b['id'] for b in results], [101, 201])
+        self.assertEqual(results[1]['description'], '')
+
+    def test_book(self):
+        book = self.parser.parse_book(self.read('ddtkorea_book.html'), 101, f'{BASE_URL}/novel/101')
+        self.assertEqual(book['title'], '검의 노래')
+        self.assertEqual(book['author'], '작가: 김작가')
+        self.assertEqual(book['cover'], '/covers/101.jpg')
+
+    def test_chapters(self):
+        chapters = self.parser.parse_chapters(self.read('ddtkorea_chapters.html'))
+        self.assertEqual([c['id'] for c in chapters], [1001, 1002, 1003])
+        self.assertEqual(chapters[1]['title'], '제2화 재회')
+        self.assertEqual(chapters[2]['title'], '제3화 <결투>')
+
+    def test_chapter_content(self):
+        content = self.parser.parse_chapter_content(self.read('ddtkorea_chapter.html'))
+        self.assertTrue(content.startswith('산을 내려온 지 십 년.'))
+        self.assertNotIn('ddtkorea.com', content)
+        self.assertNotIn('\n\n\n', content)
+        self.assertIsNone(self.parser.parse_chapter_content('<div>없음</div>'))
+
+    def test_empty_page(self):
+        for backend in ('html.parser', 'lxml') if lxml is not None else ('html.parser',):
+            parser = DDTKoreaParser(BASE_URL, backend)
+            self.assertEqual(parser.parse_book_list('', '.novel-list .novel-item'), [])
+            self.assertEqual(parser.parse_chapters('  \n'), [])
+            self.assertIsNone(parser.parse_chapter_content(''))
+
+    @unittest.skipIf(lxml is None, '没有安装lxml')
+    def test_backends_match(self):
+        fast = DDTKoreaParser(BASE_URL, 'lxml')
+        for fixture in sorted(FIXTURES.glob('*.html')):
+            with self.subTest(fixture=fixture.name):
+                html = fixture.read_text(encoding='utf-8')
+                self.assertEqual(parse_all(fast, html), parse_all(self.parser, html))
+
+    def test_auto_backend(self):
+        self.assertEqual(get_backend('auto').name, 'lxml' if lxml is not None else 'html.parser')
+        with self.assertRaises(ValueError):
+            get_backend('html5lib')
+
+    def test_css_to_xpath(self):
+        self.assertEqual(LxmlBackend.css_to_xpath('a'), 'descendant::a')
+        self.assertIn("' novel-title '", LxmlBackend.css_to_xpath('a.novel-title'))
+        with self.assertRaises(ValueError):
+            LxmlBackend.css_to_xpath('ul > li')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+import threading
+from datasources.prefetch import Prefetcher
+
+class TestPrefetcher(unittest.TestCase):
+    def setUp(self):
+        self.prefetcher = Prefetcher(workers=1, max_queue=2)
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.done = []
+
+    def tearDown(self):
+        self.release.set()
+        self.prefetcher.shutdown()
+
+    def blocking_task(self, key):
+        self.started.set()
+        self.release.wait(5)
+        self.done.append(key)
+
+    def test_deduplicate_and_bounded_queue(self):
+        self.assertTrue(self.prefetcher.submit('a', self.blocking_task, 'a'))
+        # 同一个key在执行期间不会重复提交
+        self.assertFalse(self.prefetcher.submit('a', self.blocking_task, 'a'))
+        self.assertTrue(self.prefetcher.is_pending('a'))
+
+        # 工作线程被a占用后，队列最多再容纳2个任务
+        self.assertTrue(self.started.wait(5))
+        self.assertTrue(self.prefetcher.submit('b', self.blocking_task, 'b'))
+        self.assertTrue(self.prefetcher.submit('c', self.blocking_task, 'c'))
+        self.assertFalse(self.prefetcher.submit('d', self.blocking_task, 'd'))
+        self.assertEqual(self.prefetcher.dropped, 1)
+
+        self.release.set()
+        self.prefetcher.join()
+        self.assertEqual(self.done, ['a', 'b', 'c'])
+        self.assertFalse(self.prefetcher.is_pending('a'))
+
+    def test_failed_task(self):
+        def failing():
+            raise ValueError('boom')
+
+        self.prefetcher.submit('x', failing)
+        self.prefetcher.join()
+        self.assertEqual(self.prefetcher.failed, 1)
+
+    def test_disabled(self):
+        prefetcher = Prefetcher(workers=0)
+        self.assertFalse(prefetcher.submit('a', self.blocking_task, 'a'))
+        self.assertEqual(prefetcher._threads, [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,174 @@
+import unittest
+import json
+from pathlib import Path
+import tempfile
+import threading
+import shutil
+from unittest.mock import patch
+from datasources.search_index import SearchIndex, tokenize
+from datasources.local_file import LocalFileDataSource
+
+class TestSearchIndex(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.books_dir = Path(self.temp_dir) / 'books'
+        self.books = [
+            {'id': 1, 'title': '道君', 'author': '跃千愁', 'description': '天地为炉，万物为铜'},
+            {'id': 2, 'title': '凡人修仙传', 'author': '忘语', 'description': '一个普通山村小子'},
+            {'id': 3, 'title': '전지적 독자 시점', 'author': '싱숑', 'description': 'Omniscient Reader'},
+        ]
+        self.write_chapters(1, {1: '少年踏上修仙之路。', 2: '山村里来了一位道人。'})
+        self.write_chapters(3, {1: '김독자는 소설의 결말을 알고 있었다.'})
+        self.index = SearchIndex(str(Path(self.temp_dir) / 'index' / 'search.db'))
+        self.index.sync(self.books, self.books_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write_chapters(self, book_id, chapters):
+        book_dir = self.books_dir / str(book_id)
+        book_dir.mkdir(parents=True, exist_ok=True)
+        with open(book_dir / 'chapters.json', 'w', encoding='utf-8') as f:
+            json.dump([{'id': i, 'title': f'第{i}章'} for i in chapters], f)
+        for chapter_id, text in chapters.items():
+            (book_dir / f'{chapter_id}.txt').write_text(text, encoding='utf-8')
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize('道君'), ['道君', '君'])
+        self.assertEqual(tokenize('Hello, 독자!'), ['hello', '독자', '자'])
+
+    def test_search_fields_and_chapters(self):
+        self.assertEqual(self.index.search('道君'), (1, [1]))
+        self.assertEqual(self.index.search('忘语'), (1, [2]))
+        self.assertEqual(self.index.search('독자'), (1, [3]))
+        self.assertEqual(self.index.search('omniscient'), (1, [3]))
+        self.assertEqual(self.index.search('결말'), (1, [3]))
+        self.assertEqual(self.index.search('不存在的词'), (0, []))
+        self.assertEqual(self.index.search(''), (0, []))
+
+        # 书名命中的书排在只有正文命中的书前面
+        self.assertEqual(self.index.search('修仙'), (2, [2, 1]))
+        self.assertEqual(self.index.search('山村'), (2, [2, 1]))
+
+    def test_single_character_query(self):
+        total, book_ids = self.index.search('君')
+        self.assertEqual(book_ids, [1])
+        total, book_ids = self.index.search('人')
+        self.assertEqual(sorted(book_ids), [1, 2])
+
+    def test_pagination(self):
+        total, first = self.index.search('山村', 0, 1)
+        total, second = self.index.search('山村', 1, 1)
+        self.assertEqual(total, 2)
+        self.assertEqual(first + second, [2, 1])
+
+    def test_incremental_sync(self):
+        # 没有变化时不重建
+        self.assertEqual(self.index.sync(self.books, self.books_dir), 0)
+
+        # 新增一本书只索引这一本
+        self.books.append({'id': 4, 'title': '诡秘之主', 'author': '爱潜水的乌贼'})
+        self.write_chapters(4, {1: '绯红的月亮悬挂在天空。'})
+        self.assertEqual(self.index.sync(self.books, self.books_dir), 1)
+        self.assertEqual(self.index.search('月亮'), (1, [4]))
+
+        # 删除的书从索引中移除
+        self.assertEqual(self.index.sync(self.books[1:], self.books_dir), 0)
+        self.assertEqual(self.index.search('道君'), (0, []))
+        self.assertEqual(self.index.search('修仙'), (1, [2]))
+
+    def test_local_data_source(self):
+        books_file = Path(self.temp_dir) / 'books.json'
+        with open(books_file, 'w', encoding='utf-8') as f:
+            json.dump({'books': self.books}, f, ensure_ascii=False)
+        data_source = LocalFileDataSource(books_dir=str(self.books_dir), books_info_file=str(books_file),
+                                          search_index=self.index)
+        self.assertTrue(data_source.sync_search_index(wait=True))
+
+        total, books = data_source.search_books_page('修仙', 0, 10)
+        self.assertEqual(total, 2)
+        self.assertEqual([b['title'] for b in books], ['凡人修仙传', '道君'])
+        self.assertEqual([b['id'] for b in data_source.search_books('道人')], [1])
+        self.assertEqual(len(data_source.search_books('')), 3)
+
+    def test_query_planning(self):
+        # 30本书的正文都有"修炼"，只有一本有"飞剑"
+        books = [{'id': i, 'title': f'书{i}', 'author': '作者'} for i in range(10, 40)]
+        for book in books:
+            self.write_chapters(book['id'], {1: '修炼' * (book['id'] % 7 + 1) + ('飞剑' if book['id'] == 17 else ''),
+                                             2: '修炼' + '山' * 50, 3: '修炼' + '水' * 50})
+        self.index.sync(self.books + books, self.books_dir)
+
+        # 先读取最稀有的词项，常见词项只读取候选书籍的倒排记录
+        with patch.object(self.index, '_postings_for', wraps=self.index._postings_for) as postings_for:
+            self.assertEqual(self.index.search('修炼 飞剑'), (1, [17]))
+        self.assertEqual([call.args[1] for call in postings_for.call_args_list], ['修炼'])
+
+        # 提前结束打分不改变排序
+        total, ranked = self.index.search('修炼', 0, None)
+        self.assertEqual(total, 30)
+        with patch('datasources.search_index.SCORE_BATCH', 2), \
+                patch.object(self.index, '_docs', wraps=self.index._docs) as docs:
+            self.assertEqual(self.index.search('修炼', 2, 3), (30, ranked[2:5]))
+        self.assertLess(sum(len(call.args[1]) for call in docs.call_args_list), 90)
+
+        # 单字前缀只展开最常见的词项
+        with patch('datasources.search_index.MAX_PREFIX_TERMS', 1):
+            self.assertEqual(self.index.search('修')[0], 30)
+
+    def test_mixed_script(self):
+        self.assertEqual(tokenize('ABC小说'), ['abc', '小说', '说'])
+        self.books.append({'id': 5, 'title': 'ABC小说', 'author': 'Writer2024年'})
+        self.index.sync(self.books, self.books_dir)
+        self.assertEqual(self.index.search('小说'), (1, [5]))
+        self.assertEqual(self.index.search('abc'), (1, [5]))
+        self.assertEqual(self.index.search('writer2024'), (1, [5]))
+
+    def test_background_build(self):
+        books_file = Path(self.temp_dir) / 'books.json'
+        with open(books_file, 'w', encoding='utf-8') as f:
+            json.dump({'books': self.books}, f, ensure_ascii=False)
+        index = SearchIndex(str(Path(self.temp_dir) / 'index' / 'empty.db'))
+        data_source = LocalFileDataSource(books_dir=str(self.books_dir), books_info_file=str(books_file),
+                                          search_index=index)
+
+        # 同步在后台进行，期间空索引不可用，按书名和作者匹配
+        release = threading.Event()
+        sync = index.sync
+        with patch.object(index, 'sync', side_effect=lambda *args: release.wait(5) and sync(*args)) as slow_sync:
+            self.assertEqual(data_source.search_books_page('道君', 0, 10)[0], 1)
+            self.assertEqual(data_source.search_books_page('道人', 0, 10)[0], 0)
+            release.set()
+            self.assertTrue(data_source.sync_search_index(wait=True))
+        slow_sync.assert_called_once()
+        self.assertEqual([b['id'] for b in data_source.search_books('道人')], [1])
+
+    def test_chapter_changes_and_retry(self):
+        books_file = Path(self.temp_dir) / 'books.json'
+        with open(books_file, 'w', encoding='utf-8') as f:
+            json.dump({'books': self.books}, f, ensure_ascii=False)
+        data_source = LocalFileDataSource(books_dir=str(self.books_dir), books_info_file=str(books_file),
+                                          search_index=self.index, index_check_interval=0)
+        self.assertTrue(data_source.sync_search_index(wait=True))
+
+        # 没有书库监视时，books.json不变也能发现新增的章节
+        self.write_chapters(1, {1: '少年踏上修仙之路。', 2: '山村里来了一位道人。', 3: '飞剑出鞘。'})
+        data_source.sync_search_index(wait=True)
+        self.assertEqual([b['id'] for b in data_source.search_books('飞剑')], [1])
+
+        # 同步失败后等待一段时间再重试，不会每次搜索都重新同步
+        with patch.object(self.index, 'sync', side_effect=OSError('磁盘已满')) as failing_sync, \
+                patch('builtins.print'):
+            data_source.sync_search_index(wait=True)
+            data_source.sync_search_index(wait=True)
+            self.assertEqual(data_source.search_books_page('飞剑')[0], 1)
+        failing_sync.assert_called_once()
+
+        data_source._index_retry_at = 0.0
+        with patch.object(self.index, 'sync', wraps=self.index.sync) as sync:
+            data_source.sync_search_index(wait=True)
+        sync.assert_called_once()
+        self.assertEqual(data_source._index_failures, 0)
+
+if __name__ == '__main__':
+    unittest.main()
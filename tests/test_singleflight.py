@@ -0,0 +1,58 @@
+import unittest
+import threading
+import time
+from datasources.singleflight import SingleFlight
+
+class TestSingleFlight(unittest.TestCase):
+    def setUp(self):
+        self.flight = SingleFlight()
+        self.calls = 0
+
+    def run_concurrently(self, fn, count=8):
+        results = []
+        errors = []
+
+        def worker():
+            try:
+                results.append(self.flight.do('key', fn))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, errors
+
+    def test_coalesce(self):
+        def slow():
+            self.calls += 1
+            time.sleep(0.1)
+            return 'result'
+
+        results, errors = self.run_concurrently(slow)
+        self.assertEqual(results, ['result'] * 8)
+        self.assertEqual(errors, [])
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.flight.shared, 7)
+        self.assertFalse(self.flight.in_flight('key'))
+
+        # 完成后的调用会重新执行
+        self.flight.do('key', slow)
+        self.assertEqual(self.calls, 2)
+
+    def test_error_shared(self):
+        def failing():
+            self.calls += 1
+            time.sleep(0.1)
+            raise ValueError('upstream down')
+
+        results, errors = self.run_concurrently(failing, count=4)
+        self.assertEqual(results, [])
+        self.assertEqual(len(errors), 4)
+        self.assertTrue(all(isinstance(e, ValueError) for e in errors))
+        self.assertEqual(self.calls, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+from datasources.local_file import LocalFileDataSource
+from datasources.snapshot import Snapshot, SnapshotCatalog, SnapshotFile, SnapshotFormatError, build_snapshot
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.books_dir = Path(self.temp_dir) / 'books'
+        self.books_file = Path(self.temp_dir) / 'books.json'
+        self.snapshot_file = Path(self.temp_dir) / 'snapshot.bin'
+        # 书籍列表的顺序与ID顺序不同
+        self.books = [{'id': 30, 'title': '凡人修仙传', 'author': '忘语'},
+                      {'id': 2, 'title': '검의 노래', 'author': '김작가'},
+                      {'id': 17, 'title': '道君', 'author': '跃千愁'}]
+        with open(self.books_file, 'w', encoding='utf-8') as f:
+            json.dump({'books': self.books}, f, ensure_ascii=False)
+        for book_id in (2, 30):
+            book_dir = self.books_dir / str(book_id)
+            book_dir.mkdir(parents=True)
+            with open(book_dir / 'chapters.json', 'w', encoding='utf-8') as f:
+                json.dump([{'id': book_id * 100 + i, 'title': f'第{i}章'} for i in range(1, 4)], f, ensure_ascii=False)
+            with open(book_dir / f'{book_id * 100 + 1}.txt', 'w', encoding='utf-8') as f:
+                f.write('正文')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def make_source(self):
+        return LocalFileDataSource(books_dir=str(self.books_dir), books_info_file=str(self.books_file),
+                                   catalog_check_interval=0, snapshot=SnapshotFile(self.snapshot_file))
+
+    def test_round_trip(self):
+        self.assertEqual(build_snapshot(self.books_file, self.books_dir, self.snapshot_file), (3, 2))
+        snapshot = Snapshot(self.snapshot_file)
+        catalog = snapshot.catalog((self.books_file.stat().st_mtime_ns, self.books_file.stat().st_size))
+        self.assertEqual(catalog.get(17), self.books[2])
+        self.assertIsNone(catalog.get(5))
+        self.assertEqual(catalog.books, self.books)
+
+        chapters_file = self.books_dir / '30' / 'chapters.json'
+        signature = (chapters_file.stat().st_mtime_ns, chapters_file.stat().st_size)
+        self.assertEqual([c['id'] for c in snapshot.chapters(30, signature)], [3001, 3002, 3003])
+        self.assertIsNone(snapshot.chapters(17, signature))
+        self.assertIsNone(snapshot.chapters(30, (0, 0)))
+
+    def test_data_source_uses_snapshot(self):
+        build_snapshot(self.books_file, self.books_dir, self.snapshot_file)
+        data_source = self.make_source()
+        # 快照与文件一致时不解析JSON
+        with patch('json.load', side_effect=AssertionError('不应解析JSON')):
+            self.assertEqual(data_source.get_book_by_id(2)['title'], '검의 노래')
+            self.assertEqual(len(data_source.get_chapter_toc(2)), 3)
+        self.assertIsInstance(data_source.catalog.get(), SnapshotCatalog)
+        self.assertEqual(data_source.get_books(), self.books)
+
+    def test_stale_snapshot_falls_back(self):
+        build_snapshot(self.books_file, self.books_dir, self.snapshot_file)
+        with open(self.books_dir / '2' / 'chapters.json', 'w', encoding='utf-8') as f:
+            json.dump([{'id': 201, 'title': '新目录'}], f, ensure_ascii=False)
+        with open(self.books_file, 'w', encoding='utf-8') as f:
+            json.dump({'books': self.books[:1]}, f, ensure_ascii=False)
+        os.utime(self.books_file, ns=(1, 1))
+
+        data_source = self.make_source()
+        self.assertEqual(data_source.get_books(), self.books[:1])
+        self.assertEqual(data_source.get_chapters(2), [{'id': 201, 'title': '新目录'}])
+        self.assertEqual(len(data_source.get_chapter_toc(30)), 3)
+
+    def test_invalid_file(self):
+        self.snapshot_file.write_bytes(b'not a snapshot file')
+        with self.assertRaises(SnapshotFormatError):
+            Snapshot(self.snapshot_file)
+        self.assertIsNone(SnapshotFile(self.snapshot_file).get())
+        self.assertEqual(len(self.make_source().get_books()), 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+import unittest
+import json
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from unittest.mock import patch
+from datasources.compression import ChapterStore
+from datasources.local_file import LocalFileDataSource
+from datasources.sqlite_db import SQLiteDataSource, main
+
+class TestSQLiteDataSource(unittest.TestCase):
+    def setUp(self):
+        # 创建临时书库并导入数据库
+        self.temp_dir = tempfile.mkdtemp()
+        self.books_dir = Path(self.temp_dir) / 'books'
+        self.books_file = Path(self.temp_dir) / 'books.json'
+        self.db_file = Path(self.temp_dir) / 'library.db'
+        self.books = [
+            {'id': 2, 'title': '凡人修仙传', 'author': '忘语', 'description': '一个普通山村少年的修仙之路'},
+            {'id': 1, 'title': '道君', 'author': '跃千愁', 'description': '修仙世界的故事'},
+            {'id': 3, 'title': 'Hello World', 'author': 'Someone', 'description': ''},
+        ]
+        self.write_books()
+        self.write_book(2, {i: f'第{i}章的内容' for i in range(1, 8)})
+        self.write_book(1, {10: '道君第一章', 11: None})
+        self.data_source = SQLiteDataSource(str(self.db_file))
+        self.data_source.import_books(self.books, self.books_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write_books(self):
+        with open(self.books_file, 'w', encoding='utf-8') as f:
+            json.dump({'books': self.books}, f, ensure_ascii=False)
+
+    def write_book(self, book_id, chapters):
+        book_dir = self.books_dir / str(book_id)
+        book_dir.mkdir(parents=True, exist_ok=True)
+        with open(book_dir / 'chapters.json', 'w', encoding='utf-8') as f:
+            json.dump([{'id': chapter_id, 'title': f'第{chapter_id}章'} for chapter_id in chapters], f,
+                      ensure_ascii=False)
+        for chapter_id, content in chapters.items():
+            if content is not None:
+                ChapterStore().write(book_dir, chapter_id, content)
+
+    def test_matches_local_files(self):
+        local = LocalFileDataSource(books_dir=str(self.books_dir), books_info_file=str(self.books_file))
+        self.assertEqual(self.data_source.get_books(), local.get_books())
+        self.assertEqual(self.data_source.get_books_by_ids([3, 4, 1]), local.get_books_by_ids([3, 4, 1]))
+        for book_id in (1, 2, 3, 4):
+            self.assertEqual(self.data_source.get_book_by_id(book_id), local.get_book_by_id(book_id))
+            self.assertEqual(self.data_source.get_chapters(book_id), local.get_chapters(book_id))
+            for chapter_id in (1, 7, 10, 11, 99):
+                self.assertEqual(self.data_source.get_chapter_content(book_id, chapter_id),
+                                 local.get_chapter_content(book_id, chapter_id))
+                chunks = self.data_source.iter_chapter_content(book_id, chapter_id, chunk_size=4)
+                self.assertEqual(''.join(chunks) if chunks is not None else None,
+                                 local.get_chapter_content(book_id, chapter_id))
+                self.assertEqual(self.data_source.get_chapter_navigation(book_id, chapter_id),
+                                 local.get_chapter_navigation(book_id, chapter_id))
+
+    def test_keyset_pages(self):
+        pages = []
+        after = None
+        while True:
+            page = self.data_source.get_chapters_after(2, after, limit=3)
+            if not page:
+                break
+            pages.append([chapter['id'] for chapter in page])
+            after = page[-1]['id']
+        self.assertEqual(pages, [[1, 2, 3], [4, 5, 6], [7]])
+        self.assertEqual(self.data_source.get_chapters_after(2, 99), [])
+
+        local = LocalFileDataSource(books_dir=str(self.books_dir), books_info_file=str(self.books_file))
+        for book_id, offset in ((2, 0), (2, 3), (2, 6), (2, 7), (1, 1), (4, 0)):
+            self.assertEqual(self.data_source.get_chapters_page(book_id, offset, 3),
+                             local.get_chapters_page(book_id, offset, 3))
+
+    def test_search(self):
+        self.assertEqual([book['id'] for book in self.data_source.search_books('修仙')], [2, 1])
+        self.assertEqual([book['id'] for book in self.data_source.search_books('凡人')], [2])
+        self.assertEqual([book['id'] for book in self.data_source.search_books('跃')], [1])
+        self.assertEqual([book['id'] for book in self.data_source.search_books('hello')], [3])
+        self.assertEqual(self.data_source.search_books('不存在'), [])
+        self.assertEqual(self.data_source.search_books('"'), [])
+        self.assertEqual(len(self.data_source.search_books('')), 3)
+
+        total, page = self.data_source.search_books_page('修仙', 1, 1)
+        self.assertEqual((total, [book['id'] for book in page]), (2, [1]))
+
+    def test_reimport(self):
+        self.assertEqual(len(self.data_source.get_chapters(2)), 7)
+
+        # 重新导入后删除的书籍和章节都不再返回，其他线程的连接也能看到
+        self.books = self.books[:1]
+        self.write_book(2, {1: '修改后的内容'})
+        self.data_source.import_books(self.books, self.books_dir)
+
+        results = []
+        thread = threading.Thread(target=lambda: results.append(
+            (self.data_source.get_books(), self.data_source.get_chapter_content(2, 1))))
+        thread.start()
+        thread.join()
+        self.assertEqual(results, [(self.books, '修改后的内容')])
+        self.assertEqual(len(self.data_source.get_chapters(2)), 1)
+        self.assertIsNone(self.data_source.get_book_by_id(1))
+        self.assertEqual(self.data_source.search_books('道君'), [])
+
+    def test_page_snapshot(self):
+        # 总数查询之后、行查询之前另一个线程重新导入，两次查询仍看到同一个版本
+        def reimport():
+            self.write_book(2, {1: '修改后的内容'})
+            self.books = [{**book, 'title': f"{book['title']}（新版）"} for book in self.books]
+            thread = threading.Thread(target=self.data_source.import_books, args=(self.books, self.books_dir))
+            thread.start()
+            thread.join()
+
+        def on_statement(sql):
+            if 'SELECT data FROM chapters' in sql or 'SELECT books.data' in sql:
+                conn.set_trace_callback(None)
+                reimport()
+
+        conn = self.data_source._conn()
+        conn.set_trace_callback(on_statement)
+        total, page = self.data_source.get_chapters_page(2, 0, 10)
+        self.assertEqual((total, len(page)), (7, 7))
+        self.assertFalse(conn.in_transaction)
+        self.assertEqual(self.data_source.get_chapters_page(2, 0, 10)[0], 1)
+
+        before = self.data_source.search_books('修仙')
+        conn.set_trace_callback(on_statement)
+        self.assertEqual(self.data_source.search_books_page('修仙'), (2, before))
+        self.assertFalse(conn.in_transaction)
+        self.assertNotEqual(self.data_source.search_books('修仙'), before)
+
+    def test_command_line(self):
+        db_file = Path(self.temp_dir) / 'cli.db'
+        with patch('builtins.print'):
+            main(['--books-file', str(self.books_file), '--books-dir', str(self.books_dir), '--db', str(db_file)])
+        data_source = SQLiteDataSource(str(db_file))
+        self.assertEqual(data_source.get_books(), self.books)
+        self.assertEqual(data_source.get_chapter_content(1, 10), '道君第一章')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+from datasources.toc import ChapterTOC, TOCCache
+
+class TestChapterTOC(unittest.TestCase):
+    def setUp(self):
+        self.chapters = [{'id': i, 'title': f'第{i}章'} for i in (10, 20, 30)]
+        self.toc = ChapterTOC(self.chapters)
+
+    def test_neighbors(self):
+        prev_chapter, chapter, next_chapter = self.toc.neighbors(20)
+        self.assertEqual(prev_chapter['id'], 10)
+        self.assertEqual(chapter['id'], 20)
+        self.assertEqual(next_chapter['id'], 30)
+
+        # 第一章没有上一章，最后一章没有下一章
+        self.assertIsNone(self.toc.neighbors(10)[0])
+        self.assertIsNone(self.toc.neighbors(30)[2])
+
+        # 不存在的章节
+        self.assertIsNone(self.toc.neighbors(99))
+        self.assertIsNone(self.toc.get(99))
+        self.assertEqual(self.toc.get('30')['title'], '第30章')
+
+    def test_cache_version(self):
+        cache = TOCCache(max_books=2)
+        loads = []
+
+        def loader():
+            loads.append(1)
+            return self.chapters
+
+        toc = cache.get(1, 'v1', loader)
+        self.assertIs(cache.get(1, 'v1', loader), toc)
+        self.assertEqual(len(loads), 1)
+
+        # 版本变化时重建
+        self.assertIsNot(cache.get(1, 'v2', loader), toc)
+        self.assertEqual(len(loads), 2)
+
+    def test_cache_eviction(self):
+        cache = TOCCache(max_books=2)
+        cache.get(1, 'v', lambda: self.chapters)
+        cache.get(2, 'v', lambda: self.chapters)
+        cache.get(1, 'v', lambda: self.chapters)
+        cache.get(3, 'v', lambda: self.chapters)
+
+        # 书籍2最久未使用，被淘汰
+        self.assertEqual(list(cache._entries), [1, 3])
+
+        # 空目录不缓存
+        cache.get(4, 'v', lambda: [])
+        self.assertNotIn(4, cache._entries)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,175 @@
+import unittest
+import json
+import os
+import queue
+import shutil
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+from datasources.local_file import LocalFileDataSource
+from datasources.search_index import SearchIndex
+from datasources.watcher import (BOOK_ADDED, BOOK_REMOVED, CATALOG_CHANGED, CHAPTER_ADDED, CHAPTER_CHANGED,
+                                 CHAPTER_REMOVED, TOC_CHANGED, ChangeEvent, LibraryWatcher, _chapter_id)
+
+class LibraryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.books_dir = Path(self.temp_dir) / 'books'
+        self.books_file = Path(self.temp_dir) / 'books.json'
+        self.books = [{'id': 1, 'title': '测试书籍', 'author': '测试作者'}]
+        self.write_books()
+        self.write_chapter(1, 1, '第一章内容')
+        self.write_toc(1, [1])
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write_books(self):
+        with open(self.books_file, 'w', encoding='utf-8') as f:
+            json.dump({'books': self.books}, f, ensure_ascii=False)
+
+    def write_toc(self, book_id, chapter_ids):
+        book_dir = self.books_dir / str(book_id)
+        book_dir.mkdir(parents=True, exist_ok=True)
+        with open(book_dir / 'chapters.json', 'w', encoding='utf-8') as f:
+            json.dump([{'id': chapter_id, 'title': f'第{chapter_id}章'} for chapter_id in chapter_ids], f,
+                      ensure_ascii=False)
+
+    def write_chapter(self, book_id, chapter_id, text):
+        book_dir = self.books_dir / str(book_id)
+        book_dir.mkdir(parents=True, exist_ok=True)
+        with open(book_dir / f'{chapter_id}.txt', 'w', encoding='utf-8') as f:
+            f.write(text)
+
+class TestLibraryWatcher(LibraryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.watcher = LibraryWatcher(str(self.books_dir), str(self.books_file), use_inotify=False)
+        # 首次检查只记录状态
+        self.assertEqual(self.watcher.check(), [])
+
+    def test_chapter_id(self):
+        self.assertEqual(_chapter_id('12.txt'), 12)
+        self.assertEqual(_chapter_id('12.txt.z'), 12)
+        self.assertIsNone(_chapter_id('chapters.dict'))
+        self.assertIsNone(_chapter_id('.12.txt.tmp'))
+
+    def test_chapter_events(self):
+        received = []
+        self.watcher.subscribe(received.extend)
+
+        self.write_chapter(1, 2, '第二章内容')
+        self.write_toc(1, [1, 2])
+        self.assertEqual(self.watcher.check(), [ChangeEvent(TOC_CHANGED, 1), ChangeEvent(CHAPTER_ADDED, 1, 2)])
+
+        self.write_chapter(1, 2, '修改后的第二章内容')
+        self.assertEqual(self.watcher.check(), [ChangeEvent(CHAPTER_CHANGED, 1, 2)])
+
+        # 压缩时换成.z文件，视为内容变化
+        os.rename(self.books_dir / '1' / '1.txt', self.books_dir / '1' / '1.txt.z')
+        self.assertEqual(self.watcher.check(), [ChangeEvent(CHAPTER_CHANGED, 1, 1)])
+
+        os.unlink(self.books_dir / '1' / '2.txt')
+        self.assertEqual(self.watcher.check(), [ChangeEvent(CHAPTER_REMOVED, 1, 2)])
+
+        # 与章节无关的文件不产生事件
+        (self.books_dir / '1' / 'chapters.dict').write_bytes(b'dict')
+        self.assertEqual(self.watcher.check(), [])
+        self.assertEqual(len(received), 5)
+
+    def test_book_and_catalog_events(self):
+        self.write_chapter(2, 1, '新书')
+        self.books.append({'id': 2, 'title': '新书', 'author': '作者'})
+        self.write_books()
+        self.assertEqual(self.watcher.check(), [ChangeEvent(CATALOG_CHANGED), ChangeEvent(BOOK_ADDED, 2)])
+
+        shutil.rmtree(self.books_dir / '1')
+        self.assertEqual(self.watcher.check(), [ChangeEvent(BOOK_REMOVED, 1)])
+
+    def test_subscriber_errors(self):
+        received = []
+        self.watcher.subscribe(lambda events: 1 / 0)
+        self.watcher.subscribe(received.extend)
+        self.write_chapter(1, 2, '第二章内容')
+        with patch('builtins.print'):
+            self.watcher.check()
+        self.assertEqual(received, [ChangeEvent(CHAPTER_ADDED, 1, 2)])
+
+class TestInotifyWatcher(LibraryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.watcher = LibraryWatcher(str(self.books_dir), str(self.books_file))
+        self.events = queue.Queue()
+        self.watcher.subscribe(lambda events: [self.events.put(event) for event in events])
+        with patch('builtins.print'):
+            backend = self.watcher.start()
+        if backend != 'inotify':
+            self.watcher.stop()
+            self.skipTest('inotify不可用')
+
+    def tearDown(self):
+        self.watcher.stop()
+        super().tearDown()
+
+    def wait_events(self, count):
+        return {self.events.get(timeout=5) for _ in range(count)}
+
+    def test_incremental(self):
+        self.write_chapter(1, 1, '第一章（修订）')
+        self.assertEqual(self.wait_events(1), {ChangeEvent(CHAPTER_CHANGED, 1, 1)})
+
+        # 只检查事件涉及的文件，不扫描其他书籍
+        with patch.object(self.watcher, '_scan_book', wraps=self.watcher._scan_book) as scan:
+            self.write_chapter(1, 2, '第二章内容')
+            self.write_toc(1, [1, 2])
+            self.assertEqual(self.wait_events(2), {ChangeEvent(CHAPTER_ADDED, 1, 2), ChangeEvent(TOC_CHANGED, 1)})
+        scan.assert_not_called()
+
+        # 新书的目录被加入监视
+        self.write_chapter(3, 1, '新书')
+        self.assertEqual(self.wait_events(1), {ChangeEvent(BOOK_ADDED, 3)})
+        self.write_chapter(3, 2, '新书第二章')
+        self.assertEqual(self.wait_events(1), {ChangeEvent(CHAPTER_ADDED, 3, 2)})
+
+        self.books.append({'id': 3, 'title': '新书', 'author': '作者'})
+        self.write_books()
+        self.assertEqual(self.wait_events(1), {ChangeEvent(CATALOG_CHANGED)})
+
+class TestApplyChanges(LibraryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.data_source = LocalFileDataSource(
+            books_dir=str(self.books_dir), books_info_file=str(self.books_file), catalog_check_interval=0,
+            search_index=SearchIndex(str(Path(self.temp_dir) / 'index' / 'search.db')))
+        self.watcher = LibraryWatcher(str(self.books_dir), str(self.books_file), use_inotify=False)
+        self.data_source.watch(self.watcher)
+        self.watcher.check()
+        self.assertTrue(self.data_source.sync_search_index(wait=True))
+        self.assertEqual(self.data_source.search_books_page('第一章')[0], 1)
+
+    def test_new_chapter_indexed(self):
+        self.write_chapter(1, 2, '飞剑出鞘')
+        self.write_toc(1, [1, 2])
+        with patch.object(self.data_source.search_index, 'sync') as sync:
+            self.watcher.check()
+        sync.assert_not_called()
+        self.assertEqual(len(self.data_source.get_chapters(1)), 2)
+        self.assertEqual(self.data_source.search_books_page('飞剑')[0], 1)
+
+    def test_catalog_diff(self):
+        self.books.append({'id': 2, 'title': '飞剑问道', 'author': '我吃西红柿'})
+        self.write_books()
+        with patch.object(self.data_source.search_index, 'index_book',
+                          wraps=self.data_source.search_index.index_book) as index_book:
+            self.watcher.check()
+        # 只索引新增的书籍
+        self.assertEqual([call.args[0]['id'] for call in index_book.call_args_list], [2])
+        self.assertEqual(self.data_source.search_books_page('飞剑')[0], 1)
+
+        self.books = self.books[1:]
+        self.write_books()
+        self.watcher.check()
+        self.assertEqual(self.data_source.search_books_page('第一章')[0], 0)
+
+if __name__ == '__main__':
+    unittest.main()